@@ -0,0 +1,42 @@
+#!/usr/bin/env bash
+# Wait until no earlier run of a workflow that restores and saves .caixinha is
+# still queued or running, so runs use the state one after another in the order
+# they were created. Unlike a shared concurrency group, nothing is cancelled:
+# GitHub keeps only one pending run per group and cancels the older one.
+#
+# Needs GH_TOKEN with actions:read. STATE_LOCK_TIMEOUT (seconds, default 3600)
+# bounds the wait; the run fails rather than start from stale state.
+set -euo pipefail
+
+WORKFLOWS="daily-reminder.yml process-payments.yml stage-charges.yml generate-charges.yml"
+STATUSES="requested queued pending waiting in_progress"
+POLL_SECONDS=30
+deadline=$((SECONDS + ${STATE_LOCK_TIMEOUT:-3600}))
+
+created_at=$(gh api "repos/$GITHUB_REPOSITORY/actions/runs/$GITHUB_RUN_ID" --jq .created_at)
+earlier_filter="[.workflow_runs[]
+  | select(.id != $GITHUB_RUN_ID)
+  | select(.created_at < \"$created_at\" or (.created_at == \"$created_at\" and .id < $GITHUB_RUN_ID))
+  | \"\(.name) #\(.run_number)\"] | .[]"
+
+while true; do
+  earlier=""
+  for workflow in $WORKFLOWS; do
+    for status in $STATUSES; do
+      earlier+=$(gh api "repos/$GITHUB_REPOSITORY/actions/workflows/$workflow/runs?status=$status&per_page=100" \
+        --jq "$earlier_filter")$'\n'
+    done
+  done
+  earlier=$(sed '/^$/d' <<< "$earlier" | sort -u)
+
+  if [ -z "$earlier" ]; then
+    echo "No earlier run is using the job state."
+    exit 0
+  fi
+  if [ "$SECONDS" -ge "$deadline" ]; then
+    echo "::error::Gave up waiting for earlier runs to release the job state: $(paste -sd, <<< "$earlier")"
+    exit 1
+  fi
+  echo "Waiting for earlier runs: $(paste -sd, <<< "$earlier")"
+  sleep "$POLL_SECONDS"
+done
@@ -1,14 +1,182 @@
-from http.server import BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hmac
 import json
+import logging
 import os
-from datetime import datetime
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
 from urllib.parse import parse_qs, urlparse
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.pix_queue import PixQueue
+from src.utils.log import setup_logging
+from src.utils.metrics import CONTENT_TYPE, Counter, Gauge, Histogram, Registry
+
+# This module is the entry point on Vercel, so logging is configured on import.
+# Records are written before the response goes out: Vercel may freeze the
+# function right after it, and a background listener would lose its queue.
+setup_logging(background=False)
+logger = logging.getLogger("webhook")
+
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Bearer token for GET /metrics and /health; WEBHOOK_SECRET when unset.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "") or WEBHOOK_SECRET
+
+# GET endpoints by path. `serve()` sees these paths as requested; on Vercel only
+# /api/webhook reaches this function, so vercel.json rewrites the others to it
+# with ?endpoint=<name>.
+GET_ENDPOINTS = {
+    "/metrics": "metrics",
+    "/health": "health",
+    "/api/webhook/metrics": "metrics",
+    "/api/webhook/health": "health",
+}
+
+# How long a /health result is reused before the checks run again.
+HEALTH_CACHE_SECONDS = float(os.getenv("WEBHOOK_HEALTH_CACHE_SECONDS", "15"))
+
+_queue = None
+
+
+def get_queue() -> Optional[PixQueue]:
+    """The intake queue, or None when WEBHOOK_QUEUE_PATH is unset or cannot be opened.
+
+    The queue must live on storage the drain worker also reads; the deployment
+    directory is read-only on Vercel and private to each instance, so there is
+    no default. Without a queue, PIX are left to process_payments' reconciliation.
+    """
+    global _queue
+    if _queue is None:
+        path = os.getenv("WEBHOOK_QUEUE_PATH")
+        if not path:
+            return None
+        try:
+            _queue = PixQueue(path)
+        except Exception as e:
+            logger.error("Could not open the PIX queue at %s: %s", path, e)
+            return None
+    return _queue
+
+
+def _queue_depth() -> Optional[int]:
+    queue = get_queue()
+    return queue.pending_count() if queue else None
+
+
+# Counters live in this process: on Vercel each instance reports its own.
+metrics = Registry()
+REQUESTS = metrics.add(Counter(
+    "webhook_requests_total", "Webhook POST requests by outcome", ("outcome",)
+))
+PIX_RECEIVED = metrics.add(Counter("webhook_pix_received_total", "PIX notifications received"))
+PIX_QUEUED = metrics.add(Counter(
+    "webhook_pix_queued_total", "PIX notifications queued (retries of a queued PIX excluded)"
+))
+REQUEST_SECONDS = metrics.add(Histogram(
+    "webhook_request_duration_seconds", "Time to handle a webhook POST"
+))
+metrics.add(Gauge(
+    "webhook_queue_depth", "PIX waiting in the intake queue", _queue_depth
+))
+
+_health_lock = threading.Lock()
+_health: dict = {}
+_health_checked_at = 0.0
+
+
+def check_health() -> dict:
+    """Readiness of the webhook's dependencies, refreshed at most every HEALTH_CACHE_SECONDS.
+
+    Only local checks run: the intake queue, when configured, must open and
+    answer a count. Efí, Sheets and email are the drain worker's business.
+    """
+    global _health, _health_checked_at
+    with _health_lock:
+        now = time.monotonic()
+        if _health and now - _health_checked_at < HEALTH_CACHE_SECONDS:
+            return _health
+
+        checks = {"secret_configured": bool(WEBHOOK_SECRET)}
+        if not os.getenv("WEBHOOK_QUEUE_PATH"):
+            checks["queue"] = "disabled"
+        else:
+            try:
+                queue = get_queue()
+                if queue is None:
+                    raise RuntimeError("queue could not be opened")
+                checks["queue_depth"] = queue.pending_count()
+                checks["queue"] = "ok"
+            except Exception as e:
+                logger.error("Health check could not read the PIX queue: %s", e)
+                checks["queue"] = f"error: {e}"
+
+        _health = {
+            "status": "ok" if checks["queue"] in ("ok", "disabled") else "unavailable",
+            "checks": checks,
+            "checked_at": time.time(),
+        }
+        _health_checked_at = now
+        return _health
+
+
+def get_endpoint(url: str) -> Optional[str]:
+    """The GET endpoint ``url`` asks for ("metrics" or "health"), or None."""
+    parsed = urlparse(url)
+    endpoint = GET_ENDPOINTS.get(parsed.path.rstrip("/"))
+    if endpoint is None:
+        endpoint = parse_qs(parsed.query).get("endpoint", [""])[0]
+    return endpoint if endpoint in ("metrics", "health") else None
+
+
+def is_authorized(authorization: Optional[str], token: Optional[str] = None) -> bool:
+    """Whether an ``Authorization`` header carries the metrics token.
+
+    Without a token configured the endpoints stay open, as POST does without
+    WEBHOOK_SECRET.
+    """
+    token = METRICS_TOKEN if token is None else token
+    if not token:
+        return True
+    scheme, _, value = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(value.strip(), token)
 
 
 class handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        # Access lines go through logging instead of straight to stderr.
+        logger.debug(format, *args)
+
     def do_GET(self):
+        endpoint = get_endpoint(self.path)
+        if endpoint and not is_authorized(self.headers.get("Authorization")):
+            self.send_response(401)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("WWW-Authenticate", "Bearer")
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Unauthorized"}).encode())
+            return
+
+        if endpoint == "metrics":
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        if endpoint == "health":
+            health = check_health()
+            self.send_response(200 if health["status"] == "ok" else 503)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(health).encode())
+            return
+
         self.send_response(200)
         self.send_header("Content-Type", "application/json")
         self.end_headers()
@@ -17,6 +185,13 @@ class handler(BaseHTTPRequestHandler):
         )
 
     def do_POST(self):
+        started = time.perf_counter()
+        outcome = self._handle_post()
+        REQUEST_SECONDS.observe(time.perf_counter() - started)
+        REQUESTS.inc(outcome=outcome)
+
+    def _handle_post(self) -> str:
+        """Answer one webhook POST; returns the outcome label for the metrics."""
         try:
             parsed_url = urlparse(self.path)
             query_params = parse_qs(parsed_url.query)
@@ -28,7 +203,7 @@ class handler(BaseHTTPRequestHandler):
                     self.send_header("Content-Type", "application/json")
                     self.end_headers()
                     self.wfile.write(json.dumps({"error": "Unauthorized"}).encode())
-                    return
+                    return "unauthorized"
 
             content_length = int(self.headers.get("Content-Length", 0))
             body = self.rfile.read(content_length).decode("utf-8") if content_length else ""
@@ -37,7 +212,7 @@ class handler(BaseHTTPRequestHandler):
                 self.send_response(200)
                 self.end_headers()
                 self.wfile.write(b"200")
-                return
+                return "empty"
 
             try:
                 payload = json.loads(body)
@@ -46,25 +221,122 @@ class handler(BaseHTTPRequestHandler):
                 self.send_header("Content-Type", "application/json")
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": "Invalid JSON"}).encode())
-                return
+                return "invalid_json"
+
+            pix_list = payload.get("pix", []) if isinstance(payload, dict) else None
 
-            pix_list = payload.get("pix", [])
+            if not isinstance(pix_list, list) or not all(
+                isinstance(pix_data, dict) for pix_data in pix_list
+            ):
+                self.send_response(400)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Invalid payload"}).encode())
+                return "invalid_payload"
 
             for pix_data in pix_list:
                 txid = pix_data.get("txid", "")
                 valor = pix_data.get("valor", "")
-                print(f"[{datetime.now().isoformat()}] PIX RECEIVED: txid={txid}, valor={valor}")
+                logger.info(
+                    "PIX received: txid=%s, valor=%s", txid, valor,
+                    extra={"txid": txid, "end_to_end_id": pix_data.get("endToEndId")},
+                )
+
+            # Only persist here; sheet writes and emails happen in the queue worker
+            # (src.jobs.drain_pix_queue) so Efí never waits on Sheets or SMTP.
+            # Without a usable queue the PIX is still acknowledged: Efí would only
+            # retry into the same failure, and process_payments picks it up from
+            # the PIX list on its next run.
+            PIX_RECEIVED.inc(len(pix_list))
+            queue = get_queue() if pix_list else None
+            outcome = "received"
+            queued = 0
+            if pix_list and queue is None:
+                if os.getenv("WEBHOOK_QUEUE_PATH"):
+                    outcome = "queue_error"
+                else:
+                    logger.warning(
+                        "PIX queue not configured (WEBHOOK_QUEUE_PATH); "
+                        "%s PIX left for process_payments", len(pix_list),
+                    )
+                    outcome = "not_queued"
+            elif queue is not None:
+                try:
+                    queued = queue.enqueue(pix_list)
+                except Exception as e:
+                    logger.error(
+                        "Could not queue %s PIX, leaving them for process_payments: %s",
+                        len(pix_list), e,
+                    )
+                    outcome = "queue_error"
+            PIX_QUEUED.inc(queued)
 
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
             self.end_headers()
             self.wfile.write(
-                json.dumps({"status": "received", "count": len(pix_list)}).encode()
+                json.dumps(
+                    {"status": "received", "count": len(pix_list), "queued": queued}
+                ).encode()
             )
+            return outcome
 
         except Exception as e:
-            print(f"Error: {e}")
+            logger.exception("Failed to handle webhook: %s", e)
             self.send_response(500)
             self.send_header("Content-Type", "application/json")
             self.end_headers()
             self.wfile.write(json.dumps({"error": "Internal server error"}).encode())
+            return "error"
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, drain_interval: Optional[float] = None) -> None:
+    """Run the handler on a threaded HTTP server, outside Vercel.
+
+    With ``drain_interval``, a background thread also drains the intake queue,
+    polling every ``drain_interval`` seconds while it is empty.
+    """
+    server = ThreadingHTTPServer((host, port), handler)
+    stop = threading.Event()
+    drainer = None
+    if drain_interval is not None:
+        if get_queue() is None:
+            raise SystemExit("--drain-interval needs WEBHOOK_QUEUE_PATH to point at a writable file")
+        # Imported here so the Vercel entry point never loads the sheet and email services.
+        from src.jobs.drain_pix_queue import drain_forever
+
+        drainer = threading.Thread(
+            target=drain_forever,
+            kwargs={"interval": drain_interval, "queue": get_queue(), "stop": stop},
+            name="pix-drain",
+            daemon=True,
+        )
+        drainer.start()
+        logger.info("Draining the PIX queue every %ss while idle", drain_interval)
+
+    logger.info("Webhook listening on http://%s:%s", host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        if drainer:
+            drainer.join()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the PIX webhook locally")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port (default: 8000)")
+    parser.add_argument(
+        "--drain-interval",
+        type=float,
+        help="Also drain the PIX queue in this process, polling every N seconds when idle",
+    )
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.drain_interval)
@@ -0,0 +1,194 @@
+"""
+In-memory stand-ins for EfiService, SheetsService and EmailService.
+
+They implement the methods the jobs call, keep call counters, and never touch
+the network, so whole job cycles can be replayed in milliseconds.
+"""
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from src.services.efi import PixCharge
+from src.services.email_transport import OutgoingEmail
+from src.services.roster import Roster
+from src.services.sheets import Member
+from src.utils.business_days import get_month_name_pt
+
+MONTH_COLUMNS = [get_month_name_pt(month) for month in range(1, 13)]
+
+
+class FakeSheetsService:
+    def __init__(self, member_count: int = 40, sheet_name: str = "2026"):
+        self.calls: Counter = Counter()
+        self.sheet_name = sheet_name
+        records = [
+            {"Pessoas": f"Membro {i:03d}", "Email": f"membro{i:03d}@example.com"}
+            for i in range(1, member_count + 1)
+        ]
+        self._rosters = {sheet_name: Roster.from_records(records, months=MONTH_COLUMNS)}
+
+    def get_roster(self, sheet_name: Optional[str] = None, refresh: bool = False) -> Roster:
+        self.calls["read"] += 1
+        return self._rosters[sheet_name or self.sheet_name]
+
+    def get_members(
+        self, sheet_name: Optional[str] = None, refresh: bool = False
+    ) -> list[Member]:
+        return self.get_roster(sheet_name, refresh).members
+
+    def get_unpaid_members(self, month: str, sheet_name: Optional[str] = None) -> list[Member]:
+        return self.get_roster(sheet_name).unpaid(month)
+
+    def invalidate_cache(self, sheet_name: Optional[str] = None) -> None:
+        pass
+
+    def mark_as_paid(self, name: str, month: str, sheet_name: Optional[str] = None) -> bool:
+        self.mark_many_as_paid([name], month, sheet_name)
+        return True
+
+    def mark_many_as_paid(
+        self, names: list[str], month: str, sheet_name: Optional[str] = None
+    ) -> list[str]:
+        return list(self.mark_cells_as_paid({name: [month] for name in names}, sheet_name))
+
+    def mark_cells_as_paid(
+        self, months_by_name: dict[str, list[str]], sheet_name: Optional[str] = None
+    ) -> dict[str, list[str]]:
+        self.calls["write"] += 1
+        marked: dict[str, list[str]] = {}
+        for member in self._rosters[sheet_name or self.sheet_name].members:
+            for month in months_by_name.get(member.name, []):
+                member.payment_status[month] = "Paid"
+                marked.setdefault(member.name, []).append(month)
+        return marked
+
+
+class FakeEfiService:
+    """Issues charges and simulates members paying them some days later.
+
+    The first charge a member gets in a month decides whether and when they
+    pay; later charges (reminders) do not change that.
+    """
+
+    def __init__(
+        self,
+        pay_probability: float = 0.9,
+        max_delay_days: int = 20,
+        seed: Optional[int] = None,
+    ):
+        self.calls: Counter = Counter()
+        self.pay_probability = pay_probability
+        self.max_delay_days = max_delay_days
+        self.today: Optional[date] = None
+        self._random = random.Random(seed)
+        self._scheduled: set[tuple[str, int, int]] = set()
+        self._received: list[dict] = []
+        self._charges: list[dict] = []
+        self._counter = 0
+
+    def create_pix_charge(
+        self,
+        valor: str,
+        nome_devedor: str,
+        cpf_devedor: Optional[str] = None,
+        descricao: str = "Caixinha do Trilha",
+        expiracao_segundos: int = 86400 * 7,
+    ) -> PixCharge:
+        self.calls["create_charge"] += 1
+        self._counter += 1
+        txid = f"sim{self._counter:029d}"
+
+        issued = self.today or date.today()
+        charge = {"txid": txid, "criacao": issued.isoformat() + "T12:00:00Z", "paid_on": None}
+        self._charges.append(charge)
+        key = (nome_devedor, issued.year, issued.month)
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            if self._random.random() < self.pay_probability:
+                paid_on = issued + timedelta(days=self._random.randint(0, self.max_delay_days))
+                charge["paid_on"] = paid_on
+                self._received.append({
+                    "endToEndId": f"E{self._counter:031d}",
+                    "txid": txid,
+                    "valor": valor,
+                    "horario": datetime(paid_on.year, paid_on.month, paid_on.day, 12).isoformat() + "Z",
+                    "pagador": {"nome": nome_devedor},
+                })
+
+        return PixCharge(
+            txid=txid,
+            status="ATIVA",
+            qr_code_base64="data:image/png;base64,",
+            copy_paste_code=f"00020101{txid}",
+            location_id=self._counter,
+            valor=valor,
+        )
+
+    def get_charge_status(self, txid: str) -> dict:
+        self.calls["charge_status"] += 1
+        return {"txid": txid, "status": "ATIVA"}
+
+    def _charge_status(self, charge: dict) -> str:
+        paid_on = charge["paid_on"]
+        if paid_on is not None and paid_on <= (self.today or date.today()):
+            return "CONCLUIDA"
+        return "ATIVA"
+
+    def list_charges(self, start_date: str, end_date: str, refresh: bool = False) -> list[dict]:
+        self.calls["list_charges"] += 1
+        return [
+            {"txid": charge["txid"], "status": self._charge_status(charge)}
+            for charge in self._charges
+            if start_date <= charge["criacao"] <= end_date
+        ]
+
+    def get_charge_statuses(
+        self, start_date: str, end_date: str, refresh: bool = False
+    ) -> dict[str, str]:
+        return {
+            charge["txid"]: charge["status"]
+            for charge in self.list_charges(start_date, end_date, refresh)
+        }
+
+    def list_received_pix(self, start_date: str, end_date: str) -> list:
+        self.calls["list_received"] += 1
+        return [pix for pix in self._received if start_date <= pix["horario"] <= end_date]
+
+
+class FakeEmailService:
+    """Renders nothing and counts messages per kind."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+
+    def render_charge_email(self, to: str, **kwargs) -> OutgoingEmail:
+        return OutgoingEmail(to=to, subject="", html="", kind="charge")
+
+    def render_reminder_email(self, to: str, **kwargs) -> OutgoingEmail:
+        return OutgoingEmail(to=to, subject="", html="", kind="reminder")
+
+    def render_confirmation_email(self, to: str, **kwargs) -> OutgoingEmail:
+        return OutgoingEmail(to=to, subject="", html="", kind="confirmation")
+
+    def send_many(self, messages: list[OutgoingEmail]) -> list[Optional[str]]:
+        if messages:
+            self.calls["send_batch"] += 1
+        for message in messages:
+            self.calls[message.kind] += 1
+        return [None] * len(messages)
+
+    def send_charge_email(self, to: str, **kwargs) -> dict:
+        self.send_many([self.render_charge_email(to)])
+        return {"status": "sent", "to": to}
+
+    def send_reminder_email(self, to: str, **kwargs) -> dict:
+        self.send_many([self.render_reminder_email(to)])
+        return {"status": "sent", "to": to}
+
+    def send_confirmation_email(self, to: str, **kwargs) -> dict:
+        self.send_many([self.render_confirmation_email(to)])
+        return {"status": "sent", "to": to}
+
+    def close(self) -> None:
+        pass
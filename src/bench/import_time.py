@@ -0,0 +1,106 @@
+"""
+Import-time benchmark for the job entry points.
+
+Each job module is imported in a fresh interpreter, several times, and the
+median import time is reported along with any heavy dependency (gspread,
+google.auth, requests, smtplib) the import pulled in. Those must only load
+when a service is used, so skip days and ``--help`` stay fast; the command
+exits non-zero if one of them shows up or a median exceeds ``--max-ms``.
+
+Usage:
+    python -m src.bench.import_time
+    python -m src.bench.import_time --repeat 10 --max-ms 150 src.jobs.send_reminders
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Optional
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+ROOT = str(__file__).rsplit("/src", 1)[0]
+
+MODULES = (
+    "src.jobs.generate_charges",
+    "src.jobs.send_reminders",
+    "src.jobs.stage_charges",
+    "src.jobs.process_payments",
+    "src.jobs.drain_pix_queue",
+    "src.jobs.send_outbox",
+    "src.jobs.collection_report",
+    "src.runner",
+)
+
+HEAVY_MODULES = ("gspread", "google.auth", "google.oauth2", "requests", "urllib3", "smtplib")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy}}))
+"""
+
+
+def measure_import(module: str, repeat: int = 5) -> dict:
+    """Median and best import time of ``module`` over ``repeat`` fresh interpreters."""
+    timings = []
+    heavy: list[str] = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        probe = json.loads(output.strip().splitlines()[-1])
+        timings.append(probe["ms"])
+        heavy = probe["heavy"]
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(timings), 1),
+        "best_ms": round(min(timings), 1),
+        "heavy": heavy,
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure how long the job modules take to import")
+    parser.add_argument("modules", nargs="*", help=f"Modules to import (default: {len(MODULES)} jobs)")
+    parser.add_argument("--repeat", type=int, default=5, help="Interpreters per module (default: 5)")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="Fail if a module's median import time exceeds this many milliseconds",
+    )
+    args = parser.parse_args(argv)
+
+    results = [measure_import(module, args.repeat) for module in args.modules or MODULES]
+    print(json.dumps(results, indent=2))
+
+    failures = [
+        f"{result['module']} imports {', '.join(result['heavy'])}"
+        for result in results
+        if result["heavy"]
+    ]
+    if args.max_ms is not None:
+        failures += [
+            f"{result['module']} takes {result['median_ms']} ms (limit {args.max_ms})"
+            for result in results
+            if result["median_ms"] > args.max_ms
+        ]
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Local stand-in for the Resend HTTP API.
+
+Accepts POST /emails and POST /emails/batch, checks the bearer token and the
+batch size limit, and answers with generated ids. Point the Resend transport
+at it with RESEND_API_URL.
+
+Usage:
+    python -m src.bench.resend_stub --port 8025 --latency-ms 40
+    RESEND_API_URL=http://127.0.0.1:8025 EMAIL_TRANSPORT=resend python -m src.jobs.send_reminders
+"""
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+BATCH_LIMIT = 100
+
+
+class ResendStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.counts: Counter = Counter()
+        self.messages: list[dict] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _record(self, kind: str, messages: list[dict]) -> None:
+        with self._lock:
+            self.counts[kind] += 1
+            self.counts["messages"] += len(messages)
+            self.messages.extend(messages)
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"null")
+
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    self._reply(401, {"name": "missing_api_key", "message": "Missing API key"})
+                    return
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                if self.path == "/emails":
+                    stub._record("single", [payload])
+                    self._reply(200, {"id": str(uuid.uuid4())})
+                elif self.path == "/emails/batch":
+                    if not isinstance(payload, list) or len(payload) > BATCH_LIMIT:
+                        self._reply(422, {"name": "validation_error", "message": "Invalid batch"})
+                        return
+                    if any("attachments" in message for message in payload):
+                        self._reply(
+                            422,
+                            {"name": "validation_error", "message": "Attachments not supported"},
+                        )
+                        return
+                    stub._record("batch", payload)
+                    self._reply(200, {"data": [{"id": str(uuid.uuid4())} for _ in payload]})
+                else:
+                    self._reply(404, {"name": "not_found", "message": self.path})
+
+        return Handler
+
+    def start(self) -> "ResendStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main(argv: Optional[list[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local Resend API stub")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8025, help="Port (default: 8025)")
+    parser.add_argument(
+        "--latency-ms", type=float, default=0.0, help="Artificial delay per request"
+    )
+    args = parser.parse_args(argv)
+
+    stub = ResendStub(args.host, args.port, args.latency_ms).start()
+    print(f"Resend stub listening on {stub.url}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"Requests so far: {dict(stub.counts)}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Replay a whole year of job runs against in-memory services.
+
+Every calendar day runs process_payments and send_reminders, and
+generate_charges runs on each day (it skips itself except on the 5th business
+day), exactly as the scheduled workflows would. Reports cumulative API calls,
+emails sent and runtime.
+
+Usage:
+    python -m src.bench.simulate_year --year 2026 --members 40
+"""
+import json
+import logging
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Optional
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.bench.fakes import FakeEfiService, FakeEmailService, FakeSheetsService
+from src.jobs.generate_charges import run_charge_generation
+from src.jobs.process_payments import run_process_payments
+from src.jobs.send_outbox import run_send_outbox
+from src.jobs.send_reminders import run_send_reminders
+from src.services.collection_stats import CollectionStats
+from src.services.email_outbox import EmailOutbox
+from src.services.idempotency import IdempotencyStore, SqliteLeaseBackend
+from src.services.payer_aliases import PayerAliases
+from src.services.reminder_schedule import ReminderSchedule
+
+
+def simulate_year(
+    year: int,
+    member_count: int = 40,
+    pay_probability: float = 0.9,
+    seed: Optional[int] = 0,
+    start: Optional[date] = None,
+    days: Optional[int] = None,
+) -> dict:
+    start = start or date(year, 1, 1)
+    end = start + timedelta(days=days) if days else date(year + 1, 1, 1)
+
+    sheets_service = FakeSheetsService(member_count=member_count)
+    efi_service = FakeEfiService(pay_probability=pay_probability, seed=seed)
+    email_service = FakeEmailService()
+    state_dir = tempfile.mkdtemp()
+    schedule = ReminderSchedule(state_dir + "/reminders.sqlite3")
+    store = IdempotencyStore(SqliteLeaseBackend(state_dir + "/leases.sqlite3"))
+    outbox = EmailOutbox(state_dir + "/email_outbox.sqlite3")
+    stats = CollectionStats(state_dir + "/collection_stats.sqlite3")
+    aliases = PayerAliases(state_dir + "/payer_aliases.json")
+    services = {
+        "sheets_service": sheets_service,
+        "efi_service": efi_service,
+        "email_service": email_service,
+    }
+
+    job_runs: Counter = Counter()
+    job_seconds: Counter = Counter()
+    started = time.perf_counter()
+
+    day = start
+    while day < end:
+        efi_service.today = day
+        for name, job, extra in [
+            (
+                "process_payments",
+                run_process_payments,
+                {
+                    "schedule": schedule,
+                    "store": store,
+                    "outbox": outbox,
+                    "stats": stats,
+                    "aliases": aliases,
+                },
+            ),
+            ("generate_charges", run_charge_generation, {"schedule": schedule, "stats": stats}),
+            ("send_reminders", run_send_reminders, {"schedule": schedule}),
+        ]:
+            job_started = time.perf_counter()
+            result = job(today=day, **services, **extra)
+            job_seconds[name] += time.perf_counter() - job_started
+            job_runs[f"{name}:{result['status']}"] += 1
+        job_started = time.perf_counter()
+        run_send_outbox(outbox=outbox, email_service=email_service)
+        job_seconds["send_outbox"] += time.perf_counter() - job_started
+        day += timedelta(days=1)
+
+    elapsed = time.perf_counter() - started
+
+    return {
+        "period": f"{start.isoformat()}..{(end - timedelta(days=1)).isoformat()}",
+        "members": member_count,
+        "runtime_seconds": round(elapsed, 3),
+        "job_runs": dict(sorted(job_runs.items())),
+        "job_seconds": {name: round(seconds, 3) for name, seconds in sorted(job_seconds.items())},
+        "efi_calls": dict(efi_service.calls),
+        "sheets_calls": dict(sheets_service.calls),
+        "emails_sent": dict(email_service.calls),
+        "emails_total": sum(
+            count for kind, count in email_service.calls.items() if kind != "send_batch"
+        ),
+        "collection_rate": {
+            report["period"]: report["collection_rate"]
+            for report in map(stats.report, stats.periods())
+        },
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate a year of caixinha jobs offline")
+    parser.add_argument("--year", type=int, default=date.today().year, help="Year to replay")
+    parser.add_argument("--members", type=int, default=40, help="Number of members in the roster")
+    parser.add_argument(
+        "--pay-probability",
+        type=float,
+        default=0.9,
+        help="Chance that a member pays a given month (default: 0.9)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--days", type=int, help="Only simulate this many days from Jan 1st")
+    args = parser.parse_args(argv)
+
+    # The jobs log every member; keep the simulation itself quiet.
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = simulate_year(
+        args.year,
+        member_count=args.members,
+        pay_probability=args.pay_probability,
+        seed=args.seed,
+        days=args.days,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
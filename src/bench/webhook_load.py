@@ -0,0 +1,210 @@
+"""
+Load generator for the PIX webhook.
+
+Sends realistic Efí webhook bodies to the handler at a given concurrency and
+reports throughput and latency percentiles per payload size. Without --url, the
+handler is started in-process on a ThreadingHTTPServer with a throwaway queue.
+
+Usage:
+    python -m src.bench.webhook_load --requests 2000 --concurrency 16 --pix 1,10,100
+    python -m src.bench.webhook_load --url http://127.0.0.1:8000/ --secret s3cr3t
+"""
+import http.client
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import urlparse
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+PAYER_NAMES = [
+    "Ana Beatriz Souza",
+    "Bruno Henrique Lima",
+    "Clara Medeiros",
+    "Diego Farias",
+    "Eduarda Nóbrega",
+    "Felipe Cavalcanti",
+]
+
+
+def _random_id(length: int, alphabet: str = string.ascii_letters + string.digits) -> str:
+    return "".join(random.choices(alphabet, k=length))
+
+
+def build_pix(pix_key: str = "caixinha@trilha.ufpb.br") -> dict:
+    """One PIX record shaped like the ones Efí posts to the webhook."""
+    now = datetime.now(timezone.utc)
+    return {
+        "endToEndId": f"E09089356{now:%Y%m%d%H%M}{_random_id(11)}",
+        "txid": _random_id(32, string.ascii_lowercase + string.digits),
+        "chave": pix_key,
+        "valor": "40.00",
+        "horario": now.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        "infoPagador": "Caixinha Trilha",
+        "pagador": {"nome": random.choice(PAYER_NAMES), "cpf": "***.456.789-**"},
+    }
+
+
+def build_body(pix_count: int) -> bytes:
+    return json.dumps({"pix": [build_pix() for _ in range(pix_count)]}).encode()
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class _Worker:
+    """Keeps one HTTP connection per thread and reopens it when the server closes it."""
+
+    def __init__(self, host: str, port: int, path: str):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def post(self, body: bytes) -> tuple[float, int]:
+        started = time.perf_counter()
+        conn = self._connection()
+        try:
+            conn.request(
+                "POST", self.path, body=body, headers={"Content-Type": "application/json"}
+            )
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            if response.will_close:
+                conn.close()
+                self._local.conn = None
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            status = 0
+        return time.perf_counter() - started, status
+
+
+def run_load(
+    url: str, requests: int, concurrency: int, pix_count: int, bodies: int = 50
+) -> dict:
+    parsed = urlparse(url)
+    path = parsed.path or "/"
+    if parsed.query:
+        path = f"{path}?{parsed.query}"
+
+    worker = _Worker(parsed.hostname, parsed.port or 80, path)
+    # Pre-build a pool of bodies so JSON encoding is not part of the measurement.
+    payloads = [build_body(pix_count) for _ in range(min(bodies, requests))]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(
+            executor.map(lambda i: worker.post(payloads[i % len(payloads)]), range(requests))
+        )
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status != 200)
+
+    return {
+        "pix_per_request": pix_count,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def start_local_server(secret: str = "") -> tuple[str, object]:
+    """Start the webhook on a ThreadingHTTPServer on a random port."""
+    import api.webhook as webhook
+
+    # Never load-test against a real queue file.
+    os.environ["WEBHOOK_QUEUE_PATH"] = os.path.join(tempfile.mkdtemp(), "pix_queue.sqlite3")
+    webhook._queue = None
+    webhook.WEBHOOK_SECRET = secret
+
+    class QuietHandler(webhook.handler):
+        def log_message(self, format, *args):
+            pass
+
+    server = webhook.ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/", server
+
+
+def _print_report(reports: list[dict]) -> None:
+    header = f"{'pix/req':>8} {'reqs':>7} {'conc':>5} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in reports:
+        print(
+            f"{r['pix_per_request']:>8} {r['requests']:>7} {r['concurrency']:>5} {r['errors']:>5} "
+            f"{r['requests_per_second']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+            f"{r['p99_ms']:>9.2f} {r['max_ms']:>9.2f}"
+        )
+
+
+def main(argv: Optional[list[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test the PIX webhook handler")
+    parser.add_argument("--url", help="Webhook URL; starts the handler in-process if omitted")
+    parser.add_argument("--secret", default="", help="Value for the ?hmac= query parameter")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per payload size")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument(
+        "--pix",
+        default="1,10,100",
+        help="Comma-separated PIX counts per request body (default: 1,10,100)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if not url:
+        url, server = start_local_server(args.secret)
+    if args.secret:
+        url = f"{url}{'&' if '?' in url else '?'}hmac={args.secret}"
+
+    try:
+        reports = [
+            run_load(url, args.requests, args.concurrency, int(count))
+            for count in args.pix.split(",")
+        ]
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        _print_report(reports)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Monthly collection report, read from the aggregates kept by charge day and
+payment reconciliation (no sheet or Efí calls).
+
+Prints, per month: members expected to pay, how many paid, the collection
+rate, the amount collected and the days from charge day to payment (median
+and 90th percentile). ``--csv``/``--parquet`` export the aggregate tables for
+a spreadsheet or notebook; Parquet needs pyarrow, which is not a dependency
+(``pip install pyarrow``).
+
+Usage:
+    python -m src.jobs.collection_report                  # every month
+    python -m src.jobs.collection_report --period 2026-03 --owing
+    python -m src.jobs.collection_report --csv reports/
+"""
+import json
+import logging
+import sys
+from typing import Optional
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.services.collection_stats import CollectionStats
+from src.utils.log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def render_collection_report(reports: list[dict]) -> str:
+    lines = [
+        "| Month | Members | Paid | Unpaid | Rate | Collected (R$) | Days to pay p50 | p90 |",
+        "|-------|---------|------|--------|------|----------------|-----------------|-----|",
+    ]
+    for report in reports:
+        rate = report["collection_rate"]
+        days = report["time_to_pay_days"]
+        lines.append(
+            f"| {report['period']} | {report['members']} | {report['paid']} "
+            f"| {report['unpaid']} | {'-' if rate is None else f'{rate:.0%}'} "
+            f"| {report['collected']} | {_or_dash(days['p50'])} | {_or_dash(days['p90'])} |"
+        )
+    return "\n".join(lines)
+
+
+def _or_dash(value: Optional[int]) -> str:
+    return "-" if value is None else str(value)
+
+
+def run_collection_report(
+    period: Optional[str] = None,
+    stats: Optional[CollectionStats] = None,
+    csv_dir: Optional[str] = None,
+    parquet_dir: Optional[str] = None,
+) -> dict:
+    """Reports for ``period`` (or every tracked month), exporting the tables if asked."""
+    stats = stats or CollectionStats()
+    periods = [period] if period else stats.periods()
+    reports = [report for report in map(stats.report, periods) if report]
+    if period and not reports:
+        return {"status": "error", "error": f"No collection data for {period}", "reports": []}
+
+    result = {"status": "success", "reports": reports}
+    try:
+        if csv_dir:
+            result["csv"] = [str(path) for path in stats.export_csv(csv_dir)]
+        if parquet_dir:
+            result["parquet"] = [str(path) for path in stats.export_parquet(parquet_dir)]
+    except Exception as e:
+        logger.error("Failed to export collection stats: %s", e)
+        return {**result, "status": "error", "error": str(e)}
+    return result
+
+
+def main():
+    import argparse
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Report monthly collection rates")
+    parser.add_argument("--period", help="Only this month, as YYYY-MM")
+    parser.add_argument(
+        "--owing",
+        action="store_true",
+        help="With --period, also list the members who have not paid",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    parser.add_argument("--csv", metavar="DIR", help="Export the aggregate tables as CSV to DIR")
+    parser.add_argument(
+        "--parquet",
+        metavar="DIR",
+        help="Export the aggregate tables as Parquet to DIR (needs pyarrow)",
+    )
+    args = parser.parse_args()
+
+    if args.owing and not args.period:
+        parser.error("--owing needs --period")
+
+    stats = CollectionStats()
+    result = run_collection_report(args.period, stats, args.csv, args.parquet)
+    if result["status"] == "error":
+        logger.error("Job failed: %s", result["error"])
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(result["reports"], indent=2, ensure_ascii=False))
+    else:
+        print(render_collection_report(result["reports"]))
+    if args.owing:
+        owing = stats.owing(args.period)
+        print(f"\nOwing for {args.period} ({len(owing)}):")
+        for name in owing:
+            print(f"- {name}")
+    for path in result.get("csv", []) + result.get("parquet", []):
+        logger.info("Wrote %s", path)
+
+
+if __name__ == "__main__":
+    main()
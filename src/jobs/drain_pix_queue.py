@@ -0,0 +1,263 @@
+import logging
+import os
+import sys
+import threading
+from datetime import date
+from typing import Optional
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.jobs.process_payments import apply_payments
+from src.jobs.send_outbox import run_send_outbox
+from src.services.collection_stats import CollectionStats
+from src.services.email import EmailService
+from src.services.email_outbox import EmailOutbox
+from src.services.idempotency import IdempotencyStore
+from src.services.payer_aliases import PayerAliases
+from src.services.pix_queue import PROCESSED, UNMATCHED, PixQueue
+from src.services.reminder_schedule import ReminderSchedule
+from src.services.sheets import SheetsService
+from src.utils.business_days import get_current_month_column
+from src.utils.log import setup_logging
+from src.utils.results import compact
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+# Longest wait between drains while whole batches keep failing.
+DEFAULT_MAX_BACKOFF = 300.0
+
+
+def run_drain_pix_queue(
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    queue: Optional[PixQueue] = None,
+    sheets_service: Optional[SheetsService] = None,
+    email_service: Optional[EmailService] = None,
+    store: Optional[IdempotencyStore] = None,
+    outbox: Optional[EmailOutbox] = None,
+    stats: Optional[CollectionStats] = None,
+    aliases: Optional[PayerAliases] = None,
+    schedule: Optional[ReminderSchedule] = None,
+    today: Optional[date] = None,
+) -> dict:
+    """Apply queued webhook PIX to the spreadsheet, one batched write per batch.
+
+    PIX are matched by the txid of the month's issued charges first, as in
+    ``process_payments``. PIX that another reconciler is applying right now
+    stay pending and are retried on the next drain. Confirmations go to the
+    email outbox.
+
+    When the whole batch fails (the roster cannot be read or the sheet write
+    fails) the result has status "error" and every PIX stays pending without
+    spending one of its attempts: the outage is not the PIX's fault.
+    """
+    today = today or date.today()
+    queue = queue or PixQueue()
+    store = store or IdempotencyStore()
+    outbox = outbox or EmailOutbox()
+    stats = stats or CollectionStats()
+    aliases = aliases or PayerAliases()
+
+    batch = queue.pending(limit=batch_size)
+    if not batch:
+        logger.info("PIX queue is empty.")
+        return {"status": "success", "processed": 0, "drained": 0}
+
+    logger.info("Draining %s queued PIX", len(batch))
+
+    owns_email_service = email_service is None
+    sheets_service = sheets_service or SheetsService()
+    email_service = email_service or EmailService()
+
+    try:
+        # A fresh read: the cron jobs or a hand edit may have changed the sheet.
+        members = sheets_service.get_members(refresh=True)
+        try:
+            members_by_txid = (schedule or ReminderSchedule()).charges(today.strftime("%Y-%m"))
+        except Exception as e:
+            logger.warning("Could not load issued charges, matching by payer name only: %s", e)
+            members_by_txid = {}
+        result = apply_payments(
+            batch,
+            members,
+            get_current_month_column(today),
+            sheets_service,
+            email_service,
+            members_by_txid=members_by_txid,
+            store=store,
+            outbox=outbox,
+            stats=stats,
+            aliases=aliases,
+            today=today,
+        )
+    except Exception as e:
+        logger.error("Failed to drain PIX queue, leaving %s PIX pending: %s", len(batch), e)
+        return {"status": "error", "error": str(e), "processed": 0, "drained": 0}
+    finally:
+        if owns_email_service:
+            email_service.close()
+
+    # On a failed sheet write the per-PIX errors are that one failure, repeated.
+    batch_failed = result["status"] == "error"
+    done = []
+    unmatched = []
+    for item in result["results"]:
+        if item["status"] in ["success", "already_paid"]:
+            done.append(item["end_to_end_id"])
+        elif item["status"] == "not_found":
+            unmatched.append(item["end_to_end_id"])
+        elif item["status"] == "locked" or batch_failed:
+            continue
+        else:
+            queue.mark_failed(item["end_to_end_id"], item.get("error", ""))
+
+    queue.mark(done, PROCESSED)
+    queue.mark(unmatched, UNMATCHED)
+
+    result["drained"] = len(done) + len(unmatched) if batch_failed else len(batch)
+    return result
+
+
+def _warn_if_leases_unshared() -> None:
+    if os.getenv("WEBHOOK_QUEUE_PATH") and not os.getenv("LEASE_PATH"):
+        logger.warning(
+            "LEASE_PATH is not set: payments are only coordinated with reconcilers "
+            "sharing this host's state directory"
+        )
+
+
+def drain_delay(
+    result: dict,
+    batch_size: int,
+    interval: float,
+    errors: int,
+    max_backoff: float = DEFAULT_MAX_BACKOFF,
+) -> float:
+    """Seconds to wait before the next drain; 0 to go straight on.
+
+    ``errors`` counts the failed drains in a row, this one included. Each
+    doubles the wait, up to ``max_backoff``; a full, successful batch means
+    more is waiting, and an idle or partly locked one waits ``interval``.
+    """
+    if errors:
+        return min(interval * 2 ** errors, max(max_backoff, interval))
+    if result.get("drained", 0) < batch_size or result.get("locked"):
+        return interval
+    return 0
+
+
+def drain_forever(
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    interval: float = 5.0,
+    queue: Optional[PixQueue] = None,
+    stop: Optional[threading.Event] = None,
+    max_backoff: float = DEFAULT_MAX_BACKOFF,
+) -> Optional[dict]:
+    """Drain the queue until ``stop`` is set, sleeping ``interval`` seconds when idle.
+
+    Services and stores are opened once and reused for every batch; emails
+    queued by a batch are sent right after it. Drains that fail as a whole
+    back off (see ``drain_delay``). Returns the last drain's result.
+    """
+    _warn_if_leases_unshared()
+    stop = stop or threading.Event()
+    queue = queue or PixQueue()
+    sheets_service = SheetsService()
+    email_service = EmailService()
+    store = IdempotencyStore()
+    outbox = EmailOutbox()
+    stats = CollectionStats()
+    aliases = PayerAliases()
+    schedule = ReminderSchedule()
+
+    result = None
+    errors = 0
+    try:
+        while not stop.is_set():
+            result = run_drain_pix_queue(
+                batch_size=batch_size,
+                queue=queue,
+                sheets_service=sheets_service,
+                email_service=email_service,
+                store=store,
+                outbox=outbox,
+                stats=stats,
+                aliases=aliases,
+                schedule=schedule,
+            )
+            if result.get("processed"):
+                run_send_outbox(outbox=outbox, email_service=email_service)
+
+            errors = errors + 1 if result["status"] == "error" else 0
+            delay = drain_delay(result, batch_size, interval, errors, max_backoff)
+            if errors:
+                logger.warning(
+                    "Drain failed %s time(s) in a row (%s); retrying in %ss",
+                    errors, result.get("error"), delay,
+                )
+            if delay:
+                stop.wait(delay)
+    finally:
+        email_service.close()
+    return result
+
+
+def main():
+    import argparse
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Apply PIX queued by the webhook")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Maximum PIX applied per sheet write (default: {DEFAULT_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--loop",
+        action="store_true",
+        help="Keep draining, sleeping --interval seconds when the queue is empty",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=5.0,
+        help="Seconds to wait between polls in --loop mode (default: 5)",
+    )
+    parser.add_argument(
+        "--max-backoff",
+        type=float,
+        default=DEFAULT_MAX_BACKOFF,
+        help="Longest wait after failed drains in --loop mode "
+        f"(default: {DEFAULT_MAX_BACKOFF:g})",
+    )
+    args = parser.parse_args()
+
+    if args.loop:
+        try:
+            drain_forever(args.batch_size, args.interval, max_backoff=args.max_backoff)
+        except KeyboardInterrupt:
+            logger.info("Drain worker stopped")
+        return
+
+    _warn_if_leases_unshared()
+    email_service = EmailService()
+    outbox = EmailOutbox()
+    try:
+        result = run_drain_pix_queue(
+            batch_size=args.batch_size, email_service=email_service, outbox=outbox
+        )
+        if result.get("processed"):
+            run_send_outbox(outbox=outbox, email_service=email_service)
+    finally:
+        email_service.close()
+
+    if result["status"] == "error":
+        logger.error("Job failed: %s", result.get('error'))
+        sys.exit(1)
+
+    logger.info("Job completed: %s", compact(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,93 +1,249 @@
+import json
 import logging
 import sys
 from datetime import date, timedelta
+from typing import Optional
 
 sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
 
+from src.services.arrears import MONTHLY_FEE, compute_arrears
+from src.services.collection_stats import CollectionStats, month_period
 from src.services.efi import EfiService
 from src.services.email import EmailService
+from src.services.reminder_schedule import ReminderSchedule
+from src.services.roster import Roster
 from src.services.sheets import SheetsService
 from src.utils.business_days import (
     get_current_month_column,
     get_nth_business_day,
     is_nth_business_day,
 )
+from src.utils.log import setup_logging
+from src.utils.plan import CHARGE, EMAIL, Action, Plan, render_plan
+from src.utils.profiling import add_profile_arguments, profile_if_requested, span
+from src.utils.results import ResultSink, compact
+from src.utils.sharding import filter_shard, parse_shard
+from src.utils.state import snapshot_state
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
-CHARGE_AMOUNT = "40.00"
+CHARGE_AMOUNT = MONTHLY_FEE
 CHARGE_EXPIRATION_DAYS = 7
 
 
-def calculate_due_date() -> str:
-    due_date = date.today() + timedelta(days=CHARGE_EXPIRATION_DAYS)
+def calculate_due_date(today: Optional[date] = None) -> str:
+    due_date = (today or date.today()) + timedelta(days=CHARGE_EXPIRATION_DAYS)
     return due_date.strftime("%d/%m/%Y")
 
 
-def run_charge_generation(force: bool = False) -> dict:
-    today = date.today()
+def run_charge_generation(
+    force: bool = False,
+    sheets_service: Optional[SheetsService] = None,
+    efi_service: Optional[EfiService] = None,
+    email_service: Optional[EmailService] = None,
+    today: Optional[date] = None,
+    schedule: Optional[ReminderSchedule] = None,
+    shard: Optional[tuple[int, int]] = None,
+    sink: Optional[ResultSink] = None,
+    dry_run: bool = False,
+    monthly_fee: str = CHARGE_AMOUNT,
+    stats: Optional[CollectionStats] = None,
+) -> dict:
+    """Charge every member with open months, ``monthly_fee`` per month.
+
+    With ``shard=(i, n)`` only members whose name hashes to shard ``i`` of
+    ``n`` are charged, so n processes can split charge day without overlap.
+    Per-member results go to ``sink`` (kept in memory if none is given).
+    With ``dry_run`` nothing is charged or sent; the result carries the plan.
+    The month's members are added to the collection report (``stats``).
+    """
+    today = today or date.today()
     
     if not force and not is_nth_business_day(today, n=5):
-        logger.info(f"Today ({today}) is not the 5th business day. Skipping.")
+        logger.info("Today (%s) is not the 5th business day. Skipping.", today)
         return {"status": "skipped", "reason": "not_5th_business_day", "charges": 0}
     
-    logger.info(f"Starting charge generation for {today}")
+    logger.info("Starting charge generation for %s", today)
+    
+    month_column = get_current_month_column(today)
+    logger.info("Looking for unpaid members in column: %s", month_column)
+    
+    owns_email_service = email_service is None
+    sheets_service = sheets_service or SheetsService()
+    efi_service = efi_service or EfiService()
+    email_service = email_service or EmailService()
+    if dry_run and not schedule:
+        schedule = ReminderSchedule(snapshot_state("reminders.sqlite3"))
+    schedule = schedule or ReminderSchedule()
+    
+    try:
+        return _charge_unpaid_members(
+            month_column,
+            today,
+            sheets_service,
+            efi_service,
+            email_service,
+            schedule,
+            shard,
+            sink or ResultSink(job="generate_charges"),
+            dry_run=dry_run,
+            monthly_fee=monthly_fee,
+            stats=stats or (None if dry_run else CollectionStats()),
+        )
+    finally:
+        if owns_email_service:
+            email_service.close()
+
+
+def open_collection_period(
+    stats: CollectionStats,
+    roster: Roster,
+    month_column: str,
+    sheet_name: str,
+    charge_day: date,
+    monthly_fee: str = CHARGE_AMOUNT,
+) -> None:
+    """Add the month's members to the collection report: paid, or blank and owing.
+
+    Members whose cell holds anything else ("Isento", a note) are not expected to pay.
+    """
+    owing = {member.name for member in roster.unpaid(month_column)}
+    paid = {member.name for member in roster.members if member.is_paid(month_column)}
+    try:
+        stats.open_period(
+            month_period(sheet_name, month_column, charge_day),
+            charge_day,
+            sorted(owing | paid),
+            already_paid=paid,
+            monthly_fee=monthly_fee,
+        )
+    except Exception as e:
+        logger.warning("Could not update collection stats: %s", e)
+
+
+def plan_charges(
+    roster: Roster,
+    month_column: str,
+    period: str,
+    charged: set[str],
+    shard: Optional[tuple[int, int]] = None,
+    monthly_fee: str = CHARGE_AMOUNT,
+) -> Plan:
+    """One charge (and charge email) per member with open months.
+
+    Members in ``charged`` already have a charge for ``period`` (e.g. from an
+    earlier, interrupted run) and are skipped.
+    """
+    plan = Plan("generate_charges")
     
-    month_column = get_current_month_column()
-    logger.info(f"Looking for unpaid members in column: {month_column}")
+    # Members are charged for every open month up to this one in a single charge.
+    arrears = compute_arrears(roster, month_column, monthly_fee)
+    unpaid_members = [member for member in roster.members if member.name in arrears]
+    if shard:
+        unpaid_members = filter_shard(unpaid_members, shard, key=lambda member: member.name)
+        logger.info("Shard %s/%s: %s members", shard[0], shard[1], len(unpaid_members))
     
-    sheets_service = SheetsService()
-    efi_service = EfiService()
-    email_service = EmailService()
+    for member in unpaid_members:
+        if member.name in charged:
+            plan.skip("already_charged")
+            continue
+        owed = arrears[member.name]
+        planned = plan.add(Action(
+            CHARGE,
+            member.name,
+            period,
+            detail=f"R$ {owed.amount} ({owed.description})",
+            data=(member, owed),
+        ))
+        if not planned:
+            continue
+        if member.email:
+            plan.add(Action(EMAIL, member.name, "charge", detail=member.email))
+        else:
+            plan.skip("no_email")
     
+    return plan
+
+
+def _charge_unpaid_members(
+    month_column: str,
+    today: date,
+    sheets_service: SheetsService,
+    efi_service: EfiService,
+    email_service: EmailService,
+    schedule: ReminderSchedule,
+    shard: Optional[tuple[int, int]],
+    sink: ResultSink,
+    dry_run: bool = False,
+    monthly_fee: str = CHARGE_AMOUNT,
+    stats: Optional[CollectionStats] = None,
+) -> dict:
+    period = today.strftime("%Y-%m")
     try:
-        unpaid_members = sheets_service.get_unpaid_members(month_column)
+        with span("fetch_members"):
+            roster = sheets_service.get_roster()
+            charged = set(schedule.charges(period).values())
     except Exception as e:
-        logger.error(f"Failed to get unpaid members: {e}")
+        logger.error("Failed to get unpaid members: %s", e)
         return {"status": "error", "error": str(e), "charges": 0}
     
-    if not unpaid_members:
+    plan = plan_charges(roster, month_column, period, charged, shard, monthly_fee)
+    
+    if dry_run:
+        return {"status": "planned", "charges": 0, "plan": plan.to_dict()}
+    
+    if stats:
+        open_collection_period(
+            stats, roster, month_column, sheets_service.sheet_name, today, monthly_fee
+        )
+    
+    if not plan:
         logger.info("No unpaid members found.")
-        return {"status": "success", "charges": 0}
+        return {"status": "success", "charges": 0, "skipped": dict(plan.skipped)}
     
-    logger.info(f"Found {len(unpaid_members)} unpaid members")
+    charges = plan.of_kind(CHARGE)
+    emailed = {action.member for action in plan.of_kind(EMAIL)}
+    logger.info("Found %s members with open months", len(charges))
     
-    due_date = calculate_due_date()
-    successful_charges = 0
-    failed_charges = 0
-    results = []
+    due_date = calculate_due_date(today)
+    outgoing = []
     
-    for member in unpaid_members:
+    for action in charges:
+        member, owed = action.data
         try:
-            logger.info(f"Processing member: {member.name} ({member.email})")
-            
-            charge = efi_service.create_pix_charge(
-                valor=CHARGE_AMOUNT,
-                nome_devedor=member.name,
-                descricao=f"Caixinha Trilha - {month_column}",
+            logger.debug(
+                "Processing member: %s (%s), owes %s (R$ %s)",
+                member.name, member.email, owed.description, owed.amount,
+                extra={"member": member.name},
             )
             
-            logger.info(f"Created charge for {member.name}: txid={charge.txid}")
+            with span("create_charges"):
+                charge = efi_service.create_pix_charge(
+                    valor=owed.amount,
+                    nome_devedor=member.name,
+                    descricao=f"Caixinha Trilha - {owed.description}",
+                )
+            
+            logger.info(
+                "Created charge for %s: txid=%s", member.name, charge.txid,
+                extra={"member": member.name, "txid": charge.txid},
+            )
+            schedule.record_charge(member.name, period, today, charge.txid)
             
-            if member.email:
-                email_service.send_charge_email(
+            if member.name in emailed:
+                message = email_service.render_charge_email(
                     to=member.email,
                     name=member.name,
                     qr_code_base64=charge.qr_code_base64,
                     pix_code=charge.copy_paste_code,
                     due_date=due_date,
-                    amount=CHARGE_AMOUNT,
+                    amount=owed.amount,
                 )
-                logger.info(f"Email sent to {member.email}")
-            else:
-                logger.warning(f"No email for member {member.name}, skipping email")
+                outgoing.append((member, charge, message))
+                continue
             
-            successful_charges += 1
-            results.append({
+            logger.warning("No email for member %s, skipping email", member.name)
+            sink.add({
                 "name": member.name,
                 "email": member.email,
                 "txid": charge.txid,
@@ -95,46 +251,111 @@ def run_charge_generation(force: bool = False) -> dict:
             })
             
         except Exception as e:
-            logger.error(f"Failed to process member {member.name}: {e}")
-            failed_charges += 1
-            results.append({
+            logger.error(
+                "Failed to process member %s: %s", member.name, e, extra={"member": member.name}
+            )
+            sink.add({
                 "name": member.name,
                 "email": member.email,
                 "status": "error",
                 "error": str(e),
             })
     
+    with span("send_emails"):
+        errors = email_service.send_many([message for _, _, message in outgoing])
+    
+    for (member, charge, _), error in zip(outgoing, errors):
+        if error:
+            sink.add({
+                "name": member.name,
+                "email": member.email,
+                "txid": charge.txid,
+                "status": "error",
+                "error": error,
+            })
+            continue
+        
+        sink.add({
+            "name": member.name,
+            "email": member.email,
+            "txid": charge.txid,
+            "status": "success",
+        })
+    
     logger.info(
-        f"Charge generation complete. "
-        f"Successful: {successful_charges}, Failed: {failed_charges}"
+        "Charge generation complete. Successful: %s, Failed: %s",
+        sink.counts['success'], sink.counts['error'],
     )
     
     return {
         "status": "success",
-        "charges": successful_charges,
-        "failed": failed_charges,
-        "results": results,
+        "charges": sink.counts["success"],
+        "failed": sink.counts["error"],
+        "skipped": dict(plan.skipped),
+        **sink.fields(),
     }
 
 
 def main():
     import argparse
     
+    setup_logging()
     parser = argparse.ArgumentParser(description="Generate PIX charges for unpaid members")
     parser.add_argument(
         "--force",
         action="store_true",
         help="Force execution even if not the 5th business day",
     )
+    parser.add_argument(
+        "--shard",
+        help="Only charge shard i of n members, e.g. 0/4 (partitioned by name hash)",
+    )
+    parser.add_argument(
+        "--results-file",
+        help="Write the job result as JSON to this file (e.g. for a workflow artifact)",
+    )
+    parser.add_argument(
+        "--results-jsonl",
+        help="Stream per-member results to this JSONL file instead of keeping them in memory",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the charges and emails that would be made, without making them",
+    )
+    add_profile_arguments(parser)
     args = parser.parse_args()
     
-    result = run_charge_generation(force=args.force)
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    sink = ResultSink(args.results_jsonl, job="generate_charges") if args.results_jsonl else None
+    try:
+        with profile_if_requested(args, "generate_charges"):
+            result = run_charge_generation(
+                force=args.force, shard=shard, sink=sink, dry_run=args.dry_run
+            )
+    finally:
+        if sink:
+            sink.close()
+    
+    if args.results_file:
+        with open(args.results_file, "w", encoding="utf-8") as f:
+            json.dump({"shard": args.shard or "0/1", **result}, f, indent=2, default=str)
     
     if result["status"] == "error":
-        logger.error(f"Job failed: {result.get('error')}")
+        logger.error("Job failed: %s", result.get('error'))
         sys.exit(1)
     
-    logger.info(f"Job completed: {result}")
+    if args.dry_run:
+        print(render_plan(result["plan"]) if "plan" in result else f"Nothing to plan: {result}")
+        return
+    
+    logger.info("Job completed: %s", compact(result))
 
 
 if __name__ == "__main__":
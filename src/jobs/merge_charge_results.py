@@ -0,0 +1,128 @@
+"""
+Combine the per-shard results of a sharded charge run.
+
+Each shard of ``generate_charges --shard i/n --results-file ...`` writes one
+JSON file; this step adds them up, writes a Markdown summary (to
+$GITHUB_STEP_SUMMARY when set) and fails if any shard failed or is missing.
+
+Usage:
+    python -m src.jobs.merge_charge_results results/*.json --shards 4
+"""
+import json
+import logging
+import os
+import sys
+from typing import Optional
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.utils.log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def merge_results(shard_results: list[dict], expected_shards: Optional[int] = None) -> dict:
+    statuses = [result.get("status", "error") for result in shard_results]
+    seen = {result.get("shard") for result in shard_results}
+    missing = []
+    if expected_shards:
+        missing = [
+            f"{i}/{expected_shards}"
+            for i in range(expected_shards)
+            if f"{i}/{expected_shards}" not in seen
+        ]
+
+    if "error" in statuses or missing:
+        status = "error"
+    elif statuses and all(s == "skipped" for s in statuses):
+        status = "skipped"
+    else:
+        status = "success"
+
+    return {
+        "status": status,
+        "shards": len(shard_results),
+        "missing_shards": missing,
+        "charges": sum(result.get("charges", 0) for result in shard_results),
+        "failed": sum(result.get("failed", 0) for result in shard_results),
+        "results": [
+            item for result in shard_results for item in result.get("results", [])
+        ],
+        "by_shard": {
+            result.get("shard", "?"): {
+                "status": result.get("status"),
+                "charges": result.get("charges", 0),
+                "failed": result.get("failed", 0),
+                "error": result.get("error"),
+            }
+            for result in shard_results
+        },
+    }
+
+
+def render_summary(merged: dict) -> str:
+    lines = [
+        "## Charge generation",
+        "",
+        f"Status: **{merged['status']}** - {merged['charges']} charges, "
+        f"{merged['failed']} failed across {merged['shards']} shards",
+        "",
+        "| Shard | Status | Charges | Failed |",
+        "|-------|--------|---------|--------|",
+    ]
+    for shard, result in sorted(merged["by_shard"].items()):
+        lines.append(
+            f"| {shard} | {result['status']} | {result['charges']} | {result['failed']} |"
+        )
+    for shard in merged["missing_shards"]:
+        lines.append(f"| {shard} | missing | - | - |")
+
+    failures = [item for item in merged["results"] if item.get("status") == "error"]
+    if failures:
+        lines += ["", "### Failures", ""]
+        lines += [f"- {item.get('name')}: {item.get('error')}" for item in failures]
+
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    import argparse
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Merge sharded charge generation results")
+    parser.add_argument("files", nargs="+", help="Per-shard JSON result files")
+    parser.add_argument("--shards", type=int, help="Number of shards expected")
+    parser.add_argument("--output", help="Write the merged result as JSON to this file")
+    args = parser.parse_args()
+
+    shard_results = []
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            shard_results.append(json.load(f))
+
+    merged = merge_results(shard_results, args.shards)
+    summary = render_summary(merged)
+
+    summary_path = os.getenv("GITHUB_STEP_SUMMARY")
+    if summary_path:
+        with open(summary_path, "a", encoding="utf-8") as f:
+            f.write(summary)
+    print(summary)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(merged, f, indent=2)
+
+    if merged["status"] == "error":
+        failed_shards = [
+            shard for shard, result in merged["by_shard"].items() if result["status"] == "error"
+        ]
+        logger.error(
+            "Charge generation failed in shards %s, missing shards %s",
+            failed_shards, merged['missing_shards'],
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Combine the job state (``.caixinha``) saved by each shard of a charge run.
+
+Every shard starts from the same restored state and only changes the rows of
+its own members: their reminder cadence, the txids of their charges and their
+collection stats. Saving each shard's directory to the cache would keep only
+one of them, losing the other shards' txid ledgers. This step takes one shard's
+state as the base, replaces every member row with the copy from the shard that
+member hashes to, recomputes the collection totals and writes the result, which
+the workflow then saves as the only cache entry of the run.
+
+Shard directories are named after their index (``charge-state-0``, ``.../2``);
+a missing shard leaves its members' rows as they were before the run.
+
+Usage:
+    python -m src.jobs.merge_charge_state state/charge-state-* --shards 4 --output .caixinha
+"""
+import logging
+import re
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.services.collection_stats import CollectionStats
+from src.utils.log import setup_logging
+from src.utils.sharding import shard_of
+
+logger = logging.getLogger(__name__)
+
+# The stores charge generation writes, each with member-keyed tables.
+SHARDED_STORES = ("reminders.sqlite3", "collection_stats.sqlite3")
+
+
+def shard_index(directory: Path) -> int:
+    """Shard number from a directory name ending in it (``charge-state-3`` -> 3)."""
+    match = re.search(r"(\d+)$", directory.name)
+    if not match:
+        raise ValueError(
+            f"Cannot tell the shard of '{directory}', expected a name ending in its number"
+        )
+    return int(match.group(1))
+
+
+def _copy_database(source: Path, target: Path) -> None:
+    # The backup API also picks up pages still in the source's WAL file.
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def _tables(conn: sqlite3.Connection, schema: str) -> dict[str, bool]:
+    """Tables of an attached database, mapped to whether they have a ``member`` column."""
+    tables = [
+        row[0]
+        for row in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")
+    ]
+    return {
+        table: any(
+            column[1] == "member"
+            for column in conn.execute(f"PRAGMA {schema}.table_info({table})")
+        )
+        for table in tables
+    }
+
+
+def merge_store(base: Path, shard_files: dict[int, Path], shards: int, target: Path) -> int:
+    """Write ``base`` to ``target`` with each member's rows taken from their shard.
+
+    Returns how many member rows were copied in from the shards.
+    """
+    _copy_database(base, target)
+    conn = sqlite3.connect(target)
+    conn.create_function(
+        "shard_of", 1, lambda member: shard_of(member, shards), deterministic=True
+    )
+    copied = 0
+    try:
+        for index, path in sorted(shard_files.items()):
+            conn.execute("ATTACH DATABASE ? AS shard", (str(path),))
+            try:
+                with conn:
+                    for table, by_member in _tables(conn, "shard").items():
+                        if not by_member:
+                            # Rows only a later shard created (a new period); totals
+                            # derived from member rows are rebuilt by the caller.
+                            conn.execute(
+                                f"INSERT OR IGNORE INTO main.{table} SELECT * FROM shard.{table}"
+                            )
+                            continue
+                        conn.execute(
+                            f"DELETE FROM main.{table} WHERE shard_of(member) = ?", (index,)
+                        )
+                        cursor = conn.execute(
+                            f"INSERT INTO main.{table} SELECT * FROM shard.{table} "
+                            "WHERE shard_of(member) = ?",
+                            (index,),
+                        )
+                        copied += cursor.rowcount
+            finally:
+                conn.execute("DETACH DATABASE shard")
+    finally:
+        conn.close()
+    return copied
+
+
+def merge_charge_state(shard_dirs: list[Path], shards: int, output: Path) -> dict:
+    """Merge the shards' state directories into ``output``."""
+    by_shard = {}
+    for directory in shard_dirs:
+        index = shard_index(directory)
+        if not 0 <= index < shards:
+            raise ValueError(f"Shard {index} of '{directory}' is outside 0..{shards - 1}")
+        by_shard[index] = directory
+    if not by_shard:
+        return {"status": "skipped", "reason": "no shard state"}
+
+    base_dir = by_shard[min(by_shard)]
+    output.mkdir(parents=True, exist_ok=True)
+    # Everything else is untouched by charge generation, so any shard's copy will do.
+    for path in base_dir.iterdir():
+        if path.name in SHARDED_STORES or path.name.endswith(("-wal", "-shm")):
+            continue
+        if path.is_file():
+            shutil.copy2(path, output / path.name)
+
+    merged = {}
+    for name in SHARDED_STORES:
+        shard_files = {
+            index: directory / name
+            for index, directory in by_shard.items()
+            if (directory / name).exists()
+        }
+        if not shard_files:
+            continue
+        base = shard_files[min(shard_files)]
+        target = output / name
+        target.unlink(missing_ok=True)
+        merged[name] = merge_store(base, shard_files, shards, target)
+        if name == "collection_stats.sqlite3":
+            CollectionStats(target).rebuild_totals()
+
+    missing = [f"{i}/{shards}" for i in range(shards) if i not in by_shard]
+    if missing:
+        logger.warning(
+            "No state from shards %s; their members keep the state from before the run", missing
+        )
+    return {
+        "status": "success",
+        "shards": sorted(by_shard),
+        "missing_shards": missing,
+        "rows": merged,
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    import argparse
+
+    setup_logging()
+    parser = argparse.ArgumentParser(
+        description="Merge the .caixinha state of a sharded charge run"
+    )
+    parser.add_argument(
+        "dirs", nargs="*", help="Per-shard state directories, named ending in the shard number"
+    )
+    parser.add_argument("--shards", type=int, required=True, help="Number of shards in the run")
+    parser.add_argument(
+        "--output", default=".caixinha", help="Merged state directory (default: .caixinha)"
+    )
+    args = parser.parse_args(argv)
+
+    shard_dirs = [Path(directory) for directory in args.dirs if Path(directory).is_dir()]
+    try:
+        result = merge_charge_state(shard_dirs, args.shards, Path(args.output))
+    except (ValueError, sqlite3.Error) as e:
+        logger.error("Job failed: %s", e)
+        sys.exit(1)
+    logger.info("Job completed: %s", result)
+
+
+if __name__ == "__main__":
+    main()
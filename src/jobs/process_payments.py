@@ -1,148 +1,695 @@
 import logging
 import sys
-from datetime import date, timedelta
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Optional
 
 sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
 
+from src.jobs.send_outbox import run_send_outbox
+from src.services.arrears import MONTHLY_FEE, allocate_payment, owed_months
+from src.services.collection_stats import CollectionStats, month_period
 from src.services.efi import EfiService
 from src.services.email import EmailService
-from src.services.sheets import SheetsService
+from src.services.email_outbox import EmailOutbox
+from src.services.idempotency import (
+    DONE,
+    LOCKED,
+    IdempotencyStore,
+    get_lease_backend,
+    member_month_key,
+    pix_key,
+)
+from src.services.payer_aliases import PayerAliases, normalize_name
+from src.services.reminder_schedule import ReminderSchedule
+from src.services.sheets import DEFAULT_SHEET_NAME, Member, SheetsService
 from src.utils.business_days import get_current_month_column
+from src.utils.log import setup_logging
+from src.utils.plan import EMAIL, WRITE_CELL, Action, Plan, render_plan
+from src.utils.polling import AdaptiveInterval
+from src.utils.profiling import add_profile_arguments, profile_if_requested, span
+from src.utils.results import ResultSink, compact
+from src.utils.state import read_cursor, snapshot_state, write_cursor
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
+CURSOR_NAME = "process_payments"
+
+
+def run_process_payments(
+    days_back: int = 1,
+    sheets_service: Optional[SheetsService] = None,
+    efi_service: Optional[EfiService] = None,
+    email_service: Optional[EmailService] = None,
+    today: Optional[date] = None,
+    schedule: Optional[ReminderSchedule] = None,
+    store: Optional[IdempotencyStore] = None,
+    outbox: Optional[EmailOutbox] = None,
+    stats: Optional[CollectionStats] = None,
+    aliases: Optional[PayerAliases] = None,
+    sink: Optional[ResultSink] = None,
+    dry_run: bool = False,
+    monthly_fee: str = MONTHLY_FEE,
+) -> dict:
+    """Reconcile PIX received in the last ``days_back`` days.
 
-def run_process_payments(days_back: int = 1) -> dict:
-    today = date.today()
+    Confirmation emails are queued in the outbox; ``send_outbox`` sends them.
+    With ``dry_run`` nothing is written; the result carries the plan.
+    """
+    today = today or date.today()
     start_date = today - timedelta(days=days_back)
     
-    logger.info(f"Checking for payments from {start_date} to {today}")
+    logger.info("Checking for payments from %s to %s", start_date, today)
     
-    efi_service = EfiService()
-    sheets_service = SheetsService()
-    email_service = EmailService()
-    
-    month_column = get_current_month_column()
+    owns_email_service = email_service is None
+    efi_service = efi_service or EfiService()
+    sheets_service = sheets_service or SheetsService()
+    email_service = email_service or EmailService()
     
+    try:
+        return _reconcile_payments(
+            start_date,
+            today,
+            efi_service,
+            sheets_service,
+            email_service,
+            schedule,
+            store,
+            outbox,
+            stats,
+            aliases,
+            sink,
+            dry_run,
+            monthly_fee,
+        )
+    finally:
+        if owns_email_service:
+            email_service.close()
+
+
+def _reconcile_payments(
+    start_date: date,
+    today: date,
+    efi_service: EfiService,
+    sheets_service: SheetsService,
+    email_service: EmailService,
+    schedule: Optional[ReminderSchedule] = None,
+    store: Optional[IdempotencyStore] = None,
+    outbox: Optional[EmailOutbox] = None,
+    stats: Optional[CollectionStats] = None,
+    aliases: Optional[PayerAliases] = None,
+    sink: Optional[ResultSink] = None,
+    dry_run: bool = False,
+    monthly_fee: str = MONTHLY_FEE,
+) -> dict:
     start_iso = start_date.isoformat() + "T00:00:00Z"
     end_iso = today.isoformat() + "T23:59:59Z"
     
+    return _reconcile_window(
+        start_iso,
+        end_iso,
+        today,
+        efi_service,
+        sheets_service,
+        email_service,
+        schedule,
+        store,
+        outbox=outbox,
+        stats=stats,
+        aliases=aliases,
+        sink=sink,
+        dry_run=dry_run,
+        monthly_fee=monthly_fee,
+    )
+
+
+def _reconcile_window(
+    start_iso: str,
+    end_iso: str,
+    today: date,
+    efi_service: EfiService,
+    sheets_service: SheetsService,
+    email_service: EmailService,
+    schedule: Optional[ReminderSchedule] = None,
+    store: Optional[IdempotencyStore] = None,
+    refresh_members: bool = False,
+    outbox: Optional[EmailOutbox] = None,
+    stats: Optional[CollectionStats] = None,
+    aliases: Optional[PayerAliases] = None,
+    sink: Optional[ResultSink] = None,
+    dry_run: bool = False,
+    monthly_fee: str = MONTHLY_FEE,
+) -> dict:
+    month_column = get_current_month_column(today)
+    
     try:
-        pix_list = efi_service.list_received_pix(start_iso, end_iso)
+        with span("fetch_payments"):
+            pix_list = efi_service.list_received_pix(start_iso, end_iso)
     except Exception as e:
-        logger.error(f"Failed to list received PIX: {e}")
+        logger.error("Failed to list received PIX: %s", e)
         return {"status": "error", "error": str(e), "processed": 0}
     
     if not pix_list:
         logger.info("No PIX payments found in the period.")
         return {"status": "success", "processed": 0}
     
-    logger.info(f"Found {len(pix_list)} PIX payments to process")
+    logger.info("Found %s PIX payments to process", len(pix_list))
     
     try:
-        members = sheets_service.get_members()
+        with span("fetch_members"):
+            members = sheets_service.get_members(refresh=refresh_members)
     except Exception as e:
-        logger.error(f"Failed to get members: {e}")
+        logger.error("Failed to get members: %s", e)
         return {"status": "error", "error": str(e), "processed": 0}
     
+    if dry_run:
+        # A dry run only reads the stores: use copies, and skip the write-only ones.
+        schedule = schedule or ReminderSchedule(snapshot_state("reminders.sqlite3"))
+        store = store or IdempotencyStore(get_lease_backend(snapshot=True))
+    
+    try:
+        members_by_txid = (schedule or ReminderSchedule()).charges(today.strftime("%Y-%m"))
+    except Exception as e:
+        logger.warning("Could not load issued charges, matching by payer name only: %s", e)
+        members_by_txid = {}
+    
+    return apply_payments(
+        pix_list,
+        members,
+        month_column,
+        sheets_service,
+        email_service,
+        members_by_txid=members_by_txid,
+        monthly_fee=monthly_fee,
+        store=store or IdempotencyStore(),
+        outbox=outbox or (None if dry_run else EmailOutbox()),
+        stats=stats or (None if dry_run else CollectionStats()),
+        aliases=aliases or PayerAliases(),
+        sink=sink,
+        dry_run=dry_run,
+        today=today,
+    )
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _utc_iso(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def run_payment_daemon(
+    min_interval: float = 30.0,
+    max_interval: float = 600.0,
+    overlap_seconds: int = 120,
+    initial_lookback_hours: int = 24,
+    max_polls: Optional[int] = None,
+    sheets_service: Optional[SheetsService] = None,
+    efi_service: Optional[EfiService] = None,
+    email_service: Optional[EmailService] = None,
+    schedule: Optional[ReminderSchedule] = None,
+    store: Optional[IdempotencyStore] = None,
+    outbox: Optional[EmailOutbox] = None,
+    stats: Optional[CollectionStats] = None,
+    aliases: Optional[PayerAliases] = None,
+    sink: Optional[ResultSink] = None,
+    today: Optional[date] = None,
+    clock: Callable[[], datetime] = _utc_now,
+    sleep: Callable[[float], None] = time.sleep,
+) -> dict:
+    """Poll for received PIX continuously, as a fallback for webhook delivery.
+
+    Each poll asks Efí only for the window since the saved cursor (minus a
+    small overlap for late-posted PIX; the idempotency store drops repeats).
+    The interval drops to ``min_interval`` after payments arrive or while
+    charges or reminders went out today, and doubles up to ``max_interval``
+    while idle or failing. Confirmations queued by a poll are sent from the
+    outbox right after it.
+    
+    Each poll's window ends at ``clock()`` (an aware datetime) and its month
+    is that of ``today``, if given, else the local date of ``clock()``.
+    """
+    owns_email_service = email_service is None
+    efi_service = efi_service or EfiService()
+    sheets_service = sheets_service or SheetsService()
+    email_service = email_service or EmailService()
+    schedule = schedule or ReminderSchedule()
+    store = store or IdempotencyStore()
+    outbox = outbox or EmailOutbox()
+    stats = stats or CollectionStats()
+    aliases = aliases or PayerAliases()
+    interval = AdaptiveInterval(min_interval, max_interval)
+    
+    cursor = read_cursor(CURSOR_NAME)
+    if cursor:
+        since = datetime.strptime(cursor, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    else:
+        since = clock() - timedelta(hours=initial_lookback_hours)
+    
+    polls = 0
+    totals = {"polls": 0, "processed": 0, "errors": 0}
+    
+    try:
+        while max_polls is None or polls < max_polls:
+            now = clock()
+            poll_day = today or now.astimezone().date()
+            window_start = since - timedelta(seconds=overlap_seconds)
+            
+            # A shared sink keeps counting across polls; only this poll's share matters.
+            before = sink.counts["success"] if sink else 0
+            result = _reconcile_window(
+                _utc_iso(window_start),
+                _utc_iso(now),
+                poll_day,
+                efi_service,
+                sheets_service,
+                email_service,
+                schedule,
+                store,
+                refresh_members=True,
+                outbox=outbox,
+                stats=stats,
+                aliases=aliases,
+                sink=sink,
+            )
+            polls += 1
+            totals["polls"] = polls
+            if sink:
+                processed = sink.counts["success"] - before
+            else:
+                processed = result.get("processed", 0)
+            
+            if result["status"] == "error":
+                # Listing or writing failed: the next poll asks for this window again.
+                totals["errors"] += 1
+                wait = interval.idle()
+            else:
+                # Only a poll whose PIX all reached the sheet moves the cursor.
+                since = now
+                write_cursor(CURSOR_NAME, _utc_iso(now))
+                totals["processed"] += processed
+                if processed:
+                    run_send_outbox(outbox=outbox, email_service=email_service)
+                
+                if processed or _charged_recently(schedule, poll_day):
+                    wait = interval.activity()
+                else:
+                    wait = interval.idle()
+            
+            logger.info(
+                "Poll %s: %s, processed %s; next poll in %.0fs",
+                polls, result['status'], processed, wait,
+            )
+            if max_polls is None or polls < max_polls:
+                sleep(wait)
+    except KeyboardInterrupt:
+        logger.info("Payment daemon stopped")
+    finally:
+        if owns_email_service:
+            email_service.close()
+    
+    return {"status": "success", **totals}
+
+
+def _charged_recently(schedule: ReminderSchedule, today: date) -> bool:
+    try:
+        return schedule.last_activity(today.strftime("%Y-%m")) == today
+    except Exception as e:
+        logger.warning("Could not read reminder schedule: %s", e)
+        return False
+
+
+def find_member(nome_pagador: str, members_by_name: dict[str, Member]) -> Optional[Member]:
+    member = members_by_name.get(nome_pagador)
+    
+    if not member:
+        for name, m in members_by_name.items():
+            if nome_pagador in name or name in nome_pagador:
+                member = m
+                break
+    
+    return member
+
+
+def plan_payments(
+    pix_list: list[dict],
+    members: list[Member],
+    month_column: str,
+    sink: ResultSink,
+    sheet_name: str = DEFAULT_SHEET_NAME,
+    members_by_txid: Optional[dict[str, str]] = None,
+    monthly_fee: str = MONTHLY_FEE,
+    store: Optional[IdempotencyStore] = None,
+    aliases: Optional[PayerAliases] = None,
+) -> Plan:
+    """Match received PIX to members and plan the cells and confirmations to write.
+
+    A PIX whose txid is in ``members_by_txid`` (txid -> member name, from the
+    charges we issued) is matched to that member; others are looked up in the
+    payer ``aliases`` (CPF/CNPJ, then known payer names) and finally matched
+    by payer name. Each payment covers the member's owed months oldest first, one
+    month per whole ``monthly_fee``, up to the month it was paid in; a payment
+    that covers no owed month still settles that month if it is open. Cells
+    already paid (in the sheet or, with a ``store``, by an earlier run) are
+    never planned, a PIX the ``store`` already applied is reported as already
+    paid, and a PIX listed twice is planned once. Unmatched and already-settled payments are
+    reported to ``sink`` here.
+    """
+    plan = Plan("process_payments")
     members_by_name = {m.name.lower().strip(): m for m in members}
+    members_by_exact_name = {m.name: m for m in members}
+    members_by_txid = members_by_txid or {}
     
-    processed = 0
-    already_paid = 0
-    not_found = 0
-    results = []
+    allocated: dict[str, set[str]] = {}
+    seen: set[str] = set()
     
     for pix in pix_list:
         txid = pix.get("txid", "")
+        end_to_end_id = pix.get("endToEndId", "")
         valor = pix.get("valor", "")
         pagador = pix.get("pagador", {})
         nome_pagador = pagador.get("nome", "").lower().strip()
         
-        logger.info(f"Processing PIX: txid={txid}, valor={valor}, pagador={nome_pagador}")
+        if end_to_end_id:
+            if end_to_end_id in seen:
+                plan.skip("duplicate")
+                continue
+            seen.add(end_to_end_id)
         
-        member = members_by_name.get(nome_pagador)
+        logger.debug(
+            "Processing PIX: txid=%s, valor=%s, pagador=%s", txid, valor, nome_pagador,
+            extra={"txid": txid, "end_to_end_id": end_to_end_id},
+        )
         
+        member = members_by_exact_name.get(members_by_txid.get(txid, ""))
+        if not member and aliases:
+            member = members_by_exact_name.get(aliases.lookup(pagador) or "")
         if not member:
-            for name, m in members_by_name.items():
-                if nome_pagador in name or name in nome_pagador:
-                    member = m
-                    break
+            member = find_member(nome_pagador, members_by_name)
         
         if not member:
-            logger.warning(f"Member not found for pagador: {nome_pagador}")
-            not_found += 1
-            results.append({
+            logger.warning(
+                "Member not found for pagador: %s", nome_pagador,
+                extra={"txid": txid, "end_to_end_id": end_to_end_id},
+            )
+            sink.add({
                 "txid": txid,
+                "end_to_end_id": end_to_end_id,
                 "pagador": nome_pagador,
                 "status": "not_found",
             })
             continue
         
-        current_status = member.payment_status.get(month_column, "").lower()
-        if current_status in ["paid", "pago"]:
-            logger.info(f"Member {member.name} already marked as paid for {month_column}")
-            already_paid += 1
-            results.append({
+        # A PIX listed again (overlapping windows, a replay) must not be
+        # allocated to the next open month, so applied ones are skipped first,
+        # and a payment never covers months after the one it was made in, which
+        # the sheet alone guards when the store is missing or was reset.
+        if store and end_to_end_id and store.pix_done(end_to_end_id):
+            months = []
+        else:
+            through = _paid_through(pix, member, month_column)
+            taken = allocated.setdefault(member.name, set())
+            if store:
+                taken |= store.done_months(
+                    sheet_name, member.name, owed_months(member, through) + [through]
+                )
+            owed = [month for month in owed_months(member, through) if month not in taken]
+            months = allocate_payment(owed, valor, monthly_fee)
+            if not months and through not in taken and not member.is_paid(through):
+                months = [through]
+        
+        if not months:
+            logger.info("Member %s has no open months up to %s", member.name, month_column)
+            plan.skip("already_paid")
+            sink.add({
                 "txid": txid,
+                "end_to_end_id": end_to_end_id,
                 "name": member.name,
                 "status": "already_paid",
             })
             continue
         
-        try:
-            sheets_service.mark_as_paid(member.name, month_column)
-            logger.info(f"Marked {member.name} as paid for {month_column}")
-            
-            if member.email:
-                try:
-                    email_service.send_confirmation_email(
-                        to=member.email,
-                        name=member.name,
-                        amount=valor,
-                        month=month_column,
+        allocated[member.name].update(months)
+        for month in months:
+            plan.add(Action(WRITE_CELL, member.name, month, detail="Paid", data=(member, pix)))
+        if member.email:
+            plan.add(Action(
+                EMAIL,
+                member.name,
+                end_to_end_id or txid,
+                detail=f"{member.email} R$ {valor} ({', '.join(months)})",
+            ))
+    
+    return plan
+
+
+def apply_payments(
+    pix_list: list[dict],
+    members: list[Member],
+    month_column: str,
+    sheets_service: SheetsService,
+    email_service: EmailService,
+    sheet_name: Optional[str] = None,
+    members_by_txid: Optional[dict[str, str]] = None,
+    monthly_fee: str = MONTHLY_FEE,
+    store: Optional[IdempotencyStore] = None,
+    outbox: Optional[EmailOutbox] = None,
+    stats: Optional[CollectionStats] = None,
+    aliases: Optional[PayerAliases] = None,
+    sink: Optional[ResultSink] = None,
+    dry_run: bool = False,
+    today: Optional[date] = None,
+) -> dict:
+    """Plan received PIX with ``plan_payments`` and apply the plan.
+
+    All sheet updates for the batch are applied in a single write;
+    confirmation emails are only sent once that write succeeded, and if it
+    fails the result's status is ``error``. With ``dry_run``, nothing is
+    written and the result carries the plan.
+
+    With a ``store``, each payment first claims its endToEndId and the
+    member-months it covers, so concurrent reconcilers (cron and webhook
+    drain) never write or confirm the same payment or month twice. Payments
+    whose keys another worker holds are reported as ``locked``.
+
+    With an ``outbox``, confirmations are queued there (before the claims are
+    completed) for a separate drain to send, instead of being sent inline.
+    With ``stats``, each paid member-month is added to the collection report.
+    With ``aliases``, payers confirmed by txid or by their exact name are
+    remembered for the next match (substring guesses are not).
+    Per-payment results go to ``sink`` (kept in memory if none is given).
+    A PIX without a ``horario`` counts as paid on ``today``.
+    """
+    today = today or date.today()
+    sink = sink or ResultSink(job="process_payments")
+    sheet_name = sheet_name or sheets_service.sheet_name
+    plan = plan_payments(
+        pix_list,
+        members,
+        month_column,
+        sink,
+        sheet_name=sheet_name,
+        members_by_txid=members_by_txid,
+        monthly_fee=monthly_fee,
+        store=store,
+        aliases=aliases,
+    )
+    
+    if dry_run:
+        return {**_summarize(sink), "status": "planned", "plan": plan.to_dict()}
+    
+    payments: dict[int, tuple[Member, dict, list[str]]] = {}
+    for action in plan.of_kind(WRITE_CELL):
+        member, pix = action.data
+        payments.setdefault(id(pix), (member, pix, []))[2].append(action.target)
+    confirmed = {(action.member, action.target) for action in plan.of_kind(EMAIL)}
+    
+    to_mark: list[tuple[Member, dict, list[str]]] = []
+    claims: list[list[str]] = []
+    
+    for member, pix, months in payments.values():
+        end_to_end_id = pix.get("endToEndId", "")
+        keys = []
+        if store:
+            keys = [member_month_key(sheet_name, month, member.name) for month in months]
+            if end_to_end_id:
+                keys.append(pix_key(end_to_end_id))
+            outcome = store.claim(keys)
+            if outcome in (LOCKED, DONE):
+                if outcome == LOCKED:
+                    logger.info(
+                        "Payment %s for %s is held by another worker", end_to_end_id, member.name
                     )
-                    logger.info(f"Confirmation email sent to {member.email}")
-                except Exception as e:
-                    logger.error(f"Failed to send confirmation email to {member.email}: {e}")
-            
-            processed += 1
-            results.append({
-                "txid": txid,
+                sink.add({
+                    "txid": pix.get("txid", ""),
+                    "end_to_end_id": end_to_end_id,
+                    "name": member.name,
+                    "status": "locked" if outcome == LOCKED else "already_paid",
+                })
+                continue
+        
+        to_mark.append((member, pix, months))
+        claims.append(keys)
+    
+    if not to_mark:
+        return _summarize(sink)
+    
+    try:
+        with span("write_sheets"):
+            months_by_name: dict[str, list[str]] = {}
+            for member, _, months in to_mark:
+                months_by_name.setdefault(member.name, []).extend(months)
+            marked = sheets_service.mark_cells_as_paid(months_by_name, sheet_name=sheet_name)
+    except Exception as e:
+        logger.error("Failed to mark %s payments as paid: %s", len(to_mark), e)
+        if store:
+            store.release(key for keys in claims for key in keys)
+        for member, pix, months in to_mark:
+            sink.add({
+                "txid": pix.get("txid", ""),
+                "end_to_end_id": pix.get("endToEndId", ""),
                 "name": member.name,
-                "email": member.email,
-                "status": "success",
+                "status": "error",
+                "error": str(e),
             })
-            
-        except Exception as e:
-            logger.error(f"Failed to mark {member.name} as paid: {e}")
-            results.append({
-                "txid": txid,
+        # Nothing was written: callers must not treat the batch as handled.
+        return {**_summarize(sink), "status": "error", "error": str(e)}
+    
+    confirmations = []
+    paid_months = []
+    completed = []
+    released = []
+    for (member, pix, months), keys in zip(to_mark, claims):
+        months = [month for month in months if month in marked.get(member.name, [])]
+        (completed if months else released).extend(keys)
+        if not months:
+            sink.add({
+                "txid": pix.get("txid", ""),
+                "end_to_end_id": pix.get("endToEndId", ""),
                 "name": member.name,
                 "status": "error",
-                "error": str(e),
+                "error": f"Member not found: {member.name}",
             })
+            continue
+        
+        logger.info(
+            "Marked %s as paid for %s", member.name, ", ".join(months),
+            extra={
+                "member": member.name,
+                "txid": pix.get("txid"),
+                "end_to_end_id": pix.get("endToEndId"),
+            },
+        )
+        
+        if aliases and _confirmed_payer(pix, member, members_by_txid):
+            aliases.learn(pix.get("pagador", {}), member.name)
+        
+        paid_on = _paid_on(pix, today)
+        paid_months.extend(
+            (month_period(sheet_name, month, paid_on), member.name, paid_on, monthly_fee)
+            for month in months
+        )
+        
+        payment_id = pix.get("endToEndId") or pix.get("txid", "")
+        if (member.name, payment_id) in confirmed:
+            confirmation_key = pix.get("endToEndId") or f"{member.name}:{','.join(months)}"
+            confirmations.append((
+                f"confirmation:{sheet_name}:{confirmation_key}",
+                email_service.render_confirmation_email(
+                    to=member.email,
+                    name=member.name,
+                    amount=pix.get("valor", ""),
+                    month=", ".join(months),
+                ),
+            ))
+        
+        sink.add({
+            "txid": pix.get("txid", ""),
+            "end_to_end_id": pix.get("endToEndId", ""),
+            "name": member.name,
+            "email": member.email,
+            "months": months,
+            "status": "success",
+        })
+    
+    # Email failures are logged by the transport and never undo a sheet write.
+    if outbox:
+        with span("queue_emails"):
+            outbox.add(confirmations)
+    else:
+        with span("send_emails"):
+            email_service.send_many([message for _, message in confirmations])
+    
+    if store:
+        store.complete(completed)
+        store.release(released)
     
+    # The report and the aliases are derived data; failing to save them never undoes a payment.
+    if stats and paid_months:
+        try:
+            stats.record_payments(paid_months)
+        except Exception as e:
+            logger.warning("Could not update collection stats: %s", e)
+    if aliases:
+        try:
+            aliases.save()
+        except Exception as e:
+            logger.warning("Could not save payer aliases: %s", e)
+    
+    return _summarize(sink)
+
+
+def _confirmed_payer(
+    pix: dict, member: Member, members_by_txid: Optional[dict[str, str]]
+) -> bool:
+    if (members_by_txid or {}).get(pix.get("txid", "")) == member.name:
+        return True
+    return normalize_name(pix.get("pagador", {}).get("nome", "")) == normalize_name(member.name)
+
+
+def _paid_through(pix: dict, member: Member, month_column: str) -> str:
+    """The last month a PIX may settle: its own payment month, if that is earlier."""
+    paid_on = _paid_on(pix, None)
+    if paid_on is None:
+        return month_column
+    paid_month = get_current_month_column(paid_on)
+    matrix = member.matrix
+    paid_col, current_col = matrix.column(paid_month), matrix.column(month_column)
+    if paid_col is not None and current_col is not None and paid_col < current_col:
+        return paid_month
+    return month_column
+
+
+def _paid_on(pix: dict, today: Optional[date]) -> Optional[date]:
+    """The day a PIX was paid, from its ``horario``; ``today`` if it has none."""
+    try:
+        return datetime.fromisoformat(pix["horario"].replace("Z", "+00:00")).date()
+    except (KeyError, ValueError):
+        return today
+
+
+def _summarize(sink: ResultSink) -> dict:
+    counts = sink.counts
     logger.info(
-        f"Payment processing complete. "
-        f"Processed: {processed}, Already paid: {already_paid}, Not found: {not_found}"
+        "Payment processing complete. Processed: %s, Already paid: %s, Not found: %s, Locked: %s",
+        counts['success'], counts['already_paid'], counts['not_found'], counts['locked'],
     )
     
     return {
         "status": "success",
-        "processed": processed,
-        "already_paid": already_paid,
-        "not_found": not_found,
-        "results": results,
+        "processed": counts["success"],
+        "already_paid": counts["already_paid"],
+        "not_found": counts["not_found"],
+        "locked": counts["locked"],
+        **sink.fields(),
     }
 
 
 def main():
     import argparse
     
+    setup_logging()
     parser = argparse.ArgumentParser(description="Process received PIX payments")
     parser.add_argument(
         "--days",
@@ -150,15 +697,61 @@ def main():
         default=1,
         help="Number of days to look back for payments (default: 1)",
     )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep polling for new payments (fallback for missed webhooks)",
+    )
+    parser.add_argument(
+        "--min-interval",
+        type=float,
+        default=30.0,
+        help="Daemon: seconds between polls while payments are arriving (default: 30)",
+    )
+    parser.add_argument(
+        "--max-interval",
+        type=float,
+        default=600.0,
+        help="Daemon: longest wait between polls when idle (default: 600)",
+    )
+    parser.add_argument(
+        "--results-jsonl",
+        help="Stream per-payment results to this JSONL file instead of keeping them in memory",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the cells and confirmations that would be written, without writing them",
+    )
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    if args.dry_run and args.daemon:
+        parser.error("--dry-run cannot be combined with --daemon")
     
-    result = run_process_payments(days_back=args.days)
+    sink = ResultSink(args.results_jsonl, job="process_payments") if args.results_jsonl else None
+    try:
+        with profile_if_requested(args, "process_payments"):
+            if args.daemon:
+                result = run_payment_daemon(
+                    min_interval=args.min_interval, max_interval=args.max_interval, sink=sink
+                )
+            else:
+                result = run_process_payments(
+                    days_back=args.days, sink=sink, dry_run=args.dry_run
+                )
+    finally:
+        if sink:
+            sink.close()
     
     if result["status"] == "error":
-        logger.error(f"Job failed: {result.get('error')}")
+        logger.error("Job failed: %s", result.get('error'))
         sys.exit(1)
     
-    logger.info(f"Job completed: {result}")
+    if args.dry_run:
+        print(render_plan(result["plan"]) if "plan" in result else f"Nothing to plan: {result}")
+        return
+    
+    logger.info("Job completed: %s", compact(result))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import logging
+import sys
+import time
+from typing import Optional
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.services.email import EmailService
+from src.services.email_outbox import EmailOutbox
+from src.utils.log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def run_send_outbox(
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    outbox: Optional[EmailOutbox] = None,
+    email_service: Optional[EmailService] = None,
+    max_batches: Optional[int] = None,
+) -> dict:
+    """Send every email due in the outbox, ``batch_size`` at a time.
+
+    All batches go through one email service, so the SMTP session or HTTP
+    connection is reused. Failed messages stay queued for a later retry.
+    """
+    outbox = outbox or EmailOutbox()
+
+    owns_email_service = email_service is None
+    email_service = email_service or EmailService()
+
+    sent = 0
+    failed = 0
+    batches = 0
+
+    try:
+        while max_batches is None or batches < max_batches:
+            batch = outbox.pending(limit=batch_size)
+            if not batch:
+                break
+            batches += 1
+
+            errors = email_service.send_many([message for _, message in batch])
+
+            delivered = []
+            for (message_id, message), error in zip(batch, errors):
+                if error:
+                    logger.error("Failed to send queued email to %s: %s", message.to, error)
+                    outbox.mark_failed(message_id, error)
+                    failed += 1
+                else:
+                    delivered.append(message_id)
+            outbox.mark_sent(delivered)
+            sent += len(delivered)
+
+            if len(batch) < batch_size:
+                break
+    finally:
+        if owns_email_service:
+            email_service.close()
+
+    logger.info("Outbox drained. Sent: %s, Failed: %s, Batches: %s", sent, failed, batches)
+    return {"status": "success", "sent": sent, "failed": failed, "batches": batches}
+
+
+def main():
+    import argparse
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Send emails queued in the outbox")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Maximum emails handed to the transport at once (default: {DEFAULT_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--loop",
+        action="store_true",
+        help="Keep draining, sleeping --interval seconds between passes",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=10.0,
+        help="Seconds to wait between passes in --loop mode (default: 10)",
+    )
+    args = parser.parse_args()
+
+    outbox = EmailOutbox()
+    email_service = EmailService()
+
+    try:
+        while True:
+            result = run_send_outbox(
+                batch_size=args.batch_size, outbox=outbox, email_service=email_service
+            )
+            if not args.loop:
+                break
+            time.sleep(args.interval)
+    finally:
+        email_service.close()
+
+    logger.info("Job completed: %s", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,129 +1,361 @@
 import logging
 import sys
 from datetime import date
+from typing import Optional
 
 sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
 
+from src.services.arrears import MONTHLY_FEE, Arrears, compute_arrears
 from src.services.efi import EfiService
 from src.services.email import EmailService
+from src.services.reminder_schedule import ReminderCadence, ReminderSchedule
+from src.services.roster import Member
 from src.services.sheets import SheetsService
 from src.utils.business_days import get_current_month_column, get_nth_business_day
+from src.utils.log import setup_logging
+from src.utils.plan import CHARGE, EMAIL, Action, Plan, render_plan
+from src.utils.profiling import add_profile_arguments, profile_if_requested, span
+from src.utils.results import ResultSink, compact
+from src.utils.state import snapshot_state
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
-CHARGE_AMOUNT = "40.00"
+CHARGE_AMOUNT = MONTHLY_FEE
 
 
-def run_send_reminders() -> dict:
-    today = date.today()
-    logger.info(f"Starting reminder job for {today}")
+def run_send_reminders(
+    sheets_service: Optional[SheetsService] = None,
+    efi_service: Optional[EfiService] = None,
+    email_service: Optional[EmailService] = None,
+    today: Optional[date] = None,
+    schedule: Optional[ReminderSchedule] = None,
+    sink: Optional[ResultSink] = None,
+    dry_run: bool = False,
+    monthly_fee: str = CHARGE_AMOUNT,
+) -> dict:
+    today = today or date.today()
+    logger.info("Starting reminder job for %s", today)
 
     # Check if we're past the 5th business day (when charges are sent)
     fifth_business_day = get_nth_business_day(today.year, today.month, n=5)
     if today <= fifth_business_day:
         logger.info(
-            f"Today ({today}) is before or on the 5th business day ({fifth_business_day}). "
-            "Skipping reminders - charges haven't been sent yet."
+            "Today (%s) is before or on the 5th business day (%s). "
+            "Skipping reminders - charges haven't been sent yet.",
+            today,
+            fifth_business_day,
         )
         return {"status": "skipped", "reason": "before_charges", "reminders": 0}
 
-    month_column = get_current_month_column()
-    logger.info(f"Looking for unpaid members in column: {month_column}")
+    month_column = get_current_month_column(today)
+    logger.info("Looking for unpaid members in column: %s", month_column)
 
-    sheets_service = SheetsService()
-    efi_service = EfiService()
-    email_service = EmailService()
+    owns_email_service = email_service is None
+    sheets_service = sheets_service or SheetsService()
+    efi_service = efi_service or EfiService()
+    email_service = email_service or EmailService()
+    if dry_run:
+        # Planning starts the cadence of newly charged members; do that on a copy.
+        schedule = schedule.snapshot() if schedule else ReminderSchedule(
+            snapshot_state("reminders.sqlite3")
+        )
+    schedule = schedule or ReminderSchedule()
 
     try:
-        unpaid_members = sheets_service.get_unpaid_members(month_column)
+        return _remind_unpaid_members(
+            month_column,
+            today,
+            fifth_business_day,
+            sheets_service,
+            efi_service,
+            email_service,
+            schedule,
+            sink or ResultSink(job="send_reminders"),
+            dry_run=dry_run,
+            monthly_fee=monthly_fee,
+        )
+    finally:
+        if owns_email_service:
+            email_service.close()
+
+
+def _remind_unpaid_members(
+    month_column: str,
+    today: date,
+    charge_day: date,
+    sheets_service: SheetsService,
+    efi_service: EfiService,
+    email_service: EmailService,
+    schedule: ReminderSchedule,
+    sink: ResultSink,
+    dry_run: bool = False,
+    monthly_fee: str = CHARGE_AMOUNT,
+) -> dict:
+    try:
+        with span("fetch_members"):
+            roster = sheets_service.get_roster()
     except Exception as e:
-        logger.error(f"Failed to get unpaid members: {e}")
+        logger.error("Failed to get unpaid members: %s", e)
         return {"status": "error", "error": str(e), "reminders": 0}
 
+    # Same months as charge day: blank cells only, so exempt members and notes
+    # are left alone, and earlier open months count even when this one is paid.
+    arrears = compute_arrears(roster, month_column, monthly_fee)
+    unpaid_members = [member for member in roster.members if member.name in arrears]
     if not unpaid_members:
         logger.info("No unpaid members found. No reminders to send.")
         return {"status": "success", "reminders": 0}
 
-    logger.info(f"Found {len(unpaid_members)} unpaid members")
-
-    successful_reminders = 0
-    failed_reminders = 0
-    results = []
+    logger.info("Found %s unpaid members", len(unpaid_members))
 
+    unpaid_by_name = {}
     for member in unpaid_members:
         if not member.email:
-            logger.warning(f"No email for member {member.name}, skipping")
-            results.append({
+            logger.warning("No email for member %s, skipping", member.name)
+            sink.add({
                 "name": member.name,
                 "status": "skipped",
                 "reason": "no_email",
             })
             continue
+        unpaid_by_name[member.name] = member
 
-        try:
-            logger.info(f"Processing member: {member.name} ({member.email})")
+    # The schedule is keyed by year and month, the sheet column by month only.
+    period = today.strftime("%Y-%m")
+
+    # Members charged before the schedule existed start their cadence on charge day.
+    schedule.ensure(list(unpaid_by_name), period, charge_day)
+
+    due_rows = schedule.due(period, today)
+    paid_by_charge = set()
+    if due_rows:
+        paid_by_charge = _members_with_paid_charges(efi_service, schedule, period, today)
+    settled = [
+        row["member"]
+        for row in due_rows
+        if row["member"] not in unpaid_by_name or row["member"] in paid_by_charge
+    ]
+
+    plan = plan_reminders(
+        due_rows,
+        unpaid_by_name,
+        arrears,
+        paid_by_charge,
+        period,
+        schedule.cadence,
+    )
+    plan.skip("no_email", len(unpaid_members) - len(unpaid_by_name))
+
+    if dry_run:
+        return {"status": "planned", "reminders": 0, "plan": plan.to_dict()}
+
+    if settled:
+        schedule.resolve(settled, period)
+
+    charges = plan.of_kind(CHARGE)
+    emails = {action.member: action for action in plan.of_kind(EMAIL)}
+    logger.info(
+        "%s of %s unpaid members are due a reminder today", len(charges), len(unpaid_by_name)
+    )
+
+    outgoing = []
+
+    for action in charges:
+        member, owed = action.data
+        reminder_number, escalated = emails[member.name].data
 
-            charge = efi_service.create_pix_charge(
-                valor=CHARGE_AMOUNT,
-                nome_devedor=member.name,
-                descricao=f"Caixinha Trilha - {month_column}",
+        try:
+            logger.debug(
+                "Processing member: %s (%s)", member.name, member.email,
+                extra={"member": member.name},
             )
 
-            logger.info(f"Created/retrieved charge for {member.name}: txid={charge.txid}")
+            with span("create_charges"):
+                charge = efi_service.create_pix_charge(
+                    valor=owed.amount,
+                    nome_devedor=member.name,
+                    descricao=f"Caixinha Trilha - {owed.description}",
+                )
+
+            logger.info(
+                "Created/retrieved charge for %s: txid=%s", member.name, charge.txid,
+                extra={"member": member.name, "txid": charge.txid},
+            )
 
-            email_service.send_reminder_email(
+            message = email_service.render_reminder_email(
                 to=member.email,
                 name=member.name,
                 qr_code_base64=charge.qr_code_base64,
                 pix_code=charge.copy_paste_code,
-                amount=CHARGE_AMOUNT,
+                amount=owed.amount,
+                escalated=escalated,
+                cc=list(schedule.cadence.escalation_cc),
             )
+            outgoing.append((member, charge, reminder_number, escalated, message))
 
-            logger.info(f"Reminder email sent to {member.email}")
-
-            successful_reminders += 1
-            results.append({
+        except Exception as e:
+            logger.error(
+                "Failed to send reminder to %s: %s", member.name, e, extra={"member": member.name}
+            )
+            sink.add({
                 "name": member.name,
                 "email": member.email,
-                "txid": charge.txid,
-                "status": "success",
+                "status": "error",
+                "error": str(e),
             })
 
-        except Exception as e:
-            logger.error(f"Failed to send reminder to {member.name}: {e}")
-            failed_reminders += 1
-            results.append({
+    with span("send_emails"):
+        errors = email_service.send_many([item[-1] for item in outgoing])
+
+    for (member, charge, reminder_number, escalated, _), error in zip(outgoing, errors):
+        if error:
+            logger.error(
+                "Failed to send reminder to %s: %s", member.name, error,
+                extra={"member": member.name, "txid": charge.txid},
+            )
+            sink.add({
                 "name": member.name,
                 "email": member.email,
                 "status": "error",
-                "error": str(e),
+                "error": error,
             })
+            continue
+
+        schedule.record_reminder(member.name, period, today, charge.txid)
+        logger.info(
+            "Reminder #%s sent to %s", reminder_number, member.email,
+            extra={"member": member.name, "txid": charge.txid},
+        )
+
+        sink.add({
+            "name": member.name,
+            "email": member.email,
+            "txid": charge.txid,
+            "reminder_number": reminder_number,
+            "escalated": escalated,
+            "status": "success",
+        })
 
     logger.info(
-        f"Reminder job complete. "
-        f"Successful: {successful_reminders}, Failed: {failed_reminders}"
+        "Reminder job complete. Successful: %s, Failed: %s",
+        sink.counts['success'], sink.counts['error'],
     )
 
     return {
         "status": "success",
-        "reminders": successful_reminders,
-        "failed": failed_reminders,
-        "results": results,
+        "reminders": sink.counts["success"],
+        "failed": sink.counts["error"],
+        "skipped": dict(plan.skipped),
+        **sink.fields(),
     }
 
 
+def plan_reminders(
+    due_rows: list,
+    unpaid_by_name: dict[str, Member],
+    arrears: dict[str, Arrears],
+    paid_by_charge: set[str],
+    period: str,
+    cadence: ReminderCadence,
+) -> Plan:
+    """A re-issued charge and a reminder email for every member due today.
+
+    Members the schedule has due but who no longer owe (no open month in
+    ``arrears``, or their charge is CONCLUIDA) are skipped.
+    """
+    plan = Plan("send_reminders")
+    for row in due_rows:
+        member = unpaid_by_name.get(row["member"])
+        if member is None or member.name in paid_by_charge:
+            plan.skip("already_paid")
+            continue
+
+        reminder_number = row["reminders_sent"] + 1
+        escalated = cadence.is_escalated(reminder_number)
+
+        # The reminder re-issues the charge for every open month, like charge day.
+        owed = arrears[member.name]
+
+        planned = plan.add(Action(
+            CHARGE,
+            member.name,
+            period,
+            detail=f"R$ {owed.amount} ({owed.description})",
+            data=(member, owed),
+        ))
+        if planned:
+            plan.add(Action(
+                EMAIL,
+                member.name,
+                f"reminder #{reminder_number}",
+                detail=member.email + (" (escalated)" if escalated else ""),
+                data=(reminder_number, escalated),
+            ))
+    return plan
+
+
+def _members_with_paid_charges(
+    efi_service: EfiService, schedule: ReminderSchedule, period: str, today: date
+) -> set[str]:
+    """Members with a CONCLUIDA charge this month that the sheet does not show yet.
+
+    Uses one paginated listing of the month's charges instead of a status call
+    per member; if the listing fails, nobody is skipped.
+    """
+    start_iso = today.replace(day=1).isoformat() + "T00:00:00Z"
+    end_iso = today.isoformat() + "T23:59:59Z"
+    try:
+        with span("sync_charges"):
+            statuses = efi_service.get_charge_statuses(start_iso, end_iso)
+    except Exception as e:
+        logger.warning("Could not sync charge statuses, reminding every due member: %s", e)
+        return set()
+
+    issued = schedule.charges(period)
+    paid = {
+        issued[txid]
+        for txid, status in statuses.items()
+        if status == "CONCLUIDA" and txid in issued
+    }
+    if paid:
+        logger.info("%s due members already paid a charge; skipping their reminders", len(paid))
+    return paid
+
+
 def main():
-    result = run_send_reminders()
+    import argparse
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Send payment reminders to unpaid members")
+    parser.add_argument(
+        "--results-jsonl",
+        help="Stream per-member results to this JSONL file instead of keeping them in memory",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the charges and reminders that would be sent, without sending them",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    sink = ResultSink(args.results_jsonl, job="send_reminders") if args.results_jsonl else None
+    try:
+        with profile_if_requested(args, "send_reminders"):
+            result = run_send_reminders(sink=sink, dry_run=args.dry_run)
+    finally:
+        if sink:
+            sink.close()
 
     if result["status"] == "error":
-        logger.error(f"Job failed: {result.get('error')}")
+        logger.error("Job failed: %s", result.get('error'))
         sys.exit(1)
 
-    logger.info(f"Job completed: {result}")
+    if args.dry_run:
+        print(render_plan(result["plan"]) if "plan" in result else f"Nothing to plan: {result}")
+        return
+
+    logger.info("Job completed: %s", compact(result))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,414 @@
+"""
+Pre-staged charge day.
+
+``stage`` runs ahead of charge day (e.g. overnight): it creates every
+member's charge, valid until the usual due date, renders the charge email with
+its QR code and stores it in the charge spool. ``--release`` runs at the
+scheduled time: it re-reads the sheet, drops members who paid meanwhile and
+sends the spooled emails in one batch, so every member gets theirs within
+seconds of each other.
+
+Members who joined after staging are not in the spool; ``generate_charges``
+(or ``--release --catch-up``) charges them, skipping everyone already staged.
+A release that finds nothing staged for the month charges everyone directly.
+
+Usage:
+    python -m src.jobs.stage_charges              # the night before charge day
+    python -m src.jobs.stage_charges --release    # on charge day
+"""
+import logging
+import sys
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.jobs.generate_charges import (
+    CHARGE_AMOUNT,
+    CHARGE_EXPIRATION_DAYS,
+    calculate_due_date,
+    open_collection_period,
+    plan_charges,
+    run_charge_generation,
+)
+from src.services.charge_spool import ChargeSpool
+from src.services.collection_stats import CollectionStats
+from src.services.efi import EfiService
+from src.services.email import EmailService
+from src.services.email_outbox import EmailOutbox
+from src.services.reminder_schedule import ReminderSchedule
+from src.services.sheets import SheetsService
+from src.utils.business_days import get_current_month_column, get_nth_business_day
+from src.utils.log import setup_logging
+from src.utils.plan import CHARGE, EMAIL, render_plan
+from src.utils.profiling import add_profile_arguments, profile_if_requested, span
+from src.utils.results import ResultSink, compact
+from src.utils.state import snapshot_state
+
+logger = logging.getLogger(__name__)
+
+# How many days before charge day staging may run.
+STAGE_LEAD_DAYS = 1
+
+# Charges listed at release to find the staged ones already paid.
+STATUS_WINDOW_DAYS = 7
+
+
+def next_charge_day(today: date) -> date:
+    """The 5th business day of this month, or of next month once it has passed."""
+    charge_day = get_nth_business_day(today.year, today.month, n=5)
+    if charge_day >= today:
+        return charge_day
+    first_of_next = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return get_nth_business_day(first_of_next.year, first_of_next.month, n=5)
+
+
+def charge_lifetime_seconds(charge_day: date, now: Optional[datetime] = None) -> int:
+    """Expiry for a charge created ``now`` that must last until its due date ends."""
+    now = now or datetime.now()
+    due_end = datetime.combine(charge_day + timedelta(days=CHARGE_EXPIRATION_DAYS), time.max)
+    return max(int((due_end - now).total_seconds()), 86400)
+
+
+def run_stage_charges(
+    force: bool = False,
+    sheets_service: Optional[SheetsService] = None,
+    efi_service: Optional[EfiService] = None,
+    email_service: Optional[EmailService] = None,
+    today: Optional[date] = None,
+    schedule: Optional[ReminderSchedule] = None,
+    spool: Optional[ChargeSpool] = None,
+    sink: Optional[ResultSink] = None,
+    dry_run: bool = False,
+    monthly_fee: str = CHARGE_AMOUNT,
+    stats: Optional[CollectionStats] = None,
+) -> dict:
+    """Create the next charge day's charges and spool their rendered emails.
+
+    Runs up to ``STAGE_LEAD_DAYS`` before charge day (any day with ``force``).
+    Charges are recorded in the reminder schedule as issued on charge day, so
+    reminders and reconciliation treat them like any other charge.
+    """
+    today = today or date.today()
+    charge_day = next_charge_day(today)
+    if not force and (charge_day - today).days > STAGE_LEAD_DAYS:
+        logger.info("Charge day is %s; too early to stage. Skipping.", charge_day)
+        return {"status": "skipped", "reason": "not_stage_day", "staged": 0}
+
+    month_column = get_current_month_column(charge_day)
+    period = charge_day.strftime("%Y-%m")
+    logger.info("Staging charges for %s (%s)", charge_day, month_column)
+
+    owns_email_service = email_service is None
+    sheets_service = sheets_service or SheetsService()
+    efi_service = efi_service or EfiService()
+    email_service = email_service or EmailService()
+    if dry_run:
+        schedule = schedule or ReminderSchedule(snapshot_state("reminders.sqlite3"))
+        spool = spool or ChargeSpool(snapshot_state("charge_spool.sqlite3"))
+    schedule = schedule or ReminderSchedule()
+    spool = spool or ChargeSpool()
+    sink = sink or ResultSink(job="stage_charges")
+
+    try:
+        try:
+            with span("fetch_members"):
+                roster = sheets_service.get_roster()
+                charged = set(schedule.charges(period).values()) | spool.members(period)
+        except Exception as e:
+            logger.error("Failed to get members: %s", e)
+            return {"status": "error", "error": str(e), "staged": 0}
+
+        plan = plan_charges(roster, month_column, period, charged, monthly_fee=monthly_fee)
+        if dry_run:
+            return {"status": "planned", "staged": 0, "plan": plan.to_dict()}
+        open_collection_period(
+            stats or CollectionStats(),
+            roster,
+            month_column,
+            sheets_service.sheet_name,
+            charge_day,
+            monthly_fee,
+        )
+
+        emailed = {action.member for action in plan.of_kind(EMAIL)}
+        due_date = calculate_due_date(charge_day)
+        lifetime = charge_lifetime_seconds(charge_day)
+
+        for action in plan.of_kind(CHARGE):
+            member, owed = action.data
+            try:
+                with span("create_charges"):
+                    charge = efi_service.create_pix_charge(
+                        valor=owed.amount,
+                        nome_devedor=member.name,
+                        descricao=f"Caixinha Trilha - {owed.description}",
+                        expiracao_segundos=lifetime,
+                    )
+
+                # The email is spooled before the charge is recorded: a member
+                # recorded as charged is skipped by every later run, so they must
+                # never be recorded without the email that carries their QR code.
+                if member.name in emailed:
+                    with span("render_emails"):
+                        message = email_service.render_charge_email(
+                            to=member.email,
+                            name=member.name,
+                            qr_code_base64=charge.qr_code_base64,
+                            pix_code=charge.copy_paste_code,
+                            due_date=due_date,
+                            amount=owed.amount,
+                        )
+                    spool.add(period, member.name, charge.txid, message)
+                else:
+                    logger.warning("No email for member %s, staging the charge only", member.name)
+                schedule.record_charge(member.name, period, charge_day, charge.txid)
+
+                logger.info(
+                    "Staged charge for %s: txid=%s", member.name, charge.txid,
+                    extra={"member": member.name, "txid": charge.txid},
+                )
+                sink.add({
+                    "name": member.name,
+                    "email": member.email,
+                    "txid": charge.txid,
+                    "status": "success",
+                })
+            except Exception as e:
+                logger.error(
+                    "Failed to stage charge for %s: %s", member.name, e,
+                    extra={"member": member.name},
+                )
+                sink.add({
+                    "name": member.name,
+                    "email": member.email,
+                    "status": "error",
+                    "error": str(e),
+                })
+
+        logger.info(
+            "Staging complete for %s. Staged: %s, Failed: %s",
+            charge_day, sink.counts["success"], sink.counts["error"],
+        )
+        return {
+            "status": "success",
+            "charge_day": charge_day.isoformat(),
+            "staged": sink.counts["success"],
+            "failed": sink.counts["error"],
+            "skipped": dict(plan.skipped),
+            **sink.fields(),
+        }
+    finally:
+        if owns_email_service:
+            email_service.close()
+
+
+def run_release_charges(
+    force: bool = False,
+    sheets_service: Optional[SheetsService] = None,
+    efi_service: Optional[EfiService] = None,
+    email_service: Optional[EmailService] = None,
+    today: Optional[date] = None,
+    spool: Optional[ChargeSpool] = None,
+    sink: Optional[ResultSink] = None,
+    catch_up: bool = False,
+    monthly_fee: str = CHARGE_AMOUNT,
+    outbox: Optional[EmailOutbox] = None,
+) -> dict:
+    """Send the spooled charge emails of today's charge day.
+
+    Members the fresh sheet shows as paid for the month, or whose staged
+    charge is already CONCLUIDA, are dropped instead of emailed. Emails that
+    fail to send are queued in the ``outbox``, which ``send_outbox`` retries
+    after charge day. With
+    ``catch_up``, members left out of staging are then charged as usual. If
+    nothing was staged for the month at all (the overnight run was skipped or
+    failed), every member is charged directly, as with ``catch_up``.
+    """
+    today = today or date.today()
+    if not force and next_charge_day(today) != today:
+        logger.info("Today (%s) is not the 5th business day. Skipping.", today)
+        return {"status": "skipped", "reason": "not_5th_business_day", "released": 0}
+
+    month_column = get_current_month_column(today)
+    period = today.strftime("%Y-%m")
+
+    owns_email_service = email_service is None
+    sheets_service = sheets_service or SheetsService()
+    efi_service = efi_service or EfiService()
+    email_service = email_service or EmailService()
+    spool = spool or ChargeSpool()
+    sink = sink or ResultSink(job="release_charges")
+
+    nothing_staged = not spool.members(period)
+    if nothing_staged:
+        logger.error(
+            "No charges were staged for %s; charging every member directly instead", period
+        )
+        catch_up = True
+
+    try:
+        staged = spool.staged(period)
+        logger.info("%s charge emails staged for %s", len(staged), period)
+
+        paid: set[str] = set()
+        if staged:
+            try:
+                with span("fetch_members"):
+                    roster = sheets_service.get_roster(refresh=True)
+                unpaid = {member.name for member in roster.unpaid(month_column)}
+                paid = {item.member for item in staged if item.member not in unpaid}
+            except Exception as e:
+                logger.error("Failed to refresh members: %s", e)
+                return {"status": "error", "error": str(e), "released": 0}
+            paid |= _paid_staged_charges(efi_service, staged, today)
+
+        if paid:
+            spool.drop(period, sorted(paid))
+            logger.info("%s staged members paid before release; not emailing them", len(paid))
+            for name in sorted(paid):
+                sink.add({"name": name, "status": "skipped", "reason": "already_paid"})
+
+        outgoing = [item for item in staged if item.member not in paid]
+        with span("send_emails"):
+            errors = email_service.send_many([item.message for item in outgoing])
+
+        sent = []
+        retries = []
+        for item, error in zip(outgoing, errors):
+            if error:
+                spool.mark_failed(period, item.member, error)
+                retries.append(item)
+                sink.add({
+                    "name": item.member,
+                    "email": item.message.to,
+                    "txid": item.txid,
+                    "status": "error",
+                    "error": error,
+                })
+                continue
+            sent.append(item.member)
+            sink.add({
+                "name": item.member,
+                "email": item.message.to,
+                "txid": item.txid,
+                "status": "success",
+            })
+        spool.mark_sent(period, sent)
+        if retries:
+            # Release only runs on charge day; the outbox keeps retrying after it.
+            (outbox or EmailOutbox()).add(
+                [(f"charge:{period}:{item.member}", item.message) for item in retries]
+            )
+            spool.mark_queued(period, [item.member for item in retries])
+            logger.warning("%s charge emails failed and were queued for retry", len(retries))
+
+        logger.info(
+            "Release complete. Sent: %s, Failed: %s, Dropped: %s",
+            len(sent), sink.counts["error"], len(paid),
+        )
+        result = {
+            "status": "success",
+            "released": len(sent),
+            "failed": sink.counts["error"],
+            "dropped": len(paid),
+            **sink.fields(),
+        }
+        if nothing_staged:
+            result["fallback"] = "nothing_staged"
+    finally:
+        if owns_email_service and not catch_up:
+            email_service.close()
+
+    if catch_up:
+        try:
+            result["catch_up"] = run_charge_generation(
+                force=True,
+                sheets_service=sheets_service,
+                efi_service=efi_service,
+                email_service=email_service,
+                today=today,
+                monthly_fee=monthly_fee,
+            )
+        finally:
+            if owns_email_service:
+                email_service.close()
+    return result
+
+
+def _paid_staged_charges(efi_service: EfiService, staged: list, today: date) -> set[str]:
+    start_iso = (today - timedelta(days=STATUS_WINDOW_DAYS)).isoformat() + "T00:00:00Z"
+    end_iso = today.isoformat() + "T23:59:59Z"
+    try:
+        with span("sync_charges"):
+            statuses = efi_service.get_charge_statuses(start_iso, end_iso)
+    except Exception as e:
+        logger.warning("Could not sync charge statuses, releasing every unpaid member: %s", e)
+        return set()
+    return {item.member for item in staged if statuses.get(item.txid) == "CONCLUIDA"}
+
+
+def main():
+    import argparse
+
+    setup_logging()
+    parser = argparse.ArgumentParser(
+        description="Stage charge day ahead of time, or release the staged emails"
+    )
+    parser.add_argument(
+        "--release",
+        action="store_true",
+        help="Send the staged emails to members who still owe (run on charge day)",
+    )
+    parser.add_argument(
+        "--catch-up",
+        action="store_true",
+        help="With --release, also charge members who were not staged",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Stage or release even if today is not the day for it",
+    )
+    parser.add_argument(
+        "--results-jsonl",
+        help="Stream per-member results to this JSONL file instead of keeping them in memory",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the charges and emails staging would make, without making them",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.catch_up and not args.release:
+        parser.error("--catch-up only applies to --release")
+    if args.dry_run and args.release:
+        parser.error("--dry-run only applies to staging")
+
+    job = "release_charges" if args.release else "stage_charges"
+    sink = ResultSink(args.results_jsonl, job=job) if args.results_jsonl else None
+    try:
+        with profile_if_requested(args, job):
+            if args.release:
+                result = run_release_charges(force=args.force, sink=sink, catch_up=args.catch_up)
+            else:
+                result = run_stage_charges(force=args.force, sink=sink, dry_run=args.dry_run)
+    finally:
+        if sink:
+            sink.close()
+
+    if result["status"] == "error" or result.get("catch_up", {}).get("status") == "error":
+        logger.error("Job failed: %s", result.get("error") or result["catch_up"].get("error"))
+        sys.exit(1)
+
+    if args.dry_run:
+        print(render_plan(result["plan"]) if "plan" in result else f"Nothing to plan: {result}")
+        return
+
+    logger.info("Job completed: %s", compact(result))
+
+
+if __name__ == "__main__":
+    main()
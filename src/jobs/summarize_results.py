@@ -0,0 +1,76 @@
+"""
+Summarize a JSONL results file written with --results-jsonl.
+
+Reads the file line by line (it may still be growing) and writes a Markdown
+table of counts per job and status, plus the failed members, to
+$GITHUB_STEP_SUMMARY when set and to stdout.
+
+Usage:
+    python -m src.jobs.summarize_results results.jsonl
+"""
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.utils.results import read_results
+
+MAX_LISTED_FAILURES = 50
+
+
+def render_results_summary(path: str) -> str:
+    counts: dict[str, Counter] = {}
+    failures = []
+    for record in read_results(path):
+        if "summary" in record:
+            continue
+        job = record.get("job", "")
+        status = record.get("status", "unknown")
+        counts.setdefault(job, Counter())[status] += 1
+        if status == "error" and len(failures) < MAX_LISTED_FAILURES:
+            failures.append(record)
+
+    statuses = sorted({status for job_counts in counts.values() for status in job_counts})
+    lines = [
+        "## Job results",
+        "",
+        "| Job | " + " | ".join(statuses) + " |",
+        "|-----|" + "|".join("---" for _ in statuses) + "|",
+    ]
+    for job, job_counts in counts.items():
+        lines.append(f"| {job} | " + " | ".join(str(job_counts[s]) for s in statuses) + " |")
+
+    if failures:
+        lines += ["", "### Failures", ""]
+        lines += [
+            f"- {record.get('job')}: {record.get('name') or record.get('end_to_end_id')}"
+            f" - {record.get('error', '')}"
+            for record in failures
+        ]
+
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a JSONL job results file")
+    parser.add_argument("path", help="Results file written with --results-jsonl")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"No results file at {args.path}")
+        return
+
+    summary = render_results_summary(args.path)
+
+    summary_path = os.getenv("GITHUB_STEP_SUMMARY")
+    if summary_path:
+        with open(summary_path, "a", encoding="utf-8") as f:
+            f.write(summary)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Run several jobs in a single process.
+
+Jobs share one instance of each service, so Efí and Google authentication, the
+member snapshot and the SMTP session are paid for once per run instead of once
+per job. Jobs always execute in the order of ``JOB_ORDER`` so that payments are
+reconciled before anyone is charged or reminded.
+
+With ``--tenants``, the jobs run for every group listed in a tenants file
+(see ``src.services.tenants``), several tenants at a time. Tenants share the
+Efí session, the Google Sheets session and the SMTP session; each has its own
+spreadsheet, PIX key, monthly fee, local state, optional rate limit and report.
+
+Usage:
+    python -m src.runner process_payments send_reminders send_outbox
+    python -m src.runner --all --days 2
+    python -m src.runner --all --tenants tenants.json --workers 4
+"""
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Callable, Optional
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.jobs.generate_charges import run_charge_generation
+from src.jobs.process_payments import run_process_payments
+from src.jobs.send_outbox import run_send_outbox
+from src.jobs.send_reminders import run_send_reminders
+from src.services.arrears import MONTHLY_FEE
+from src.services.efi import EfiService
+from src.services.email import EmailService
+from src.services.sheets import SheetsService
+from src.services.tenants import Tenant, load_tenants
+from src.utils.log import log_context, setup_logging
+from src.utils.plan import render_plan
+from src.utils.profiling import add_profile_arguments, profile_if_requested
+from src.utils.ratelimit import RateLimiter
+from src.utils.results import ResultSink, compact
+from src.utils.state import use_state_dir
+
+logger = logging.getLogger(__name__)
+
+JOB_ORDER = ["process_payments", "generate_charges", "send_reminders", "send_outbox"]
+
+
+def _build_jobs(
+    force: bool,
+    days_back: int,
+    today: Optional[date],
+    dry_run: bool = False,
+    monthly_fee: str = MONTHLY_FEE,
+) -> dict[str, Callable[..., dict]]:
+    return {
+        "process_payments": lambda **services: run_process_payments(
+            days_back=days_back, today=today, dry_run=dry_run, monthly_fee=monthly_fee, **services
+        ),
+        "generate_charges": lambda **services: run_charge_generation(
+            force=force, today=today, dry_run=dry_run, monthly_fee=monthly_fee, **services
+        ),
+        "send_reminders": lambda **services: run_send_reminders(
+            today=today, dry_run=dry_run, monthly_fee=monthly_fee, **services
+        ),
+        "send_outbox": lambda email_service, **_: run_send_outbox(email_service=email_service),
+    }
+
+
+# Jobs that report per-member results and accept a ResultSink.
+SINK_JOBS = {"process_payments", "generate_charges", "send_reminders"}
+
+# Jobs that can plan their writes without making them (--dry-run).
+PLAN_JOBS = {"process_payments", "generate_charges", "send_reminders"}
+
+
+def run_jobs(
+    job_names: list[str],
+    force: bool = False,
+    days_back: int = 1,
+    today: Optional[date] = None,
+    results_path: Optional[str] = None,
+    dry_run: bool = False,
+    services: Optional[dict] = None,
+    monthly_fee: str = MONTHLY_FEE,
+) -> dict:
+    """Run the selected jobs in ``JOB_ORDER`` with shared services.
+
+    With ``results_path``, per-member results of every job are streamed to
+    that JSONL file (tagged with the job name) instead of kept in memory.
+    With ``dry_run``, jobs only plan their writes and the outbox is not sent.
+    ``services`` given by the caller are used as they are and left open.
+    """
+    unknown = [name for name in job_names if name not in JOB_ORDER]
+    if unknown:
+        raise ValueError(f"Unknown jobs: {', '.join(unknown)}")
+
+    jobs = _build_jobs(
+        force=force, days_back=days_back, today=today, dry_run=dry_run, monthly_fee=monthly_fee
+    )
+    selected = [name for name in JOB_ORDER if name in job_names]
+    if dry_run:
+        selected = [name for name in selected if name in PLAN_JOBS]
+
+    owns_services = services is None
+    services = services or {
+        "sheets_service": SheetsService(),
+        "efi_service": EfiService(),
+        "email_service": EmailService(),
+    }
+
+    results = {}
+    failed = False
+
+    try:
+        for name in selected:
+            logger.info("Running job: %s", name)
+            started = time.perf_counter()
+            extra = {}
+            if results_path and name in SINK_JOBS:
+                extra["sink"] = ResultSink(results_path, job=name)
+            try:
+                result = jobs[name](**services, **extra)
+            except Exception as e:
+                logger.error("Job %s raised: %s", name, e)
+                result = {"status": "error", "error": str(e)}
+            finally:
+                if "sink" in extra:
+                    extra["sink"].close()
+            elapsed = time.perf_counter() - started
+
+            if result["status"] == "error":
+                failed = True
+
+            logger.info("Job %s finished with status=%s in %.2fs", name, result['status'], elapsed)
+            results[name] = {"elapsed_seconds": round(elapsed, 3), "result": result}
+    finally:
+        if owns_services:
+            services["email_service"].close()
+            services["efi_service"].close()
+
+    return {"status": "error" if failed else "success", "jobs": results}
+
+
+def run_tenants(
+    tenants: list[Tenant],
+    job_names: list[str],
+    force: bool = False,
+    days_back: int = 1,
+    today: Optional[date] = None,
+    results_dir: Optional[str] = None,
+    dry_run: bool = False,
+    workers: int = 4,
+) -> dict:
+    """Run the selected jobs for every tenant, up to ``workers`` tenants at a time.
+
+    One Efí session, one Google Sheets session and one email transport serve
+    all tenants; each tenant gets views of them bound to its spreadsheet and
+    PIX key, throttled by its own rate limit. Local state goes to the tenant's
+    state directory and, with ``results_dir``, results to ``<name>.jsonl``.
+    A tenant that fails does not stop the others.
+    """
+    efi_service = EfiService()
+    email_service = EmailService()
+    sheets_service = SheetsService(spreadsheet_id=tenants[0].spreadsheet_id)
+
+    limiters = {
+        tenant.name: RateLimiter(tenant.rate_limit) if tenant.rate_limit else None
+        for tenant in tenants
+    }
+
+    def run_tenant(tenant: Tenant) -> dict:
+        limiter = limiters[tenant.name]
+        results_path = str(Path(results_dir) / f"{tenant.name}.jsonl") if results_dir else None
+        started = time.perf_counter()
+        with log_context(tenant=tenant.name), use_state_dir(tenant.state_dir):
+            try:
+                services = {
+                    "sheets_service": tenant_sheets[tenant.name],
+                    "efi_service": efi_service.for_pix_key(tenant.pix_key, limiter),
+                    "email_service": email_service,
+                }
+                result = run_jobs(
+                    job_names,
+                    force=force,
+                    days_back=days_back,
+                    today=today,
+                    results_path=results_path,
+                    dry_run=dry_run,
+                    services=services,
+                    monthly_fee=tenant.monthly_fee,
+                )
+            except Exception as e:
+                logger.error("Tenant %s failed: %s", tenant.name, e)
+                result = {"status": "error", "error": str(e), "jobs": {}}
+        result["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        if limiter:
+            result["rate_limit"] = limiter.stats()
+        logger.info(
+            "Tenant %s finished with status=%s in %.2fs",
+            tenant.name, result["status"], result["elapsed_seconds"],
+            extra={"tenant": tenant.name},
+        )
+        return result
+
+    try:
+        # Authenticates once, before the tenant threads start sharing the session.
+        tenant_sheets = {
+            tenant.name: sheets_service.for_spreadsheet(
+                tenant.spreadsheet_id, tenant.sheet_name, limiters[tenant.name]
+            )
+            for tenant in tenants
+        }
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tenant") as pool:
+            results = dict(zip(
+                [tenant.name for tenant in tenants], pool.map(run_tenant, tenants)
+            ))
+    finally:
+        email_service.close()
+        efi_service.close()
+
+    failed = any(result["status"] == "error" for result in results.values())
+    return {"status": "error" if failed else "success", "tenants": results}
+
+
+def main():
+    import argparse
+
+    setup_logging()
+    parser = argparse.ArgumentParser(
+        description="Run several caixinha jobs in one process, sharing services"
+    )
+    parser.add_argument(
+        "jobs",
+        nargs="*",
+        metavar="JOB",
+        help=f"Jobs to run, executed in this order: {', '.join(JOB_ORDER)}",
+    )
+    parser.add_argument("--all", action="store_true", help="Run every job")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Force charge generation even if not the 5th business day",
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=1,
+        help="Number of days to look back for payments (default: 1)",
+    )
+    parser.add_argument(
+        "--results-jsonl",
+        help="Stream per-member results of every job to this JSONL file",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print what each job would write, without writing (send_outbox is skipped)",
+    )
+    parser.add_argument(
+        "--tenants",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="Run the jobs for every tenant listed in this JSON file (default: TENANTS_FILE)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Tenants to run at the same time with --tenants (default: 4)",
+    )
+    parser.add_argument(
+        "--results-dir",
+        help="With --tenants, stream each tenant's results to DIR/<tenant>.jsonl",
+    )
+    parser.add_argument(
+        "--report",
+        metavar="PATH",
+        help="Write the run result (per tenant and job) as JSON to this file",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    job_names = JOB_ORDER if args.all else args.jobs
+    if not job_names:
+        parser.error("give at least one job or --all")
+    unknown = [name for name in job_names if name not in JOB_ORDER]
+    if unknown:
+        parser.error(f"unknown jobs: {', '.join(unknown)}")
+
+    if args.tenants is not None:
+        if args.results_jsonl:
+            parser.error("use --results-dir with --tenants")
+        if args.workers < 1:
+            parser.error("--workers must be at least 1")
+        try:
+            tenants = load_tenants(args.tenants or None)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+
+    with profile_if_requested(args, "runner"):
+        if args.tenants is not None:
+            result = run_tenants(
+                tenants,
+                job_names,
+                force=args.force,
+                days_back=args.days,
+                results_dir=args.results_dir,
+                dry_run=args.dry_run,
+                workers=args.workers,
+            )
+            runs = result["tenants"]
+        else:
+            result = run_jobs(
+                job_names,
+                force=args.force,
+                days_back=args.days,
+                results_path=args.results_jsonl,
+                dry_run=args.dry_run,
+            )
+            runs = {"": result}
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, default=str)
+
+    for tenant, run in runs.items():
+        prefix = f"{tenant}/" if tenant else ""
+        if "error" in run:
+            logger.info("%s: error (%s)", tenant, run["error"])
+        for name, job in run["jobs"].items():
+            logger.info(
+                "%s%s: %s (%.2fs)", prefix, name, job['result']['status'], job['elapsed_seconds']
+            )
+
+    if result["status"] == "error":
+        logger.error("One or more jobs failed")
+        sys.exit(1)
+
+    if args.dry_run:
+        for tenant, run in runs.items():
+            for job in run["jobs"].values():
+                if "plan" in job["result"]:
+                    print(f"[{tenant}] " if tenant else "", end="")
+                    print(render_plan(job["result"]["plan"]))
+        return
+
+    logger.info("Runner completed: %s", compact(result))
+
+
+if __name__ == "__main__":
+    main()
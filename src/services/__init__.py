@@ -1,4 +1,22 @@
-from .sheets import SheetsService
-from .email import EmailService
+# Services are imported on first use: gspread and google.auth alone take a few
+# hundred milliseconds, which jobs that skip most days should not pay.
+from importlib import import_module
+
+_LAZY = {
+    "SheetsService": ".sheets",
+    "EmailService": ".email",
+}
 
 __all__ = ["SheetsService", "EmailService"]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
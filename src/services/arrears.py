@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Union
+
+from .roster import Member, Roster
+
+MONTHLY_FEE = "40.00"
+
+Amount = Union[str, Decimal]
+
+
+def to_decimal(value: Amount) -> Decimal:
+    try:
+        return Decimal(str(value).strip().replace(",", "."))
+    except InvalidOperation:
+        return Decimal("0")
+
+
+def format_amount(value: Decimal) -> str:
+    return f"{value.quantize(Decimal('0.01'))}"
+
+
+@dataclass
+class Arrears:
+    """Months a member still owes, oldest first."""
+
+    name: str
+    months: list[str]
+    monthly_fee: Decimal
+
+    @property
+    def total_due(self) -> Decimal:
+        return self.monthly_fee * len(self.months)
+
+    @property
+    def amount(self) -> str:
+        return format_amount(self.total_due)
+
+    @property
+    def description(self) -> str:
+        return ", ".join(self.months)
+
+
+def owed_months(member: Member, through: str) -> list[str]:
+    """Months one member owes up to and including ``through``, oldest first.
+
+    Blank months before the member's first marked month are not owed: they
+    joined after them.
+    """
+    matrix = member.matrix
+    if matrix.column(through) is None:
+        return []
+    return [matrix.months[col] for col in matrix.owed_columns(member.row, through)]
+
+
+def compute_arrears(
+    roster: Roster, through: str, monthly_fee: Amount = MONTHLY_FEE
+) -> dict[str, Arrears]:
+    """Outstanding months and total due for every member who owes something.
+
+    Rows are first filtered with one count over the status matrix; only rows
+    that owe anything are expanded into month names.
+    """
+    if roster.matrix.column(through) is None:
+        return {}
+
+    fee = to_decimal(monthly_fee)
+    owed_counts = roster.matrix.months_owed(through)
+    arrears = {}
+    for row, count in enumerate(owed_counts):
+        if not count:
+            continue
+        member = roster.members[row]
+        arrears[member.name] = Arrears(member.name, owed_months(member, through), fee)
+    return arrears
+
+
+def allocate_payment(
+    owed: list[str], valor: Amount, monthly_fee: Amount = MONTHLY_FEE
+) -> list[str]:
+    """Months a payment covers, oldest first.
+
+    A payment covers as many whole monthly fees as it contains, capped at the
+    number of months owed; amounts below one fee cover nothing.
+    """
+    fee = to_decimal(monthly_fee)
+    if fee <= 0:
+        return []
+    covered = int(to_decimal(valor) // fee)
+    return owed[:max(covered, 0)]
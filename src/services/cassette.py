@@ -0,0 +1,303 @@
+"""
+Record and replay the traffic of the external services.
+
+With ``CASSETTE_MODE=record``, ``EfiService`` and ``SheetsService`` talk to the
+real APIs and every request/response pair is appended to the cassette file
+(``CASSETTE_PATH``, one JSON interaction per line), and ``EmailService`` records
+each batch it hands to its transport. With ``CASSETTE_MODE=replay`` the same
+services answer from the cassette without opening a connection, waiting the
+recorded latency times ``CASSETTE_LATENCY_SCALE`` (1 by default, 0 for none).
+
+Secrets never reach the file: token and key fields in bodies are masked and the
+values of the credential variables are replaced by ``SCRUBBED_<NAME>``. On
+replay those variables default to the same placeholders, so the scripts run
+without credentials and their requests match the recording.
+"""
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .email_transport import EmailTransport, OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+RECORD = "record"
+REPLAY = "replay"
+
+SECRET_VARIABLES = (
+    "EFI_CLIENT_ID",
+    "EFI_CLIENT_SECRET",
+    "EFI_PIX_KEY",
+    "EFI_CERTIFICATE_BASE64",
+    "GOOGLE_CREDENTIALS_BASE64",
+    "SPREADSHEET_ID",
+    "RESEND_API_KEY",
+    "SMTP_EMAIL",
+    "SMTP_PASSWORD",
+)
+SECRET_FIELDS = {
+    "access_token",
+    "refresh_token",
+    "id_token",
+    "client_secret",
+    "private_key",
+    "cpf",
+    "cnpj",
+}
+MASK = "SCRUBBED"
+
+
+class CassetteMiss(LookupError):
+    """Raised on replay when the cassette has no answer for a request."""
+
+
+def placeholder(name: str) -> str:
+    return f"{MASK}_{name}"
+
+
+class Cassette:
+    """Interactions of one recording session, read from or appended to ``path``."""
+
+    def __init__(self, path: str, mode: str = RECORD, latency_scale: float = 1.0):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._interactions: list[dict] = []
+        self._by_request: dict[tuple, list[int]] = {}
+        self._by_route: dict[tuple, list[int]] = {}
+        self._used: set[int] = set()
+
+        if mode == REPLAY:
+            # Scripts read credentials at start-up; the placeholders are what was recorded.
+            for name in SECRET_VARIABLES:
+                os.environ.setdefault(name, placeholder(name))
+            self._load()
+            logger.info("Replaying %s interactions from %s", len(self._interactions), path)
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            logger.info("Recording interactions to %s", path)
+
+        self._secrets = {
+            os.environ[name]: placeholder(name)
+            for name in SECRET_VARIABLES
+            if os.environ.get(name)
+        }
+
+    def _load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                index = len(self._interactions)
+                self._interactions.append(entry)
+                request_key = (entry["service"], entry["method"], entry["url"], entry.get("body"))
+                self._by_request.setdefault(request_key, []).append(index)
+                route_key = (entry["service"], entry["method"], urlsplit(entry["url"]).path)
+                self._by_route.setdefault(route_key, []).append(index)
+
+    def scrub(self, text: Optional[str]) -> Optional[str]:
+        """``text`` with secret fields masked and credential values replaced."""
+        if not text:
+            return text
+        try:
+            text = json.dumps(_mask_fields(json.loads(text)), ensure_ascii=False)
+        except ValueError:
+            pass
+        for secret, name in self._secrets.items():
+            text = text.replace(secret, name)
+        return text
+
+    def record(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def lookup(self, service: str, method: str, url: str, body: Optional[str]) -> dict:
+        """The recorded answer for a request.
+
+        Requests are matched on URL and body first, then (for ones that carry
+        dates or other per-run values) on the URL path alone. Recordings of the
+        same request are served in order; the last one is repeated after that.
+        """
+        request_key = (service, method, url, body)
+        route_key = (service, method, urlsplit(url).path)
+        with self._lock:
+            for candidates in (
+                self._by_request.get(request_key, []),
+                self._by_route.get(route_key, []),
+            ):
+                for index in candidates:
+                    if index not in self._used:
+                        self._used.add(index)
+                        return self._interactions[index]
+            candidates = self._by_request.get(request_key) or self._by_route.get(route_key)
+            if candidates:
+                return self._interactions[candidates[-1]]
+        raise CassetteMiss(f"No recorded {service} interaction for {method} {url}")
+
+    def wait(self, elapsed: float) -> None:
+        if self.latency_scale > 0 and elapsed > 0:
+            time.sleep(elapsed * self.latency_scale)
+
+    def adapter(self, service: str, real: Optional[HTTPAdapter] = None) -> "CassetteAdapter":
+        return CassetteAdapter(self, service, real)
+
+    def transport(self, real: EmailTransport) -> "CassetteTransport":
+        return CassetteTransport(self, real)
+
+
+def _mask_fields(value):
+    if isinstance(value, dict):
+        return {
+            key: MASK if key.lower() in SECRET_FIELDS else _mask_fields(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_mask_fields(item) for item in value]
+    return value
+
+
+def _body_text(body) -> Optional[str]:
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        return body.decode("utf-8", errors="replace")
+    return str(body)
+
+
+class CassetteAdapter(HTTPAdapter):
+    """Transport adapter that records through ``real`` or answers from the cassette."""
+
+    def __init__(self, cassette: Cassette, service: str, real: Optional[HTTPAdapter] = None):
+        super().__init__()
+        self.cassette = cassette
+        self.service = service
+        self.real = real or HTTPAdapter()
+
+    def send(self, request, *args, **kwargs):
+        url = self.cassette.scrub(request.url)
+        body = self.cassette.scrub(_body_text(request.body))
+        if self.cassette.mode == REPLAY:
+            entry = self.cassette.lookup(self.service, request.method, url, body)
+            self.cassette.wait(entry["elapsed"])
+            return self._build_response(request, entry)
+
+        started = time.perf_counter()
+        response = self.real.send(request, *args, **kwargs)
+        elapsed = time.perf_counter() - started
+        entry = {
+            "service": self.service,
+            "method": request.method,
+            "url": url,
+            "body": body,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", ""),
+            "elapsed": round(elapsed, 6),
+        }
+        try:
+            entry["response"] = self.cassette.scrub(response.content.decode("utf-8"))
+        except UnicodeDecodeError:
+            entry["response_base64"] = base64.b64encode(response.content).decode("ascii")
+        self.cassette.record(entry)
+        return response
+
+    @staticmethod
+    def _build_response(request, entry: dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict({"Content-Type": entry.get("content_type", "")})
+        if "response_base64" in entry:
+            response._content = base64.b64decode(entry["response_base64"])
+        else:
+            response._content = (entry.get("response") or "").encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.reason = "Replayed"
+        response.elapsed = timedelta(seconds=entry["elapsed"])
+        return response
+
+    def close(self) -> None:
+        self.real.close()
+
+
+class CassetteTransport(EmailTransport):
+    """Email transport that records batches sent through ``real`` or replays their outcome.
+
+    Only recipients, subjects and per-message errors are kept, not the rendered HTML.
+    """
+
+    def __init__(self, cassette: Cassette, real: EmailTransport):
+        self.cassette = cassette
+        self.real = real
+
+    def _describe(self, messages: list[OutgoingEmail]) -> str:
+        return self.cassette.scrub(json.dumps(
+            [{"to": m.to, "cc": m.cc, "subject": m.subject, "kind": m.kind} for m in messages],
+            ensure_ascii=False,
+        ))
+
+    def send(self, message: OutgoingEmail) -> None:
+        error = self.send_batch([message])[0]
+        if error:
+            raise RuntimeError(error)
+
+    def send_batch(self, messages: list[OutgoingEmail]) -> list[Optional[str]]:
+        body = self._describe(messages)
+        if self.cassette.mode == REPLAY:
+            entry = self.cassette.lookup("email", "SEND", "email:batch", body)
+            self.cassette.wait(entry["elapsed"])
+            errors = list(entry["errors"])[: len(messages)]
+            return errors + [None] * (len(messages) - len(errors))
+
+        started = time.perf_counter()
+        errors = self.real.send_batch(messages)
+        self.cassette.record({
+            "service": "email",
+            "method": "SEND",
+            "url": "email:batch",
+            "body": body,
+            "errors": [self.cassette.scrub(error) for error in errors],
+            "elapsed": round(time.perf_counter() - started, 6),
+        })
+        return errors
+
+    def close(self) -> None:
+        self.real.close()
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The process-wide cassette configured by ``CASSETTE_MODE``, or None if unset."""
+    global _cassette
+    mode = os.getenv("CASSETTE_MODE", "").lower()
+    if not mode:
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(
+                os.getenv("CASSETTE_PATH", "cassettes/session.jsonl"),
+                mode,
+                float(os.getenv("CASSETTE_LATENCY_SCALE", "1")),
+            )
+    return _cassette
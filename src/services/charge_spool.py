@@ -0,0 +1,143 @@
+import logging
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from src.services.email_outbox import decode_message, encode_message
+from src.services.email_transport import OutgoingEmail
+from src.utils.state import get_state_path
+
+logger = logging.getLogger(__name__)
+
+STAGED = "staged"
+SENT = "sent"
+DROPPED = "dropped"
+QUEUED = "queued"
+
+
+@dataclass
+class StagedCharge:
+    member: str
+    txid: str
+    message: OutgoingEmail
+    attempts: int = 0
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ChargeSpool:
+    """Charge emails rendered ahead of charge day, waiting for their release.
+
+    Staging creates each member's charge and stores the fully rendered email
+    (HTML and QR code) keyed by member and ``YYYY-MM`` period. Release sends
+    the ones still owed and drops the rest; a message that fails to send is
+    handed to the email outbox, whose drain retries it, and marked queued.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        self.path = Path(path) if path else get_state_path("charge_spool.sqlite3")
+        self._init_schema()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_schema(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spool (
+                    period TEXT NOT NULL,
+                    member TEXT NOT NULL,
+                    txid TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'staged',
+                    staged_at TEXT NOT NULL,
+                    released_at TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    PRIMARY KEY (period, member)
+                )
+                """
+            )
+
+    def add(self, period: str, member: str, txid: str, message: OutgoingEmail) -> bool:
+        """Stage ``message`` for ``member``; False if the member is already staged."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO spool (period, member, txid, payload, staged_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (period, member, txid, encode_message(message), _now()),
+            )
+        return cursor.rowcount > 0
+
+    def members(self, period: str) -> set[str]:
+        """Members with a spooled email for ``period``, whatever its status."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT member FROM spool WHERE period = ?", (period,)).fetchall()
+        return {row["member"] for row in rows}
+
+    def staged(self, period: str) -> list[StagedCharge]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT member, txid, payload, attempts FROM spool "
+                "WHERE period = ? AND status = ? ORDER BY staged_at",
+                (period, STAGED),
+            ).fetchall()
+        return [
+            StagedCharge(row["member"], row["txid"], decode_message(row["payload"]), row["attempts"])
+            for row in rows
+        ]
+
+    def mark_sent(self, period: str, members: list[str]) -> None:
+        self._set_status(period, members, SENT)
+
+    def drop(self, period: str, members: list[str]) -> None:
+        """Release ``members`` without sending, e.g. because they paid meanwhile."""
+        self._set_status(period, members, DROPPED)
+
+    def _set_status(self, period: str, members: list[str], status: str) -> None:
+        now = _now()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE spool SET status = ?, released_at = ?, last_error = NULL "
+                "WHERE period = ? AND member = ?",
+                [(status, now, period, member) for member in members],
+            )
+
+    def mark_failed(self, period: str, member: str, error: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE spool SET attempts = attempts + 1, last_error = ? "
+                "WHERE period = ? AND member = ?",
+                (error, period, member),
+            )
+
+    def mark_queued(self, period: str, members: list[str]) -> None:
+        """Record that ``members``' emails were handed to the outbox after failing here."""
+        now = _now()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE spool SET status = ?, released_at = ? WHERE period = ? AND member = ?",
+                [(QUEUED, now, period, member) for member in members],
+            )
+
+    def counts(self, period: str) -> dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n FROM spool WHERE period = ? GROUP BY status",
+                (period,),
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
@@ -0,0 +1,322 @@
+import csv
+import logging
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+from src.utils.business_days import get_month_name_pt
+from src.utils.state import get_state_path
+
+from .arrears import Amount, to_decimal
+
+logger = logging.getLogger(__name__)
+
+# Time-to-pay is kept as a histogram of whole days; later payments share the last bucket.
+MAX_TRACKED_DAYS = 60
+
+MONTH_NUMBERS = {get_month_name_pt(month): month for month in range(1, 13)}
+
+TABLES = ("periods", "member_months", "time_to_pay")
+
+
+def month_period(sheet_name: str, month_column: str, on: date) -> str:
+    """``YYYY-MM`` of a month column; the year is the sheet's name when it is one."""
+    year = int(sheet_name) if sheet_name.isdigit() and len(sheet_name) == 4 else on.year
+    return f"{year}-{MONTH_NUMBERS[month_column]:02d}"
+
+
+def _cents(amount: Amount) -> int:
+    return int((to_decimal(amount) * 100).to_integral_value())
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class CollectionStats:
+    """Monthly collection aggregates, updated as charges go out and payments land.
+
+    Charge day opens a period with the members expected to pay; reconciliation
+    records each paid member-month once. The per-period totals and the
+    time-to-pay histogram are kept up to date on every write, so a report
+    reads one row and a fixed number of buckets whatever the history size.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        self.path = Path(path) if path else get_state_path("collection_stats.sqlite3")
+        self._init_schema()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_schema(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS periods (
+                    period TEXT PRIMARY KEY,
+                    charge_day TEXT,
+                    fee_cents INTEGER NOT NULL DEFAULT 0,
+                    members INTEGER NOT NULL DEFAULT 0,
+                    paid INTEGER NOT NULL DEFAULT 0,
+                    collected_cents INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS member_months (
+                    period TEXT NOT NULL,
+                    member TEXT NOT NULL,
+                    paid INTEGER NOT NULL DEFAULT 0,
+                    paid_on TEXT,
+                    amount_cents INTEGER,
+                    PRIMARY KEY (period, member)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_member_months_unpaid "
+                "ON member_months (period, paid)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS time_to_pay (
+                    period TEXT NOT NULL,
+                    days INTEGER NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (period, days)
+                )
+                """
+            )
+
+    def _ensure_period(self, conn: sqlite3.Connection, period: str) -> None:
+        conn.execute(
+            "INSERT OR IGNORE INTO periods (period, updated_at) VALUES (?, ?)", (period, _now())
+        )
+
+    def open_period(
+        self,
+        period: str,
+        charge_day: date,
+        members: Iterable[str],
+        already_paid: Iterable[str] = (),
+        monthly_fee: Amount = "0",
+    ) -> int:
+        """Start tracking ``period`` on charge day; returns how many members were added.
+
+        Members in ``already_paid`` count as paid, with no amount or time-to-pay.
+        Calling it again (a rerun, another shard) only adds new members.
+        """
+        already_paid = set(already_paid)
+        with self._connect() as conn:
+            self._ensure_period(conn, period)
+            conn.execute(
+                "UPDATE periods SET charge_day = ?, fee_cents = ?, updated_at = ? "
+                "WHERE period = ?",
+                (charge_day.isoformat(), _cents(monthly_fee), _now(), period),
+            )
+            added = paid = 0
+            for member in members:
+                is_paid = member in already_paid
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO member_months (period, member, paid) VALUES (?, ?, ?)",
+                    (period, member, int(is_paid)),
+                )
+                added += cursor.rowcount
+                paid += cursor.rowcount if is_paid else 0
+            conn.execute(
+                "UPDATE periods SET members = members + ?, paid = paid + ? WHERE period = ?",
+                (added, paid, period),
+            )
+        return added
+
+    def record_payments(self, payments: Iterable[tuple[str, str, date, Amount]]) -> int:
+        """Record ``(period, member, paid_on, amount)`` member-months as paid.
+
+        A member-month already recorded is ignored, so replays and overlapping
+        reconciliation windows never double count. Returns how many were new.
+        """
+        recorded = 0
+        with self._connect() as conn:
+            for period, member, paid_on, amount in payments:
+                self._ensure_period(conn, period)
+                cursor = conn.execute(
+                    "UPDATE member_months SET paid = 1, paid_on = ?, amount_cents = ? "
+                    "WHERE period = ? AND member = ? AND paid = 0",
+                    (paid_on.isoformat(), _cents(amount), period, member),
+                )
+                new_member = 0
+                if cursor.rowcount == 0:
+                    # Not expected on charge day (joined later, or before tracking began).
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO member_months "
+                        "(period, member, paid, paid_on, amount_cents) VALUES (?, ?, 1, ?, ?)",
+                        (period, member, paid_on.isoformat(), _cents(amount)),
+                    )
+                    if cursor.rowcount == 0:
+                        continue
+                    new_member = 1
+                recorded += 1
+                conn.execute(
+                    "UPDATE periods SET members = members + ?, paid = paid + 1, "
+                    "collected_cents = collected_cents + ?, updated_at = ? WHERE period = ?",
+                    (new_member, _cents(amount), _now(), period),
+                )
+
+                row = conn.execute(
+                    "SELECT charge_day FROM periods WHERE period = ?", (period,)
+                ).fetchone()
+                if row["charge_day"]:
+                    days = (paid_on - date.fromisoformat(row["charge_day"])).days
+                    days = min(max(days, 0), MAX_TRACKED_DAYS)
+                    conn.execute(
+                        "INSERT INTO time_to_pay (period, days, count) VALUES (?, ?, 1) "
+                        "ON CONFLICT (period, days) DO UPDATE SET count = count + 1",
+                        (period, days),
+                    )
+        return recorded
+
+    def rebuild_totals(self) -> None:
+        """Recompute the per-period totals and time-to-pay from ``member_months``.
+
+        Needed after member rows were copied in from another store (merging the
+        shards of a charge run), where the running totals cannot simply be added.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE periods SET
+                    members = (SELECT COUNT(*) FROM member_months m
+                               WHERE m.period = periods.period),
+                    paid = (SELECT COUNT(*) FROM member_months m
+                            WHERE m.period = periods.period AND m.paid = 1),
+                    collected_cents = (SELECT COALESCE(SUM(amount_cents), 0)
+                                       FROM member_months m
+                                       WHERE m.period = periods.period AND m.paid = 1)
+                """
+            )
+            conn.execute("DELETE FROM time_to_pay")
+            conn.execute(
+                """
+                INSERT INTO time_to_pay (period, days, count)
+                SELECT m.period,
+                       MIN(MAX(CAST(julianday(m.paid_on) - julianday(p.charge_day)
+                                    AS INTEGER), 0), ?),
+                       COUNT(*)
+                FROM member_months m JOIN periods p ON p.period = m.period
+                WHERE m.paid = 1 AND m.paid_on IS NOT NULL AND p.charge_day IS NOT NULL
+                GROUP BY 1, 2
+                """,
+                (MAX_TRACKED_DAYS,),
+            )
+
+    def report(self, period: str) -> Optional[dict]:
+        """Totals, collection rate and time-to-pay percentiles for ``period``."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM periods WHERE period = ?", (period,)).fetchone()
+            if row is None:
+                return None
+            buckets = conn.execute(
+                "SELECT days, count FROM time_to_pay WHERE period = ? ORDER BY days", (period,)
+            ).fetchall()
+
+        histogram = [(bucket["days"], bucket["count"]) for bucket in buckets]
+        members, paid = row["members"], row["paid"]
+        return {
+            "period": period,
+            "charge_day": row["charge_day"],
+            "members": members,
+            "paid": paid,
+            "unpaid": members - paid,
+            "collection_rate": round(paid / members, 4) if members else None,
+            "collected": f"{Decimal(row['collected_cents']) / 100:.2f}",
+            "expected": f"{Decimal(row['fee_cents'] * members) / 100:.2f}",
+            "time_to_pay_days": {
+                "p50": _percentile(histogram, 0.5),
+                "p90": _percentile(histogram, 0.9),
+                "histogram": {str(days): count for days, count in histogram},
+            },
+            "updated_at": row["updated_at"],
+        }
+
+    def periods(self) -> list[str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT period FROM periods ORDER BY period").fetchall()
+        return [row["period"] for row in rows]
+
+    def owing(self, period: str) -> list[str]:
+        """Members of ``period`` not recorded as paid."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT member FROM member_months WHERE period = ? AND paid = 0 ORDER BY member",
+                (period,),
+            ).fetchall()
+        return [row["member"] for row in rows]
+
+    def _rows(self, table: str) -> tuple[list[str], list[tuple]]:
+        with self._connect() as conn:
+            cursor = conn.execute(f"SELECT * FROM {table}")
+            rows = [tuple(row) for row in cursor.fetchall()]
+        return [column[0] for column in cursor.description], rows
+
+    def export_csv(self, directory: Union[str, Path]) -> list[Path]:
+        """Write each aggregate table to ``directory/<table>.csv``."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for table in TABLES:
+            columns, rows = self._rows(table)
+            path = directory / f"{table}.csv"
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(rows)
+            paths.append(path)
+        return paths
+
+    def export_parquet(self, directory: Union[str, Path]) -> list[Path]:
+        """Write each aggregate table to ``directory/<table>.parquet`` (needs pyarrow)."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError(
+                "Parquet export needs pyarrow (pip install pyarrow)"
+            ) from e
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for table in TABLES:
+            columns, rows = self._rows(table)
+            data = {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+            path = directory / f"{table}.parquet"
+            pq.write_table(pa.table(data), path)
+            paths.append(path)
+        return paths
+
+
+def _percentile(histogram: list[tuple[int, int]], fraction: float) -> Optional[int]:
+    total = sum(count for _, count in histogram)
+    if not total:
+        return None
+    threshold = fraction * total
+    seen = 0
+    for days, count in histogram:
+        seen += count
+        if seen >= threshold:
+            return days
+    return histogram[-1][0]
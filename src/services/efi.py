@@ -1,14 +1,28 @@
 import logging
 import os
 import base64
+import copy
 import tempfile
+import threading
+import time
 from dataclasses import dataclass
-from typing import Optional
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Optional
 
-from efipay import EfiPay
+from src.utils.ratelimit import RateLimiter
+
+# requests is imported when the first session is opened, not with this module.
+if TYPE_CHECKING:
+    import requests
 
 logger = logging.getLogger(__name__)
 
+PRODUCTION_URL = "https://pix.api.efipay.com.br"
+SANDBOX_URL = "https://pix-h.api.efipay.com.br"
+
+# Renew the OAuth token this long before Efí says it expires.
+TOKEN_REFRESH_MARGIN = 60
+
 
 @dataclass
 class PixCharge:
@@ -20,7 +34,56 @@ class PixCharge:
     valor: str
 
 
+@lru_cache(maxsize=None)
+def _counting_adapter_class() -> type:
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPSConnectionPool
+
+    class CountingAdapter(HTTPAdapter):
+        """HTTPAdapter that counts requests and the connections opened for them.
+
+        Every new HTTPS connection to Efí costs a TCP and a client-certificate TLS
+        handshake; any request beyond that count went over a kept-alive one.
+        """
+
+        def __init__(self, *args, **kwargs):
+            self._lock = threading.Lock()
+            self.requests = 0
+            self.handshakes = 0
+            super().__init__(*args, **kwargs)
+
+        def init_poolmanager(self, *args, **kwargs) -> None:
+            super().init_poolmanager(*args, **kwargs)
+            adapter = self
+
+            class CountingPool(HTTPSConnectionPool):
+                def _new_conn(self):
+                    with adapter._lock:
+                        adapter.handshakes += 1
+                    return super()._new_conn()
+
+            self.poolmanager.pool_classes_by_scheme = {
+                **self.poolmanager.pool_classes_by_scheme,
+                "https": CountingPool,
+            }
+
+        def send(self, request, *args, **kwargs):
+            with self._lock:
+                self.requests += 1
+            return super().send(request, *args, **kwargs)
+
+    return CountingAdapter
+
+
 class EfiService:
+    """Efí PIX API over one pooled keep-alive mTLS session.
+
+    The session carries the client certificate and an OAuth token that is
+    renewed shortly before it expires, and keeps up to ``pool_size``
+    connections open, so the TLS handshake is paid once per connection
+    instead of once per call. One instance can be shared across threads.
+    """
+
     def __init__(
         self,
         client_id: Optional[str] = None,
@@ -28,18 +91,59 @@ class EfiService:
         pix_key: Optional[str] = None,
         certificate_base64: Optional[str] = None,
         sandbox: bool = False,
+        base_url: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        timeout: float = 30.0,
+        rate_limiter: Optional[RateLimiter] = None,
     ):
+        from .cassette import get_cassette
+
+        self._cassette = get_cassette()
         self.client_id = client_id or os.getenv("EFI_CLIENT_ID")
         self.client_secret = client_secret or os.getenv("EFI_CLIENT_SECRET")
         self.pix_key = pix_key or os.getenv("EFI_PIX_KEY")
         self.certificate_base64 = certificate_base64 or os.getenv("EFI_CERTIFICATE_BASE64")
         self.sandbox = sandbox or os.getenv("EFI_SANDBOX", "false").lower() == "true"
+        self.base_url = (
+            base_url or os.getenv("EFI_API_URL") or (SANDBOX_URL if self.sandbox else PRODUCTION_URL)
+        ).rstrip("/")
+        self.pool_size = pool_size or int(os.getenv("EFI_POOL_SIZE", "4"))
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
 
         if not all([self.client_id, self.client_secret, self.pix_key, self.certificate_base64]):
             logger.warning("Efi credentials not fully configured")
 
-        self._efi: Optional[EfiPay] = None
+        self._lock = threading.Lock()
+        self._session: Optional["requests.Session"] = None
+        self._adapter = None
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
         self._cert_path: Optional[str] = None
+        self._charges_cache: dict[tuple[str, str], list[dict]] = {}
+        # Set on services made by for_pix_key(): they use the origin's session and token.
+        self._origin: Optional["EfiService"] = None
+
+    def for_pix_key(
+        self, pix_key: str, rate_limiter: Optional[RateLimiter] = None
+    ) -> "EfiService":
+        """A service charging to ``pix_key`` over this one's session and token.
+
+        Received PIX it lists are limited to the ones sent to ``pix_key``, so
+        several groups can share one Efí account. Close only the original.
+        """
+        service = copy.copy(self)
+        service.pix_key = pix_key
+        service.rate_limiter = rate_limiter
+        service._origin = self._origin or self
+        # Session and token are reached through _origin; the rest is per view,
+        # so one group's cached charges never answer another's listing.
+        service._lock = threading.Lock()
+        service._charges_cache = {}
+        service._session = None
+        service._adapter = None
+        service._token = None
+        return service
 
     def _get_certificate_path(self) -> str:
         if self._cert_path and os.path.exists(self._cert_path):
@@ -58,19 +162,107 @@ class EfiService:
 
         return self._cert_path
 
-    def _get_client(self) -> EfiPay:
-        if self._efi is not None:
-            return self._efi
+    def _get_session(self) -> "requests.Session":
+        if self._origin is not None:
+            return self._origin._get_session()
+        if self._session is not None:
+            return self._session
+
+        import requests
+
+        from .cassette import REPLAY
 
-        credentials = {
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "sandbox": self.sandbox,
-            "certificate": self._get_certificate_path(),
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                self._adapter = _counting_adapter_class()(
+                    pool_connections=1, pool_maxsize=self.pool_size
+                )
+                session.mount("https://", self._adapter)
+                if self._cassette is not None:
+                    session.mount("https://", self._cassette.adapter("efi", self._adapter))
+                if self._cassette is None or self._cassette.mode != REPLAY:
+                    session.cert = self._get_certificate_path()
+                session.headers.update({"Content-Type": "application/json"})
+                self._session = session
+        return self._session
+
+    def _get_token(self, refresh: bool = False) -> str:
+        if self._origin is not None:
+            return self._origin._get_token(refresh)
+        session = self._get_session()
+        with self._lock:
+            if refresh or not self._token or time.monotonic() >= self._token_expires_at:
+                response = session.post(
+                    f"{self.base_url}/oauth/token",
+                    json={"grant_type": "client_credentials"},
+                    auth=(self.client_id, self.client_secret),
+                    timeout=self.timeout,
+                )
+                if response.status_code >= 400:
+                    raise RuntimeError(
+                        f"Efí authentication error {response.status_code}: {response.text}"
+                    )
+                data = response.json()
+                self._token = data["access_token"]
+                self._token_expires_at = (
+                    time.monotonic() + int(data.get("expires_in", 3600)) - TOKEN_REFRESH_MARGIN
+                )
+            return self._token
+
+    def _request(
+        self, method: str, path: str, params: Optional[dict] = None, body: Optional[dict] = None
+    ) -> Any:
+        session = self._get_session()
+        token = self._get_token()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        for attempt in range(2):
+            response = session.request(
+                method,
+                f"{self.base_url}{path}",
+                params=params,
+                json=body,
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=self.timeout,
+            )
+            # A token revoked before its expiry is renewed once.
+            if response.status_code == 401 and attempt == 0:
+                token = self._get_token(refresh=True)
+                continue
+            break
+        if response.status_code >= 400:
+            raise RuntimeError(f"Efí API error {response.status_code}: {response.text}")
+        return response.json()
+
+    def connection_stats(self) -> dict[str, int]:
+        """Requests made, TLS handshakes paid and requests that reused a connection."""
+        if self._origin is not None:
+            return self._origin.connection_stats()
+        if self._adapter is None:
+            return {"requests": 0, "handshakes": 0, "reused": 0}
+        with self._adapter._lock:
+            requests_made = self._adapter.requests
+            handshakes = self._adapter.handshakes
+        return {
+            "requests": requests_made,
+            "handshakes": handshakes,
+            "reused": requests_made - handshakes,
         }
 
-        self._efi = EfiPay(credentials)
-        return self._efi
+    def close(self) -> None:
+        if self._origin is not None:
+            return
+        if self._session is not None:
+            stats = self.connection_stats()
+            logger.info(
+                "Efí session closed: %s requests, %s handshakes, %s reused",
+                stats['requests'], stats['handshakes'], stats['reused'],
+            )
+            self._session.close()
+            self._session = None
+            self._adapter = None
+            self._token = None
 
     def create_pix_charge(
         self,
@@ -81,8 +273,6 @@ class EfiService:
         expiracao_segundos: int = 86400 * 7,  # 7 days default
     ) -> PixCharge:
         try:
-            efi = self._get_client()
-
             body = {
                 "calendario": {"expiracao": expiracao_segundos},
                 "valor": {"original": valor},
@@ -93,21 +283,21 @@ class EfiService:
             if cpf_devedor:
                 body["devedor"] = {"cpf": cpf_devedor, "nome": nome_devedor}
 
-            logger.info(f"Creating PIX charge for {nome_devedor}, value: R${valor}")
+            logger.info("Creating PIX charge for %s, value: R$%s", nome_devedor, valor)
 
-            response = efi.pix_create_immediate_charge(body=body)
+            response = self._request("POST", "/v2/cob", body=body)
 
             txid = response["txid"]
             status = response["status"]
             loc = response["loc"]
             location_id = loc["id"]
 
-            qr_response = efi.pix_generate_qrcode(params={"id": location_id})
+            qr_response = self._request("GET", f"/v2/loc/{location_id}/qrcode")
 
             qr_code_base64 = qr_response.get("imagemQrcode", "")
             copy_paste_code = qr_response.get("qrcode", "")
 
-            logger.info(f"PIX charge created: txid={txid}, status={status}")
+            logger.info("PIX charge created: txid=%s, status=%s", txid, status)
 
             return PixCharge(
                 txid=txid,
@@ -118,30 +308,89 @@ class EfiService:
                 valor=valor,
             )
         except KeyError as e:
-            logger.error(f"Invalid response from Efí API, missing key: {e}")
+            logger.error("Invalid response from Efí API, missing key: %s", e)
             raise ValueError(f"Invalid Efí API response: missing {e}") from e
         except Exception as e:
-            logger.error(f"Failed to create PIX charge for {nome_devedor}: {e}")
+            logger.error("Failed to create PIX charge for %s: %s", nome_devedor, e)
             raise
 
     def get_charge_status(self, txid: str) -> dict:
         try:
-            efi = self._get_client()
-            response = efi.pix_detail_charge(params={"txid": txid})
-            logger.info(f"Retrieved charge status for txid={txid}: {response.get('status', 'unknown')}")
+            response = self._request("GET", f"/v2/cob/{txid}")
+            logger.info(
+                "Retrieved charge status for txid=%s: %s", txid, response.get('status', 'unknown')
+            )
             return response
         except Exception as e:
-            logger.error(f"Failed to get charge status for txid={txid}: {e}")
+            logger.error("Failed to get charge status for txid=%s: %s", txid, e)
             raise
 
     def list_received_pix(self, start_date: str, end_date: str) -> list:
         try:
-            efi = self._get_client()
             params = {"inicio": start_date, "fim": end_date}
-            response = efi.pix_received_list(params=params)
+            response = self._request("GET", "/v2/pix", params=params)
             pix_list = response.get("pix", [])
-            logger.info(f"Retrieved {len(pix_list)} PIX transactions from {start_date} to {end_date}")
+            if self._origin is not None:
+                pix_list = [pix for pix in pix_list if pix.get("chave") == self.pix_key]
+            logger.info(
+                "Retrieved %s PIX transactions from %s to %s", len(pix_list), start_date, end_date
+            )
             return pix_list
         except Exception as e:
-            logger.error(f"Failed to list received PIX from {start_date} to {end_date}: {e}")
+            logger.error("Failed to list received PIX from %s to %s: %s", start_date, end_date, e)
+            raise
+
+    def list_charges(
+        self, start_date: str, end_date: str, page_size: int = 1000, refresh: bool = False
+    ) -> list[dict]:
+        """List every immediate charge created in a date range, following pagination.
+
+        Results are cached per range for the lifetime of the service, so several
+        jobs in one run share a single sync.
+        """
+        key = (start_date, end_date)
+        if not refresh and key in self._charges_cache:
+            return self._charges_cache[key]
+
+        try:
+            charges: list[dict] = []
+            page = 0
+            while True:
+                response = self._request(
+                    "GET",
+                    "/v2/cob",
+                    params={
+                        "inicio": start_date,
+                        "fim": end_date,
+                        "paginacao.paginaAtual": page,
+                        "paginacao.itensPorPagina": page_size,
+                    },
+                )
+                if "cobs" not in response:
+                    raise ValueError(f"Invalid Efí API response: {response}")
+
+                charges.extend(response["cobs"])
+
+                pagination = response.get("parametros", {}).get("paginacao", {})
+                page += 1
+                if page >= pagination.get("quantidadeDePaginas", 1):
+                    break
+
+            logger.info(
+                "Retrieved %s charges from %s to %s in %s pages",
+                len(charges), start_date, end_date, page,
+            )
+            self._charges_cache[key] = charges
+            return charges
+        except Exception as e:
+            logger.error("Failed to list charges from %s to %s: %s", start_date, end_date, e)
             raise
+
+    def get_charge_statuses(
+        self, start_date: str, end_date: str, refresh: bool = False
+    ) -> dict[str, str]:
+        """Map txid to status (ATIVA, CONCLUIDA, ...) for charges in a date range."""
+        return {
+            charge["txid"]: charge.get("status", "")
+            for charge in self.list_charges(start_date, end_date, refresh=refresh)
+        }
@@ -1,39 +1,64 @@
 import base64
 import logging
-import os
-import smtplib
-from email.mime.image import MIMEImage
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import threading
 from pathlib import Path
 from typing import Optional
 
+from .email_transport import EmailTransport, OutgoingEmail, SmtpTransport, get_transport
+
 logger = logging.getLogger(__name__)
 
 TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
 
 
 class EmailService:
+    """Renders the caixinha emails and hands them to an ``EmailTransport``.
+
+    Without an explicit transport, SMTP credentials given here select SMTP;
+    otherwise the ``EMAIL_TRANSPORT`` variable decides (smtp by default).
+    """
+
     def __init__(
         self,
         smtp_email: Optional[str] = None,
         smtp_password: Optional[str] = None,
         smtp_host: Optional[str] = None,
         smtp_port: Optional[int] = None,
+        transport: Optional[EmailTransport] = None,
     ):
-        self.smtp_email = smtp_email or os.getenv("SMTP_EMAIL")
-        self.smtp_password = smtp_password or os.getenv("SMTP_PASSWORD")
-        self.smtp_host = smtp_host or os.getenv("SMTP_HOST", "smtp.gmail.com")
-        self.smtp_port = smtp_port or int(os.getenv("SMTP_PORT", "587"))
-        self.from_name = os.getenv("EMAIL_FROM_NAME", "Caixinha Trilha")
+        if transport is None:
+            if any([smtp_email, smtp_password, smtp_host, smtp_port]):
+                transport = SmtpTransport(smtp_email, smtp_password, smtp_host, smtp_port)
+            else:
+                transport = get_transport()
+
+        from .cassette import get_cassette
+
+        cassette = get_cassette()
+        if cassette is not None:
+            transport = cassette.transport(transport)
+
+        self.transport = transport
+        self._templates: dict[str, str] = {}
+        # Transports hold one connection; threads sharing the service take turns on it.
+        self._send_lock = threading.Lock()
+
+    def __enter__(self) -> "EmailService":
+        return self
 
-        if not self.smtp_email or not self.smtp_password:
-            logger.warning("SMTP credentials not configured")
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the transport's connection, if one is open."""
+        self.transport.close()
 
     def _load_template(self, template_name: str) -> str:
-        template_path = TEMPLATES_DIR / template_name
-        with open(template_path, "r", encoding="utf-8") as f:
-            return f.read()
+        if template_name not in self._templates:
+            template_path = TEMPLATES_DIR / template_name
+            with open(template_path, "r", encoding="utf-8") as f:
+                self._templates[template_name] = f.read()
+        return self._templates[template_name]
 
     def _render_template(self, template_name: str, **kwargs) -> str:
         template = self._load_template(template_name)
@@ -51,41 +76,29 @@ class EmailService:
             # Assume it's already base64 without prefix
             return base64.b64decode(data_uri)
 
-    def _send_email(
-        self, to: str, subject: str, html_content: str, qr_code_base64: Optional[str] = None
-    ) -> bool:
-        try:
-            msg = MIMEMultipart("related")
-            msg["Subject"] = subject
-            msg["From"] = f"{self.from_name} <{self.smtp_email}>"
-            msg["To"] = to
-
-            msg_alternative = MIMEMultipart("alternative")
-            msg.attach(msg_alternative)
-
-            html_part = MIMEText(html_content, "html")
-            msg_alternative.attach(html_part)
-
-            if qr_code_base64:
-                image_data = self._extract_image_data(qr_code_base64)
-                image = MIMEImage(image_data, _subtype="png")
-                image.add_header("Content-ID", "<qrcode>")
-                image.add_header("Content-Disposition", "inline", filename="qrcode.png")
-                msg.attach(image)
-
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_email, self.smtp_password)
-                server.sendmail(self.smtp_email, to, msg.as_string())
+    def send_many(self, messages: list[OutgoingEmail]) -> list[Optional[str]]:
+        """Send rendered messages through the transport, batching where it can.
 
-            logger.info(f"Email sent to {to}")
-            return True
+        Returns one error string (or None on success) per message.
+        """
+        if not messages:
+            return []
+        with self._send_lock:
+            errors = self.transport.send_batch(messages)
+        sent = sum(1 for error in errors if error is None)
+        logger.info("Sent %s of %s emails", sent, len(messages))
+        return errors
 
+    def _send(self, message: OutgoingEmail) -> dict:
+        try:
+            with self._send_lock:
+                self.transport.send(message)
         except Exception as e:
-            logger.error(f"Failed to send email to {to}: {e}")
+            logger.error("Failed to send email to %s: %s", message.to, e)
             raise
+        return {"status": "sent", "to": message.to}
 
-    def send_charge_email(
+    def render_charge_email(
         self,
         to: str,
         name: str,
@@ -93,7 +106,7 @@ class EmailService:
         pix_code: str,
         due_date: str,
         amount: str = "40.00",
-    ) -> dict:
+    ) -> OutgoingEmail:
         html_content = self._render_template(
             "charge_email.html",
             name=name,
@@ -103,24 +116,24 @@ class EmailService:
             amount=amount,
         )
 
-        self._send_email(
+        return OutgoingEmail(
             to=to,
             subject=f"[Caixinha Trilha] Cobrança de R$ {amount}",
-            html_content=html_content,
-            qr_code_base64=qr_code_base64,
+            html=html_content,
+            inline_png=self._extract_image_data(qr_code_base64) if qr_code_base64 else None,
+            kind="charge",
         )
 
-        logger.info(f"Charge email sent to {to}")
-        return {"status": "sent", "to": to}
-
-    def send_reminder_email(
+    def render_reminder_email(
         self,
         to: str,
         name: str,
         qr_code_base64: str,
         pix_code: str,
         amount: str = "40.00",
-    ) -> dict:
+        escalated: bool = False,
+        cc: Optional[list[str]] = None,
+    ) -> OutgoingEmail:
         html_content = self._render_template(
             "reminder_email.html",
             name=name,
@@ -129,23 +142,27 @@ class EmailService:
             amount=amount,
         )
 
-        self._send_email(
+        if escalated:
+            subject = f"[Caixinha Trilha] Pagamento em atraso - R$ {amount}"
+        else:
+            subject = f"[Caixinha Trilha] Lembrete de pagamento pendente - R$ {amount}"
+
+        return OutgoingEmail(
             to=to,
-            subject=f"[Caixinha Trilha] Lembrete de pagamento pendente - R$ {amount}",
-            html_content=html_content,
-            qr_code_base64=qr_code_base64,
+            subject=subject,
+            html=html_content,
+            cc=list(cc or []) if escalated else [],
+            inline_png=self._extract_image_data(qr_code_base64) if qr_code_base64 else None,
+            kind="reminder",
         )
 
-        logger.info(f"Reminder email sent to {to}")
-        return {"status": "sent", "to": to}
-
-    def send_confirmation_email(
+    def render_confirmation_email(
         self,
         to: str,
         name: str,
         amount: str = "40.00",
         month: str = "",
-    ) -> dict:
+    ) -> OutgoingEmail:
         month_text = f" de {month}" if month else ""
         html_content = self._render_template(
             "confirmation_email.html",
@@ -154,11 +171,51 @@ class EmailService:
             month_text=month_text,
         )
 
-        self._send_email(
+        return OutgoingEmail(
             to=to,
             subject=f"[Caixinha Trilha] Pagamento confirmado - R$ {amount}",
-            html_content=html_content,
+            html=html_content,
+            kind="confirmation",
+        )
+
+    def send_charge_email(
+        self,
+        to: str,
+        name: str,
+        qr_code_base64: str,
+        pix_code: str,
+        due_date: str,
+        amount: str = "40.00",
+    ) -> dict:
+        result = self._send(
+            self.render_charge_email(to, name, qr_code_base64, pix_code, due_date, amount)
+        )
+        logger.info("Charge email sent to %s", to)
+        return result
+
+    def send_reminder_email(
+        self,
+        to: str,
+        name: str,
+        qr_code_base64: str,
+        pix_code: str,
+        amount: str = "40.00",
+        escalated: bool = False,
+        cc: Optional[list[str]] = None,
+    ) -> dict:
+        result = self._send(
+            self.render_reminder_email(to, name, qr_code_base64, pix_code, amount, escalated, cc)
         )
+        logger.info("Reminder email sent to %s", to)
+        return result
 
-        logger.info(f"Confirmation email sent to {to}")
-        return {"status": "sent", "to": to}
+    def send_confirmation_email(
+        self,
+        to: str,
+        name: str,
+        amount: str = "40.00",
+        month: str = "",
+    ) -> dict:
+        result = self._send(self.render_confirmation_email(to, name, amount, month))
+        logger.info("Confirmation email sent to %s", to)
+        return result
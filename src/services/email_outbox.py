@@ -0,0 +1,151 @@
+import base64
+import json
+import logging
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from src.services.email_transport import OutgoingEmail
+from src.utils.state import get_state_path
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+RETRY_BASE_SECONDS = 60
+
+
+def encode_message(message: OutgoingEmail) -> str:
+    return json.dumps({
+        "to": message.to,
+        "subject": message.subject,
+        "html": message.html,
+        "cc": message.cc,
+        "inline_png": (
+            base64.b64encode(message.inline_png).decode("ascii") if message.inline_png else None
+        ),
+        "kind": message.kind,
+    })
+
+
+def decode_message(payload: str) -> OutgoingEmail:
+    data = json.loads(payload)
+    inline_png = data.pop("inline_png")
+    return OutgoingEmail(
+        **data, inline_png=base64.b64decode(inline_png) if inline_png else None
+    )
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class EmailOutbox:
+    """Durable SQLite outbox of rendered emails waiting to be sent.
+
+    Jobs ``add`` messages and move on; a drain sends them in batches and
+    records the outcome. Failed messages are retried with exponential backoff
+    until ``max_attempts``. Each message has a key, so recording the same
+    email twice (e.g. after a retried run) queues it once.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, max_attempts: int = 5):
+        self.path = Path(path) if path else get_state_path("email_outbox.sqlite3")
+        self.max_attempts = max_attempts
+        self._init_schema()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_schema(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TEXT NOT NULL,
+                    last_error TEXT
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_outbox_pending "
+                "ON outbox (status, next_attempt_at)"
+            )
+
+    def add(self, messages: list[tuple[str, OutgoingEmail]]) -> int:
+        """Queue ``(key, message)`` pairs; returns how many were new."""
+        now = _now().isoformat()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO outbox (key, payload, created_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, encode_message(message), now, now) for key, message in messages],
+            )
+            added = conn.total_changes - before
+        logger.info("Queued %s emails in the outbox (%s duplicates)", added, len(messages) - added)
+        return added
+
+    def pending(self, limit: int = 100) -> list[tuple[int, OutgoingEmail]]:
+        """Up to ``limit`` messages due for a (re)try, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, payload FROM outbox WHERE status = ? AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (PENDING, _now().isoformat(), limit),
+            ).fetchall()
+        return [(row["id"], decode_message(row["payload"])) for row in rows]
+
+    def pending_count(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,)
+            ).fetchone()
+        return row[0]
+
+    def mark_sent(self, ids: list[int]) -> None:
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE outbox SET status = ?, last_error = NULL WHERE id = ?",
+                [(SENT, message_id) for message_id in ids],
+            )
+
+    def mark_failed(self, message_id: int, error: str) -> None:
+        """Record a failed attempt and schedule the next one; give up after ``max_attempts``."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM outbox WHERE id = ?", (message_id,)
+            ).fetchone()
+            if row is None:
+                return
+            attempts = row["attempts"] + 1
+            retry_at = _now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, last_error = ?, next_attempt_at = ?, "
+                "status = ? WHERE id = ?",
+                (
+                    attempts,
+                    error,
+                    retry_at.isoformat(),
+                    FAILED if attempts >= self.max_attempts else PENDING,
+                    message_id,
+                ),
+            )
@@ -0,0 +1,241 @@
+import base64
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+# smtplib, email.mime and requests are imported by the transport that needs
+# them, so importing OutgoingEmail (outbox, spool) does not pull them in.
+if TYPE_CHECKING:
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+
+logger = logging.getLogger(__name__)
+
+RESEND_BATCH_LIMIT = 100
+
+
+@dataclass
+class OutgoingEmail:
+    """A fully rendered message, independent of how it is delivered.
+
+    ``inline_png`` is attached as ``cid:qrcode`` so templates can reference it.
+    """
+
+    to: str
+    subject: str
+    html: str
+    cc: list[str] = field(default_factory=list)
+    inline_png: Optional[bytes] = None
+    kind: str = ""
+
+
+class EmailTransport:
+    def send(self, message: OutgoingEmail) -> None:
+        raise NotImplementedError
+
+    def send_batch(self, messages: list[OutgoingEmail]) -> list[Optional[str]]:
+        """Send several messages; returns one error string (or None) per message."""
+        errors: list[Optional[str]] = []
+        for message in messages:
+            try:
+                self.send(message)
+                errors.append(None)
+            except Exception as e:
+                logger.error("Failed to send email to %s: %s", message.to, e)
+                errors.append(str(e))
+        return errors
+
+    def close(self) -> None:
+        pass
+
+
+class SmtpTransport(EmailTransport):
+    """Sends over one SMTP session, reused until ``close()``."""
+
+    def __init__(
+        self,
+        smtp_email: Optional[str] = None,
+        smtp_password: Optional[str] = None,
+        smtp_host: Optional[str] = None,
+        smtp_port: Optional[int] = None,
+        from_name: Optional[str] = None,
+    ):
+        self.smtp_email = smtp_email or os.getenv("SMTP_EMAIL")
+        self.smtp_password = smtp_password or os.getenv("SMTP_PASSWORD")
+        self.smtp_host = smtp_host or os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.smtp_port = smtp_port or int(os.getenv("SMTP_PORT", "587"))
+        self.from_name = from_name or os.getenv("EMAIL_FROM_NAME", "Caixinha Trilha")
+
+        if not self.smtp_email or not self.smtp_password:
+            logger.warning("SMTP credentials not configured")
+
+        self._smtp: Optional["smtplib.SMTP"] = None
+
+    def _connect(self) -> "smtplib.SMTP":
+        import smtplib
+
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+        server.starttls()
+        server.login(self.smtp_email, self.smtp_password)
+        logger.info("Opened SMTP session with %s:%s", self.smtp_host, self.smtp_port)
+        return server
+
+    def _get_smtp(self) -> "smtplib.SMTP":
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def build_mime(self, message: OutgoingEmail) -> "MIMEMultipart":
+        from email.mime.image import MIMEImage
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+
+        msg = MIMEMultipart("related")
+        msg["Subject"] = message.subject
+        msg["From"] = f"{self.from_name} <{self.smtp_email}>"
+        msg["To"] = message.to
+        if message.cc:
+            msg["Cc"] = ", ".join(message.cc)
+
+        msg_alternative = MIMEMultipart("alternative")
+        msg.attach(msg_alternative)
+        msg_alternative.attach(MIMEText(message.html, "html"))
+
+        if message.inline_png:
+            image = MIMEImage(message.inline_png, _subtype="png")
+            image.add_header("Content-ID", "<qrcode>")
+            image.add_header("Content-Disposition", "inline", filename="qrcode.png")
+            msg.attach(image)
+
+        return msg
+
+    def send(self, message: OutgoingEmail) -> None:
+        import smtplib
+
+        recipients = [message.to] + message.cc
+        payload = self.build_mime(message).as_string()
+        try:
+            self._get_smtp().sendmail(self.smtp_email, recipients, payload)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped an idle session; reconnect once and retry.
+            self._smtp = None
+            self._get_smtp().sendmail(self.smtp_email, recipients, payload)
+        logger.info("Email sent to %s", message.to)
+
+    def close(self) -> None:
+        import smtplib
+
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
+        logger.info("Closed SMTP session")
+
+
+class ResendTransport(EmailTransport):
+    """Resend HTTP API over a pooled keep-alive session.
+
+    Messages without attachments go through ``/emails/batch`` in chunks of up
+    to 100. Resend's batch endpoint does not accept attachments, so messages
+    carrying the inline QR code are posted to ``/emails`` one by one, still on
+    the same pooled connection.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        email_from: Optional[str] = None,
+        from_name: Optional[str] = None,
+        base_url: Optional[str] = None,
+        pool_size: int = 4,
+        timeout: float = 30.0,
+    ):
+        self.api_key = api_key or os.getenv("RESEND_API_KEY")
+        self.email_from = email_from or os.getenv("EMAIL_FROM", "caixinha@trilha.ufpb.br")
+        self.from_name = from_name or os.getenv("EMAIL_FROM_NAME", "Caixinha Trilha")
+        self.base_url = (base_url or os.getenv("RESEND_API_URL", "https://api.resend.com")).rstrip("/")
+        self.timeout = timeout
+
+        if not self.api_key:
+            logger.warning("Resend API key not configured")
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        })
+
+    def _payload(self, message: OutgoingEmail) -> dict:
+        payload = {
+            "from": f"{self.from_name} <{self.email_from}>",
+            "to": [message.to],
+            "subject": message.subject,
+            "html": message.html,
+        }
+        if message.cc:
+            payload["cc"] = message.cc
+        if message.inline_png:
+            payload["attachments"] = [{
+                "filename": "qrcode.png",
+                "content": base64.b64encode(message.inline_png).decode("ascii"),
+                "content_id": "qrcode",
+            }]
+        return payload
+
+    def _post(self, path: str, body) -> dict:
+        response = self._session.post(f"{self.base_url}{path}", json=body, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Resend API error {response.status_code}: {response.text}")
+        return response.json()
+
+    def send(self, message: OutgoingEmail) -> None:
+        self._post("/emails", self._payload(message))
+        logger.info("Email sent to %s", message.to)
+
+    def send_batch(self, messages: list[OutgoingEmail]) -> list[Optional[str]]:
+        errors: list[Optional[str]] = [None] * len(messages)
+
+        batchable = [i for i, message in enumerate(messages) if not message.inline_png]
+        for start in range(0, len(batchable), RESEND_BATCH_LIMIT):
+            chunk = batchable[start:start + RESEND_BATCH_LIMIT]
+            try:
+                self._post("/emails/batch", [self._payload(messages[i]) for i in chunk])
+                logger.info("Sent batch of %s emails", len(chunk))
+            except Exception as e:
+                logger.error("Failed to send batch of %s emails: %s", len(chunk), e)
+                for i in chunk:
+                    errors[i] = str(e)
+
+        for i, message in enumerate(messages):
+            if not message.inline_png:
+                continue
+            try:
+                self.send(message)
+            except Exception as e:
+                logger.error("Failed to send email to %s: %s", message.to, e)
+                errors[i] = str(e)
+
+        return errors
+
+    def close(self) -> None:
+        self._session.close()
+
+
+def get_transport(name: Optional[str] = None) -> EmailTransport:
+    """Transport selected by name or by the EMAIL_TRANSPORT variable (smtp, resend)."""
+    name = (name or os.getenv("EMAIL_TRANSPORT", "smtp")).lower()
+    if name == "smtp":
+        return SmtpTransport()
+    if name == "resend":
+        return ResendTransport()
+    raise ValueError(f"Unknown email transport: {name}")
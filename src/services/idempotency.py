@@ -0,0 +1,291 @@
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+from src.utils.state import get_state_dir, get_state_path, snapshot_state
+
+logger = logging.getLogger(__name__)
+
+ACQUIRED = "acquired"
+LOCKED = "locked"
+DONE = "done"
+
+DEFAULT_LEASE_SECONDS = 300
+
+
+class LeaseBackend(ABC):
+    """Storage for short leases and permanent "done" markers on string keys.
+
+    ``acquire`` is all-or-nothing: it returns ``DONE`` if any key was already
+    completed, ``LOCKED`` if another owner holds a live lease on any key, and
+    otherwise leases every key to ``owner`` and returns ``ACQUIRED``.
+    """
+
+    @abstractmethod
+    def acquire(self, keys: list[str], owner: str, ttl: float) -> str:
+        ...
+
+    @abstractmethod
+    def complete(self, keys: list[str], owner: str) -> None:
+        ...
+
+    @abstractmethod
+    def release(self, keys: list[str], owner: str) -> None:
+        ...
+
+    @abstractmethod
+    def done(self, keys: list[str]) -> set[str]:
+        ...
+
+
+class SqliteLeaseBackend(LeaseBackend):
+    """Leases and done markers in one SQLite file (LEASE_PATH, else the state directory)."""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        path = path or os.getenv("LEASE_PATH")
+        self.path = Path(path) if path else get_state_path("leases.sqlite3")
+        self._init_schema()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit mode so transactions can start with BEGIN IMMEDIATE, taking
+        # the write lock before reading the keys it is about to claim.
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _init_schema(self) -> None:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS leases ("
+                    "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS done ("
+                    "key TEXT PRIMARY KEY, owner TEXT NOT NULL, completed_at REAL NOT NULL)"
+                )
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _placeholders(keys: list[str]) -> str:
+        return ", ".join("?" for _ in keys)
+
+    def acquire(self, keys: list[str], owner: str, ttl: float) -> str:
+        now = time.time()
+        marks = self._placeholders(keys)
+        with self._connect() as conn:
+            if conn.execute(f"SELECT 1 FROM done WHERE key IN ({marks}) LIMIT 1", keys).fetchone():
+                return DONE
+            held = conn.execute(
+                f"SELECT 1 FROM leases WHERE key IN ({marks}) AND owner != ? AND expires_at > ? "
+                "LIMIT 1",
+                [*keys, owner, now],
+            ).fetchone()
+            if held:
+                return LOCKED
+            conn.executemany(
+                "INSERT OR REPLACE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                [(key, owner, now + ttl) for key in keys],
+            )
+        return ACQUIRED
+
+    def complete(self, keys: list[str], owner: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO done (key, owner, completed_at) VALUES (?, ?, ?)",
+                [(key, owner, now) for key in keys],
+            )
+            conn.execute(
+                f"DELETE FROM leases WHERE key IN ({self._placeholders(keys)}) AND owner = ?",
+                [*keys, owner],
+            )
+
+    def release(self, keys: list[str], owner: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                f"DELETE FROM leases WHERE key IN ({self._placeholders(keys)}) AND owner = ?",
+                [*keys, owner],
+            )
+
+    def done(self, keys: list[str]) -> set[str]:
+        if not keys:
+            return set()
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT key FROM done WHERE key IN ({self._placeholders(keys)})", keys
+            ).fetchall()
+        return {row[0] for row in rows}
+
+
+class FileLeaseBackend(LeaseBackend):
+    """Leases as lock files created with O_EXCL, done markers as plain files.
+
+    Works on any local or shared filesystem with atomic exclusive create; no
+    database needed. The directory is LEASE_PATH, else ``leases/`` in the state
+    directory.
+    """
+
+    def __init__(self, directory: Optional[Union[str, Path]] = None):
+        directory = directory or os.getenv("LEASE_PATH")
+        self.directory = Path(directory) if directory else get_state_dir() / "leases"
+
+    def _ensure_dirs(self) -> None:
+        (self.directory / "held").mkdir(parents=True, exist_ok=True)
+        (self.directory / "done").mkdir(parents=True, exist_ok=True)
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.directory / kind / f"{uuid.uuid5(uuid.NAMESPACE_URL, key).hex}"
+
+    def _read_lease(self, path: Path) -> tuple[str, float]:
+        try:
+            owner, expires_at = path.read_text(encoding="utf-8").rsplit(" ", 1)
+            return owner, float(expires_at)
+        except ValueError:
+            # Created but not written yet by its owner: treat as freshly held.
+            try:
+                return "", path.stat().st_mtime + DEFAULT_LEASE_SECONDS
+            except OSError:
+                return "", 0.0
+        except OSError:
+            return "", 0.0
+
+    def _try_lock(self, key: str, owner: str, ttl: float) -> bool:
+        path = self._path("held", key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                held_by, expires_at = self._read_lease(path)
+                if held_by == owner:
+                    path.write_text(f"{owner} {time.time() + ttl}", encoding="utf-8")
+                    return True
+                if expires_at > time.time():
+                    return False
+                # Expired lease: remove it and try once more.
+                path.unlink(missing_ok=True)
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(f"{owner} {time.time() + ttl}")
+            return True
+        return False
+
+    def acquire(self, keys: list[str], owner: str, ttl: float) -> str:
+        if self.done(keys):
+            return DONE
+        self._ensure_dirs()
+        locked = []
+        for key in keys:
+            if not self._try_lock(key, owner, ttl):
+                self.release(locked, owner)
+                return LOCKED
+            locked.append(key)
+        return ACQUIRED
+
+    def complete(self, keys: list[str], owner: str) -> None:
+        self._ensure_dirs()
+        for key in keys:
+            self._path("done", key).write_text(f"{owner} {time.time()}\n{key}", encoding="utf-8")
+        self.release(keys, owner)
+
+    def release(self, keys: list[str], owner: str) -> None:
+        for key in keys:
+            path = self._path("held", key)
+            if self._read_lease(path)[0] == owner:
+                path.unlink(missing_ok=True)
+
+    def done(self, keys: list[str]) -> set[str]:
+        return {key for key in keys if self._path("done", key).exists()}
+
+
+def get_lease_backend(name: Optional[str] = None, snapshot: bool = False) -> LeaseBackend:
+    """Backend selected by name or by the LEASE_BACKEND variable (sqlite, file).
+
+    With ``snapshot`` (dry runs) the SQLite backend works on a throwaway copy
+    of the leases; the file backend only creates its directories on first claim.
+    """
+    name = (name or os.getenv("LEASE_BACKEND", "sqlite")).lower()
+    path = os.getenv("LEASE_PATH")
+    if name == "sqlite":
+        return SqliteLeaseBackend(snapshot_state("leases.sqlite3", path) if snapshot else None)
+    if name == "file":
+        if snapshot and not path:
+            path = get_state_dir(create=False) / "leases"
+        return FileLeaseBackend(path)
+    raise ValueError(f"Unknown lease backend: {name}")
+
+
+def pix_key(end_to_end_id: str) -> str:
+    return f"pix:{end_to_end_id}"
+
+
+def member_month_key(sheet_name: str, month: str, member: str) -> str:
+    return f"member:{sheet_name}:{month}:{member}"
+
+
+class IdempotencyStore:
+    """Claims on PIX and member-months so concurrent reconcilers never repeat work.
+
+    A worker ``claim``s the keys of a payment before writing it, ``complete``s
+    them once the write succeeded and ``release``s them if it failed. Claims
+    expire after ``lease_seconds`` so a crashed worker does not block others.
+
+    Only workers that share the backend's storage coordinate. By default that
+    is the local state directory, i.e. one host (or one Actions cache); a
+    webhook drain on another host must point LEASE_PATH at the same shared
+    storage as the cron jobs, or the two can apply the same payment twice.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[LeaseBackend] = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        owner: Optional[str] = None,
+    ):
+        self.backend = backend or get_lease_backend()
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def claim(self, keys: Iterable[str]) -> str:
+        keys = list(keys)
+        if not keys:
+            return ACQUIRED
+        return self.backend.acquire(keys, self.owner, self.lease_seconds)
+
+    def complete(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if keys:
+            self.backend.complete(keys, self.owner)
+
+    def release(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if keys:
+            self.backend.release(keys, self.owner)
+
+    def done_months(self, sheet_name: str, member: str, months: list[str]) -> set[str]:
+        """Months of a member already settled by some worker."""
+        keys = {member_month_key(sheet_name, month, member): month for month in months}
+        return {keys[key] for key in self.backend.done(list(keys))}
+
+    def pix_done(self, end_to_end_id: str) -> bool:
+        """Whether a PIX was already applied by some worker."""
+        return bool(self.backend.done([pix_key(end_to_end_id)]))
@@ -0,0 +1,150 @@
+"""
+Payer aliases: who a recurring payer is, remembered across runs.
+
+Bank payer names often differ from the spreadsheet name (a full legal name, a
+spouse's or parent's account), and only a PIX paying one of our charges (by
+txid) says for sure which member it was. After such a payment is written to
+the sheet, the payer's CPF/CNPJ and normalized name are saved in
+``.caixinha/payer_aliases.json``, so the next PIX from them, even one sent
+without a txid, resolves with a dict lookup::
+
+    {
+      "documents": {"12345678901": "Ana Souza"},
+      "names": {"ana maria de souza": "Ana Souza", "joao souza": "Ana Souza"}
+    }
+
+The file can be edited by hand. Entries learned later never replace an
+existing one, and a mapping to someone no longer on the roster is ignored.
+Masked documents (``***.456.789-**``, as Efí sends for some PIX) are not
+indexed, since they do not identify a payer on their own.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Optional, Union
+
+from src.utils.state import get_state_path
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_LENGTHS = (11, 14)  # CPF, CNPJ
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, accents and punctuation removed, single spaces."""
+    decomposed = unicodedata.normalize("NFKD", name)
+    text = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def normalize_document(document: str) -> Optional[str]:
+    """Digits of a full CPF/CNPJ, or None for masked or malformed ones."""
+    if not document or "*" in document:
+        return None
+    digits = re.sub(r"\D", "", document)
+    return digits if len(digits) in DOCUMENT_LENGTHS else None
+
+
+def payer_document(pagador: dict) -> Optional[str]:
+    return normalize_document(str(pagador.get("cpf") or pagador.get("cnpj") or ""))
+
+
+class PayerAliases:
+    """CPF/CNPJ and normalized payer names mapped to member names, kept in JSON."""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        self.path = Path(path) if path else get_state_path("payer_aliases.json")
+        self._lock = threading.Lock()
+        self._pending: dict[str, dict[str, str]] = {"documents": {}, "names": {}}
+        self.documents, self.names = self._read()
+
+    def _read(self) -> tuple[dict[str, str], dict[str, str]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}, {}
+        except ValueError as e:
+            logger.warning("Ignoring unreadable payer aliases in %s: %s", self.path, e)
+            return {}, {}
+        # Hand-written keys are normalized the same way as learned ones.
+        documents = {}
+        for document, member in data.get("documents", {}).items():
+            key = normalize_document(document)
+            if key:
+                documents[key] = member
+        names = {normalize_name(name): member for name, member in data.get("names", {}).items()}
+        return documents, names
+
+    def lookup(self, pagador: dict) -> Optional[str]:
+        """Member name for this payer: by document first, then by name."""
+        document = payer_document(pagador)
+        if document and document in self.documents:
+            return self.documents[document]
+        return self.names.get(normalize_name(pagador.get("nome", "")))
+
+    def learn(self, pagador: dict, member: str) -> bool:
+        """Remember that this payer paid for ``member``; True if anything was new.
+
+        A name equal to the member's own needs no alias and is not stored.
+        """
+        learned = False
+        with self._lock:
+            entries = [("documents", self.documents, payer_document(pagador))]
+            name = normalize_name(pagador.get("nome", ""))
+            if name and name != normalize_name(member):
+                entries.append(("names", self.names, name))
+            for kind, index, key in entries:
+                if not key:
+                    continue
+                known = index.get(key)
+                if known is None:
+                    index[key] = member
+                    self._pending[kind][key] = member
+                    learned = True
+                elif known != member:
+                    logger.warning(
+                        "Payer alias %s already points to %s, not to %s",
+                        key, known, member, extra={"member": member},
+                    )
+        return learned
+
+    def save(self) -> int:
+        """Write newly learned aliases; returns how many were added.
+
+        The file is re-read first, so edits and entries saved by other
+        processes since it was loaded are kept.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {"documents": {}, "names": {}}
+        if not any(pending.values()):
+            return 0
+
+        documents, names = self._read()
+        added = 0
+        for index, learned in ((documents, pending["documents"]), (names, pending["names"])):
+            for key, member in learned.items():
+                if key not in index:
+                    index[key] = member
+                    added += 1
+
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"documents": dict(sorted(documents.items())), "names": dict(sorted(names.items()))},
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+            f.write("\n")
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self.documents.update(documents)
+            self.names.update(names)
+        logger.info("Learned %s payer aliases", added)
+        return added
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from src.utils.state import get_state_path
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+PROCESSED = "processed"
+UNMATCHED = "unmatched"
+FAILED = "failed"
+
+
+class PixQueue:
+    """Durable SQLite queue of received PIX, keyed by endToEndId.
+
+    The webhook only appends to it; a worker drains it in batches. Efí retries
+    of an already queued PIX are ignored, so each payment is applied once.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, max_attempts: int = 5):
+        path = path or os.getenv("WEBHOOK_QUEUE_PATH")
+        self.path = Path(path) if path else get_state_path("pix_queue.sqlite3")
+        self.max_attempts = max_attempts
+        self._init_schema()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_schema(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pix_queue (
+                    end_to_end_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    received_at TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pix_queue_status "
+                "ON pix_queue (status, received_at)"
+            )
+
+    def enqueue(self, pix_list: list[dict]) -> int:
+        """Append PIX to the queue and return how many were new."""
+        received_at = datetime.now(timezone.utc).isoformat()
+        rows = [
+            (pix["endToEndId"], json.dumps(pix), received_at)
+            for pix in pix_list
+            if pix.get("endToEndId")
+        ]
+
+        skipped = len(pix_list) - len(rows)
+        if skipped:
+            logger.warning("Ignoring %s PIX without endToEndId", skipped)
+
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO pix_queue (end_to_end_id, payload, received_at) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            added = conn.total_changes - before
+
+        logger.info("Queued %s new PIX (%s duplicates)", added, len(rows) - added)
+        return added
+
+    def pending(self, limit: int = 100) -> list[dict]:
+        """Return up to ``limit`` pending PIX payloads, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT payload FROM pix_queue WHERE status = ? "
+                "ORDER BY received_at LIMIT ?",
+                (PENDING, limit),
+            ).fetchall()
+        return [json.loads(row["payload"]) for row in rows]
+
+    def pending_count(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM pix_queue WHERE status = ?", (PENDING,)
+            ).fetchone()
+        return row[0]
+
+    def mark(self, end_to_end_ids: list[str], status: str) -> None:
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE pix_queue SET status = ?, last_error = NULL WHERE end_to_end_id = ?",
+                [(status, e2e_id) for e2e_id in end_to_end_ids],
+            )
+
+    def mark_failed(self, end_to_end_id: str, error: str) -> None:
+        """Record a failed attempt; give up after ``max_attempts``."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE pix_queue SET attempts = attempts + 1, last_error = ?, "
+                "status = CASE WHEN attempts + 1 >= ? THEN ? ELSE status END "
+                "WHERE end_to_end_id = ?",
+                (error, self.max_attempts, FAILED, end_to_end_id),
+            )
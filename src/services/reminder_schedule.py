@@ -0,0 +1,217 @@
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from src.utils.state import get_state_path, snapshot_state
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReminderCadence:
+    """When reminders go out, counted in days from the charge date.
+
+    With the defaults, reminders are sent 3 and 7 days after the charge and
+    then every 7 days; from the 3rd reminder on they are escalated, which
+    changes the subject and copies ``escalation_cc``.
+    """
+
+    offsets: tuple[int, ...] = (3, 7)
+    repeat_every: int = 7
+    escalate_after: int = 3
+    escalation_cc: tuple[str, ...] = ()
+
+    @classmethod
+    def from_env(cls) -> "ReminderCadence":
+        offsets = os.getenv("REMINDER_CADENCE_DAYS", "3,7")
+        return cls(
+            offsets=tuple(int(day) for day in offsets.split(",") if day.strip()),
+            repeat_every=int(os.getenv("REMINDER_REPEAT_DAYS", "7")),
+            escalate_after=int(os.getenv("REMINDER_ESCALATE_AFTER", "3")),
+            escalation_cc=tuple(
+                address.strip()
+                for address in os.getenv("REMINDER_ESCALATION_CC", "").split(",")
+                if address.strip()
+            ),
+        )
+
+    def first_due(self, charged_on: date) -> date:
+        return charged_on + timedelta(days=self.offsets[0] if self.offsets else self.repeat_every)
+
+    def next_due(self, charged_on: date, sent_on: date, reminders_sent: int) -> date:
+        if reminders_sent < len(self.offsets):
+            return max(
+                charged_on + timedelta(days=self.offsets[reminders_sent]),
+                sent_on + timedelta(days=1),
+            )
+        return sent_on + timedelta(days=self.repeat_every)
+
+    def is_escalated(self, reminder_number: int) -> bool:
+        return self.escalate_after > 0 and reminder_number >= self.escalate_after
+
+
+class ReminderSchedule:
+    """Per member and month reminder state, indexed by next due date.
+
+    Months are identified by a ``YYYY-MM`` period. Rows are created when a charge is issued; each run only reads the rows
+    whose ``next_due`` has passed instead of scanning every unpaid member.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        cadence: Optional[ReminderCadence] = None,
+    ):
+        self.path = Path(path) if path else get_state_path("reminders.sqlite3")
+        self.cadence = cadence or ReminderCadence.from_env()
+        self._init_schema()
+
+    def snapshot(self) -> "ReminderSchedule":
+        """A throwaway copy of this schedule, for dry runs."""
+        return ReminderSchedule(snapshot_state(self.path.name, self.path), self.cadence)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_schema(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS reminders (
+                    month TEXT NOT NULL,
+                    member TEXT NOT NULL,
+                    charged_on TEXT NOT NULL,
+                    txid TEXT,
+                    reminders_sent INTEGER NOT NULL DEFAULT 0,
+                    last_sent TEXT,
+                    next_due TEXT,
+                    PRIMARY KEY (month, member)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders (month, next_due)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS charges (
+                    txid TEXT PRIMARY KEY,
+                    month TEXT NOT NULL,
+                    member TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_charges_month ON charges (month)")
+
+    def record_charge(self, member: str, month: str, charged_on: date, txid: str = "") -> None:
+        """Start (or restart) the cadence for a member after a charge is issued."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO reminders (month, member, charged_on, txid, next_due) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (month, member) DO UPDATE SET charged_on = excluded.charged_on, "
+                "txid = excluded.txid, reminders_sent = 0, last_sent = NULL, "
+                "next_due = excluded.next_due",
+                (
+                    month,
+                    member,
+                    charged_on.isoformat(),
+                    txid,
+                    self.cadence.first_due(charged_on).isoformat(),
+                ),
+            )
+            if txid:
+                self._record_txid(conn, txid, month, member)
+
+    def _record_txid(self, conn: sqlite3.Connection, txid: str, month: str, member: str) -> None:
+        conn.execute(
+            "INSERT OR IGNORE INTO charges (txid, month, member) VALUES (?, ?, ?)",
+            (txid, month, member),
+        )
+
+    def charges(self, month: str) -> dict[str, str]:
+        """Every txid issued in a period, mapped to the member it was issued for."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT txid, member FROM charges WHERE month = ?", (month,)
+            ).fetchall()
+        return {row["txid"]: row["member"] for row in rows}
+
+    def ensure(self, members: list[str], month: str, charged_on: date) -> int:
+        """Add a row for members charged outside the scheduler (or before it existed)."""
+        next_due = self.cadence.first_due(charged_on).isoformat()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO reminders (month, member, charged_on, next_due) "
+                "VALUES (?, ?, ?, ?)",
+                [(month, member, charged_on.isoformat(), next_due) for member in members],
+            )
+            added = conn.total_changes - before
+        if added:
+            logger.info("Scheduled reminders for %s members without a recorded charge", added)
+        return added
+
+    def due(self, month: str, today: date) -> list[dict]:
+        """Rows whose next reminder is due on or before ``today``."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT member, charged_on, txid, reminders_sent, last_sent FROM reminders "
+                "WHERE month = ? AND next_due IS NOT NULL AND next_due <= ? "
+                "ORDER BY next_due",
+                (month, today.isoformat()),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def record_reminder(self, member: str, month: str, sent_on: date, txid: str = "") -> None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT charged_on, reminders_sent FROM reminders WHERE month = ? AND member = ?",
+                (month, member),
+            ).fetchone()
+            if row is None:
+                return
+            reminders_sent = row["reminders_sent"] + 1
+            next_due = self.cadence.next_due(
+                date.fromisoformat(row["charged_on"]), sent_on, reminders_sent
+            )
+            conn.execute(
+                "UPDATE reminders SET reminders_sent = ?, last_sent = ?, next_due = ?, "
+                "txid = COALESCE(NULLIF(?, ''), txid) WHERE month = ? AND member = ?",
+                (reminders_sent, sent_on.isoformat(), next_due.isoformat(), txid, month, member),
+            )
+            if txid:
+                self._record_txid(conn, txid, month, member)
+
+    def resolve(self, members: list[str], month: str) -> None:
+        """Stop reminding members who have paid."""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE reminders SET next_due = NULL WHERE month = ? AND member = ?",
+                [(month, member) for member in members],
+            )
+
+    def last_activity(self, month: str) -> Optional[date]:
+        """Most recent day a charge or reminder went out in a period."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT MAX(MAX(charged_on), COALESCE(MAX(last_sent), '')) AS last "
+                "FROM reminders WHERE month = ?",
+                (month,),
+            ).fetchone()
+        if not row or not row["last"]:
+            return None
+        return date.fromisoformat(row["last"])
@@ -0,0 +1,271 @@
+import sys
+from collections.abc import MutableMapping
+from typing import Iterable, Iterator, Mapping, Optional
+
+from src.utils.business_days import get_month_name_pt
+
+# Only these headers are months; any other column (phone, notes) is ignored.
+MONTH_COLUMNS = tuple(get_month_name_pt(month) for month in range(1, 13))
+
+# One byte per (member, month) cell.
+BLANK = 0
+PAID = 1
+OTHER = 2
+
+PAID_VALUES = ("paid", "pago")
+
+
+def status_code(value) -> int:
+    text = str(value).strip().lower()
+    if not text:
+        return BLANK
+    if text in PAID_VALUES:
+        return PAID
+    return OTHER
+
+
+class StatusMatrix:
+    """Payment status of every member for every month, one byte per cell.
+
+    Rows are members, columns are the month headers of the worksheet. Cells
+    hold ``BLANK``, ``PAID`` or ``OTHER``; "Paid"/"Pago" read back as
+    "Paid", and the original text of ``OTHER`` cells (notes, "Isento", ...)
+    is kept in a sparse side table so it can be read back unchanged.
+    """
+
+    __slots__ = ("months", "_columns", "_codes", "_other", "rows")
+
+    def __init__(self, months: Iterable[str]):
+        self.months: tuple[str, ...] = tuple(sys.intern(str(month)) for month in months)
+        self._columns = {month: idx for idx, month in enumerate(self.months)}
+        self._codes = bytearray()
+        self._other: dict[tuple[int, int], str] = {}
+        self.rows = 0
+
+    @property
+    def width(self) -> int:
+        return len(self.months)
+
+    def column(self, month: str) -> Optional[int]:
+        return self._columns.get(month)
+
+    def add_row(self, statuses: Mapping[str, object]) -> int:
+        row = self.rows
+        cells = bytearray(self.width)
+        for month, value in statuses.items():
+            col = self._columns.get(month)
+            if col is None:
+                continue
+            code = status_code(value)
+            cells[col] = code
+            if code == OTHER:
+                self._other[(row, col)] = str(value)
+        self._codes += cells
+        self.rows += 1
+        return row
+
+    def get(self, row: int, month: str, default: str = "") -> str:
+        col = self._columns.get(month)
+        if col is None:
+            return default
+        code = self._codes[row * self.width + col]
+        if code == PAID:
+            return "Paid"
+        if code == OTHER:
+            return self._other[(row, col)]
+        return ""
+
+    def set(self, row: int, month: str, value: str) -> None:
+        col = self._columns.get(month)
+        if col is None:
+            raise KeyError(month)
+        code = status_code(value)
+        self._codes[row * self.width + col] = code
+        if code == OTHER:
+            self._other[(row, col)] = str(value)
+        else:
+            self._other.pop((row, col), None)
+
+    def column_codes(self, month: str) -> bytes:
+        """The status codes of one month for every row, as a bytes column."""
+        col = self._columns.get(month)
+        if col is None:
+            return bytes(self.rows)
+        return bytes(self._codes[col::self.width])
+
+    def unpaid_rows(self, month: str) -> list[int]:
+        """Rows not marked as paid in a month (unknown months count as unpaid)."""
+        column = self.column_codes(month)
+        return [row for row, code in enumerate(column) if code != PAID]
+
+    def paid_count(self, month: str) -> int:
+        return self.column_codes(month).count(PAID)
+
+    def _owed_end(self, through: Optional[str]) -> int:
+        if through is None:
+            return self.width
+        col = self._columns.get(through)
+        if col is None:
+            raise KeyError(through)
+        return col + 1
+
+    def owed_columns(self, row: int, through: Optional[str] = None) -> list[int]:
+        """Blank columns of one row a member owes, up to and including ``through``.
+
+        Months before the row's first non-blank cell predate the member joining
+        and are not owed; a row with no marks at all owes only its last month.
+        Cells with any text other than paid (exemptions, notes) are never owed.
+        """
+        end = self._owed_end(through)
+        start = row * self.width
+        codes = self._codes[start:start + end]
+        first = end - len(codes.lstrip(bytes([BLANK])))
+        if first == end:
+            return [end - 1] if end else []
+        return [col for col in range(first, end) if codes[col] == BLANK]
+
+    def months_owed(self, through: Optional[str] = None) -> list[int]:
+        """Number of owed months per row, up to and including ``through``.
+
+        Counts the same months as ``owed_columns``. ``None`` counts every month
+        column.
+        """
+        end = self._owed_end(through)
+        width = self.width
+        codes = self._codes
+        blank = bytes([BLANK])
+        owed = []
+        for row in range(self.rows):
+            joined = codes[row * width:row * width + end].lstrip(blank)
+            owed.append(joined.count(BLANK) if joined else min(end, 1))
+        return owed
+
+    def row_codes(self, row: int) -> bytes:
+        start = row * self.width
+        return bytes(self._codes[start:start + self.width])
+
+
+class StatusRow(MutableMapping):
+    """Dict-like view of one member's row in a ``StatusMatrix``."""
+
+    __slots__ = ("_matrix", "_row")
+
+    def __init__(self, matrix: StatusMatrix, row: int):
+        self._matrix = matrix
+        self._row = row
+
+    def __getitem__(self, month: str) -> str:
+        if self._matrix.column(month) is None:
+            raise KeyError(month)
+        return self._matrix.get(self._row, month)
+
+    def get(self, month: str, default: str = "") -> str:
+        return self._matrix.get(self._row, month, default)
+
+    def __setitem__(self, month: str, value: str) -> None:
+        self._matrix.set(self._row, month, value)
+
+    def __delitem__(self, month: str) -> None:
+        self._matrix.set(self._row, month, "")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._matrix.months)
+
+    def __len__(self) -> int:
+        return self._matrix.width
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class Member:
+    """A roster row: identity plus a view into the shared status matrix.
+
+    Members built on their own (``Member(name, email, {...})``) get a
+    private one-row matrix, so the dict-style ``payment_status`` API keeps
+    working everywhere.
+    """
+
+    __slots__ = ("name", "email", "row", "matrix")
+
+    def __init__(
+        self,
+        name: str,
+        email: str,
+        payment_status: Optional[Mapping[str, object]] = None,
+        matrix: Optional[StatusMatrix] = None,
+        row: int = 0,
+    ):
+        if matrix is None:
+            payment_status = payment_status or {}
+            matrix = StatusMatrix(payment_status)
+            row = matrix.add_row(payment_status)
+        self.name = name
+        self.email = email
+        self.matrix = matrix
+        self.row = row
+
+    @property
+    def payment_status(self) -> StatusRow:
+        return StatusRow(self.matrix, self.row)
+
+    def is_paid(self, month: str) -> bool:
+        col = self.matrix.column(month)
+        if col is None:
+            return False
+        return self.matrix.row_codes(self.row)[col] == PAID
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Member):
+            return NotImplemented
+        return (
+            self.name == other.name
+            and self.email == other.email
+            and dict(self.payment_status) == dict(other.payment_status)
+        )
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Member(name={self.name!r}, email={self.email!r}, row={self.row})"
+
+
+class Roster:
+    """The members of one worksheet and their shared status matrix."""
+
+    __slots__ = ("members", "matrix")
+
+    def __init__(self, members: list[Member], matrix: StatusMatrix):
+        self.members = members
+        self.matrix = matrix
+
+    @classmethod
+    def from_records(cls, records: list[dict], months: Optional[Iterable[str]] = None) -> "Roster":
+        """Build a roster from ``get_all_records()`` rows, skipping rows without a name.
+
+        Without ``months``, the month columns are the headers named after a
+        month, in calendar order whatever their order in the sheet.
+        """
+        if months is None:
+            headers = records[0] if records else {}
+            months = [month for month in MONTH_COLUMNS if month in headers]
+        matrix = StatusMatrix(months)
+        members = []
+        for record in records:
+            name = record.get("Pessoas", record.get("Nome", record.get("Name", "")))
+            if not name:
+                continue
+            row = matrix.add_row(record)
+            members.append(Member(name, record.get("Email", ""), matrix=matrix, row=row))
+        return cls(members, matrix)
+
+    def unpaid(self, month: str) -> list[Member]:
+        return [self.members[row] for row in self.matrix.unpaid_rows(month)]
+
+    def months_owed(self, through: Optional[str] = None) -> dict[str, int]:
+        """Members who owe at least one month, mapped to how many they owe."""
+        return {
+            self.members[row].name: owed
+            for row, owed in enumerate(self.matrix.months_owed(through))
+            if owed
+        }
@@ -2,20 +2,20 @@ import base64
 import json
 import logging
 import os
-from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-import gspread
-from google.oauth2.service_account import Credentials
+from src.utils.ratelimit import RateLimiter
 
-logger = logging.getLogger(__name__)
+from .roster import Member, Roster
+
+# gspread and google.auth are imported when the sheet is first used, not with
+# this module, so jobs that only read DEFAULT_SHEET_NAME or skip today stay fast.
+if TYPE_CHECKING:
+    import gspread
 
+logger = logging.getLogger(__name__)
 
-@dataclass
-class Member:
-    name: str
-    email: str
-    payment_status: dict[str, str]
+DEFAULT_SHEET_NAME = "2026"
 
 
 class SheetsService:
@@ -29,7 +29,13 @@ class SheetsService:
         credentials_path: Optional[str] = None,
         credentials_base64: Optional[str] = None,
         spreadsheet_id: Optional[str] = None,
+        sheet_name: Optional[str] = None,
+        client: Optional["gspread.Client"] = None,
+        rate_limiter: Optional[RateLimiter] = None,
     ):
+        from .cassette import get_cassette
+
+        self._cassette = get_cassette()
         self.credentials_path = credentials_path or os.getenv(
             "GOOGLE_CREDENTIALS_PATH", "credentials.json"
         )
@@ -37,19 +43,31 @@ class SheetsService:
             "GOOGLE_CREDENTIALS_BASE64"
         )
         self.spreadsheet_id = spreadsheet_id or os.getenv("SPREADSHEET_ID")
+        self.sheet_name = sheet_name or os.getenv("SHEET_NAME", DEFAULT_SHEET_NAME)
+        self.rate_limiter = rate_limiter
 
         if not self.spreadsheet_id:
             raise ValueError(
                 "SPREADSHEET_ID environment variable or spreadsheet_id parameter is required"
             )
 
-        self._client: Optional[gspread.Client] = None
-        self._spreadsheet: Optional[gspread.Spreadsheet] = None
+        self._client: Optional["gspread.Client"] = client
+        self._spreadsheet: Optional["gspread.Spreadsheet"] = None
+        self._rosters: dict[str, Roster] = {}
 
-    def _get_client(self) -> gspread.Client:
+    def _get_client(self) -> "gspread.Client":
         if self._client is None:
+            import gspread
+            from google.auth.credentials import AnonymousCredentials
+            from google.oauth2.service_account import Credentials
+
+            from .cassette import REPLAY
+
             try:
-                if self.credentials_base64:
+                if self._cassette is not None and self._cassette.mode == REPLAY:
+                    credentials = AnonymousCredentials()
+                    logger.info("Replaying Google Sheets from %s", self._cassette.path)
+                elif self.credentials_base64:
                     credentials_json = base64.b64decode(self.credentials_base64).decode("utf-8")
                     credentials_info = json.loads(credentials_json)
                     credentials = Credentials.from_service_account_info(
@@ -62,88 +80,132 @@ class SheetsService:
                     )
                     logger.info("Authenticated using credentials file")
                 self._client = gspread.authorize(credentials)
+                if self._cassette is not None:
+                    session = self._client.http_client.session
+                    real = session.get_adapter("https://")
+                    session.mount("https://", self._cassette.adapter("sheets", real))
                 logger.info("Successfully authenticated with Google Sheets API")
             except FileNotFoundError:
-                logger.error(f"Credentials file not found: {self.credentials_path}")
+                logger.error("Credentials file not found: %s", self.credentials_path)
                 raise
             except Exception as e:
-                logger.error(f"Failed to authenticate with Google Sheets API: {e}")
+                logger.error("Failed to authenticate with Google Sheets API: %s", e)
                 raise
         return self._client
 
-    def _get_spreadsheet(self) -> gspread.Spreadsheet:
+    def for_spreadsheet(
+        self,
+        spreadsheet_id: str,
+        sheet_name: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> "SheetsService":
+        """A service for another spreadsheet sharing this one's authorized session."""
+        return SheetsService(
+            credentials_path=self.credentials_path,
+            credentials_base64=self.credentials_base64,
+            spreadsheet_id=spreadsheet_id,
+            sheet_name=sheet_name,
+            client=self._get_client(),
+            rate_limiter=rate_limiter,
+        )
+
+    def _throttle(self) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def _get_spreadsheet(self) -> "gspread.Spreadsheet":
+        import gspread
+
         if self._spreadsheet is None:
             try:
                 client = self._get_client()
+                self._throttle()
                 self._spreadsheet = client.open_by_key(self.spreadsheet_id)
-                logger.info(f"Opened spreadsheet: {self._spreadsheet.title}")
+                logger.info("Opened spreadsheet: %s", self._spreadsheet.title)
             except gspread.SpreadsheetNotFound:
-                logger.error(f"Spreadsheet not found: {self.spreadsheet_id}")
+                logger.error("Spreadsheet not found: %s", self.spreadsheet_id)
                 raise
             except Exception as e:
-                logger.error(f"Failed to open spreadsheet: {e}")
+                logger.error("Failed to open spreadsheet: %s", e)
                 raise
         return self._spreadsheet
 
-    def get_members(self, sheet_name: str = "2026") -> list[Member]:
+    def get_roster(self, sheet_name: Optional[str] = None, refresh: bool = False) -> Roster:
+        """Return the members of a worksheet with their status matrix.
+
+        The snapshot is cached per worksheet for the lifetime of the service, so
+        jobs sharing one instance only read the sheet once. Pass ``refresh=True``
+        to force a new read. ``sheet_name`` defaults to the service's worksheet.
+        """
+        sheet_name = sheet_name or self.sheet_name
+        if not refresh and sheet_name in self._rosters:
+            return self._rosters[sheet_name]
+
+        import gspread
+
         try:
             spreadsheet = self._get_spreadsheet()
+            self._throttle()
             worksheet = spreadsheet.worksheet(sheet_name)
             records = worksheet.get_all_records()
 
-            members = []
-            for record in records:
-                name = record.get("Pessoas", record.get("Nome", record.get("Name", "")))
-                email = record.get("Email", "")
-
-                payment_status = {
-                    key: value
-                    for key, value in record.items()
-                    if key not in ["Pessoas", "Nome", "Name", "Email"]
-                }
+            roster = Roster.from_records(records)
 
-                if name:
-                    members.append(
-                        Member(name=name, email=email, payment_status=payment_status)
-                    )
-
-            logger.info(f"Retrieved {len(members)} members from spreadsheet")
-            return members
+            logger.info("Retrieved %s members from spreadsheet", len(roster.members))
+            self._rosters[sheet_name] = roster
+            return roster
 
         except gspread.WorksheetNotFound:
-            logger.error(f"Worksheet not found: {sheet_name}")
+            logger.error("Worksheet not found: %s", sheet_name)
             raise
         except Exception as e:
-            logger.error(f"Failed to get members: {e}")
+            logger.error("Failed to get members: %s", e)
             raise
 
+    def get_members(
+        self, sheet_name: Optional[str] = None, refresh: bool = False
+    ) -> list[Member]:
+        return self.get_roster(sheet_name, refresh).members
+
     def get_unpaid_members(
-        self, month: str, sheet_name: str = "2026"
+        self, month: str, sheet_name: Optional[str] = None
     ) -> list[Member]:
         try:
-            members = self.get_members(sheet_name)
+            unpaid_members = self.get_roster(sheet_name).unpaid(month)
 
-            unpaid_members = [
-                member
-                for member in members
-                if member.payment_status.get(month, "").lower() != "paid"
-                and member.payment_status.get(month, "").lower() != "pago"
-            ]
-
-            logger.info(
-                f"Found {len(unpaid_members)} unpaid members for month: {month}"
-            )
+            logger.info("Found %s unpaid members for month: %s", len(unpaid_members), month)
             return unpaid_members
 
         except Exception as e:
-            logger.error(f"Failed to get unpaid members for {month}: {e}")
+            logger.error("Failed to get unpaid members for %s: %s", month, e)
             raise
 
+    def invalidate_cache(self, sheet_name: Optional[str] = None) -> None:
+        if sheet_name is None:
+            self._rosters.clear()
+        else:
+            self._rosters.pop(sheet_name, None)
+
+    def _update_cached_status(
+        self, name: str, month: str, value: str, sheet_name: str
+    ) -> None:
+        roster = self._rosters.get(sheet_name)
+        if roster is None or roster.matrix.column(month) is None:
+            return
+        for member in roster.members:
+            if member.name == name:
+                member.payment_status[month] = value
+                break
+
     def mark_as_paid(
-        self, name: str, month: str, sheet_name: str = "2026"
+        self, name: str, month: str, sheet_name: Optional[str] = None
     ) -> bool:
+        import gspread
+
+        sheet_name = sheet_name or self.sheet_name
         try:
             spreadsheet = self._get_spreadsheet()
+            self._throttle()
             worksheet = spreadsheet.worksheet(sheet_name)
 
             headers = worksheet.row_values(1)
@@ -161,7 +223,7 @@ class SheetsService:
                 raise ValueError("Name column not found")
 
             if month_col is None:
-                logger.error(f"Month column '{month}' not found in spreadsheet")
+                logger.error("Month column '%s' not found in spreadsheet", month)
                 raise ValueError(f"Month column '{month}' not found")
 
             name_cells = worksheet.col_values(name_col)
@@ -172,16 +234,102 @@ class SheetsService:
                     break
 
             if row_num is None:
-                logger.error(f"Member not found: {name}")
+                logger.error("Member not found: %s", name)
                 raise ValueError(f"Member not found: {name}")
 
             worksheet.update_cell(row_num, month_col, "Paid")
-            logger.info(f"Marked {name} as paid for {month}")
+            self._update_cached_status(name, month, "Paid", sheet_name)
+            logger.info("Marked %s as paid for %s", name, month)
             return True
 
         except gspread.WorksheetNotFound:
-            logger.error(f"Worksheet not found: {sheet_name}")
+            logger.error("Worksheet not found: %s", sheet_name)
+            raise
+        except Exception as e:
+            logger.error("Failed to mark %s as paid for %s: %s", name, month, e)
+            raise
+
+    def mark_many_as_paid(
+        self, names: list[str], month: str, sheet_name: Optional[str] = None
+    ) -> list[str]:
+        """Mark several members as paid for one month with a single batched write.
+
+        Returns the names that were found and updated; unknown names are logged
+        and skipped rather than failing the whole batch.
+        """
+        marked = self.mark_cells_as_paid({name: [month] for name in names}, sheet_name)
+        return list(marked)
+
+    def mark_cells_as_paid(
+        self, months_by_name: dict[str, list[str]], sheet_name: Optional[str] = None
+    ) -> dict[str, list[str]]:
+        """Mark any number of (member, month) cells as paid in one batched write.
+
+        Returns the months actually marked per member; unknown names and month
+        columns are logged and skipped rather than failing the whole batch.
+        """
+        if not any(months_by_name.values()):
+            return {}
+
+        import gspread
+        from gspread.utils import rowcol_to_a1
+
+        sheet_name = sheet_name or self.sheet_name
+        try:
+            spreadsheet = self._get_spreadsheet()
+            self._throttle()
+            worksheet = spreadsheet.worksheet(sheet_name)
+
+            headers = worksheet.row_values(1)
+            name_col = None
+            month_cols: dict[str, int] = {}
+
+            for idx, header in enumerate(headers, start=1):
+                if header in ["Pessoas", "Nome", "Name"]:
+                    name_col = idx
+                else:
+                    month_cols.setdefault(header, idx)
+
+            if name_col is None:
+                logger.error("Name column not found in spreadsheet")
+                raise ValueError("Name column not found")
+
+            rows_by_name: dict[str, int] = {}
+            for idx, cell_name in enumerate(worksheet.col_values(name_col), start=1):
+                rows_by_name.setdefault(cell_name, idx)
+
+            updates = []
+            marked: dict[str, list[str]] = {}
+            for name, months in months_by_name.items():
+                row_num = rows_by_name.get(name)
+                if row_num is None:
+                    logger.error("Member not found: %s", name)
+                    continue
+                for month in months:
+                    month_col = month_cols.get(month)
+                    if month_col is None:
+                        logger.error("Month column '%s' not found in spreadsheet", month)
+                        continue
+                    updates.append(
+                        {"range": rowcol_to_a1(row_num, month_col), "values": [["Paid"]]}
+                    )
+                    marked.setdefault(name, []).append(month)
+
+            if updates:
+                worksheet.batch_update(updates)
+
+            for name, months in marked.items():
+                for month in months:
+                    self._update_cached_status(name, month, "Paid", sheet_name)
+
+            logger.info(
+                "Marked %s cells as paid for %s members in one write", len(updates), len(marked)
+            )
+            return marked
+
+        except gspread.WorksheetNotFound:
+            logger.error("Worksheet not found: %s", sheet_name)
             raise
         except Exception as e:
-            logger.error(f"Failed to mark {name} as paid for {month}: {e}")
+            logger.error("Failed to mark %s members as paid: %s", len(months_by_name), e)
             raise
@@ -0,0 +1,87 @@
+"""
+Groups (tenants) served by one runner process.
+
+The tenants file (``TENANTS_FILE``, default ``tenants.json``) lists one entry
+per caixinha::
+
+    {
+      "tenants": [
+        {"name": "trilha", "spreadsheet_id": "1AbC...", "pix_key": "caixinha@trilha.org"},
+        {"name": "coral", "spreadsheet_id": "1XyZ...", "pix_key": "coral@example.org",
+         "sheet_name": "Mensalidades", "monthly_fee": "25.00", "rate_limit": 2}
+      ]
+    }
+
+``sheet_name`` defaults to the ``SHEET_NAME`` worksheet, ``monthly_fee`` to
+``MONTHLY_FEE``, and ``rate_limit`` (Efí and Sheets calls per second for that
+tenant) to no limit. Every tenant keeps its local state (reminder schedule,
+leases, outbox) under ``<CAIXINHA_STATE_DIR>/tenants/<name>/``.
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+from src.utils.state import get_state_dir
+
+from .arrears import MONTHLY_FEE, to_decimal
+from .sheets import DEFAULT_SHEET_NAME
+
+TENANT_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@dataclass(frozen=True)
+class Tenant:
+    name: str
+    spreadsheet_id: str
+    pix_key: str
+    sheet_name: str = DEFAULT_SHEET_NAME
+    monthly_fee: str = MONTHLY_FEE
+    rate_limit: Optional[float] = None
+
+    @property
+    def state_dir(self) -> Path:
+        return get_state_dir() / "tenants" / self.name
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Tenant":
+        missing = [key for key in ("name", "spreadsheet_id", "pix_key") if not data.get(key)]
+        if missing:
+            raise ValueError(f"Tenant {data.get('name', '?')} is missing {', '.join(missing)}")
+        name = str(data["name"])
+        if not TENANT_NAME.match(name):
+            raise ValueError(f"Tenant name must be letters, digits, - or _: {name!r}")
+
+        monthly_fee = str(data.get("monthly_fee", MONTHLY_FEE))
+        if to_decimal(monthly_fee) <= 0:
+            raise ValueError(f"Tenant {name} has an invalid monthly_fee: {monthly_fee}")
+        rate_limit = data.get("rate_limit")
+        if rate_limit is not None and float(rate_limit) <= 0:
+            raise ValueError(f"Tenant {name} has a non-positive rate_limit: {rate_limit}")
+
+        return cls(
+            name=name,
+            spreadsheet_id=str(data["spreadsheet_id"]),
+            pix_key=str(data["pix_key"]),
+            sheet_name=str(data.get("sheet_name") or os.getenv("SHEET_NAME", DEFAULT_SHEET_NAME)),
+            monthly_fee=monthly_fee,
+            rate_limit=float(rate_limit) if rate_limit is not None else None,
+        )
+
+
+def load_tenants(path: Optional[Union[str, Path]] = None) -> list[Tenant]:
+    """Tenants listed in ``path`` (or ``TENANTS_FILE``), validated; names must be unique."""
+    path = Path(path or os.getenv("TENANTS_FILE", "tenants.json"))
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    tenants = [Tenant.from_dict(entry) for entry in data.get("tenants", [])]
+    if not tenants:
+        raise ValueError(f"No tenants listed in {path}")
+    names = [tenant.name for tenant in tenants]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate tenant names in {path}: {', '.join(duplicates)}")
+    return tenants
@@ -0,0 +1,135 @@
+import sys
+from datetime import date
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.bench.fakes import FakeEmailService, FakeSheetsService
+from src.jobs.process_payments import apply_payments, plan_payments
+from src.services.collection_stats import CollectionStats
+from src.services.arrears import allocate_payment, compute_arrears, owed_months
+from src.services.idempotency import IdempotencyStore, SqliteLeaseBackend, pix_key
+from src.services.roster import Roster
+from src.utils.plan import WRITE_CELL
+from src.utils.results import ResultSink
+
+
+def make_roster() -> Roster:
+    # Columns as a hand-maintained sheet may have them: extras, out of order.
+    return Roster.from_records([
+        {"Pessoas": "Ana", "Email": "ana@example.com", "Telefone": "", "Fevereiro": "",
+         "Janeiro": "Paid", "Obs": "", "Março": ""},
+        {"Pessoas": "Bia", "Email": "bia@example.com", "Telefone": "83 9999", "Fevereiro": "Pago",
+         "Janeiro": "Isento", "Obs": "", "Março": ""},
+        {"Pessoas": "Caio", "Email": "", "Telefone": "", "Fevereiro": "Paid",
+         "Janeiro": "Paid", "Obs": "ok", "Março": "Paid"},
+    ])
+
+
+def pix(end_to_end_id: str, payer: str, valor: str, horario: str = "2026-03-05T12:00:00Z") -> dict:
+    return {
+        "endToEndId": end_to_end_id,
+        "txid": "",
+        "valor": valor,
+        "horario": horario,
+        "pagador": {"nome": payer},
+    }
+
+
+def planned_cells(plan) -> list[tuple[str, str]]:
+    return [(action.member, action.target) for action in plan.of_kind(WRITE_CELL)]
+
+
+def test_only_month_headers_are_months_in_calendar_order():
+    roster = make_roster()
+
+    assert roster.matrix.months == ("Janeiro", "Fevereiro", "Março")
+    assert owed_months(roster.members[0], "Março") == ["Fevereiro", "Março"]
+
+
+def test_compute_arrears_skips_non_month_columns_and_settled_members():
+    arrears = compute_arrears(make_roster(), "Março", "40.00")
+
+    assert sorted(arrears) == ["Ana", "Bia"]
+    assert arrears["Ana"].months == ["Fevereiro", "Março"]
+    assert arrears["Ana"].amount == "80.00"
+    # "Isento" is not owed; only the blank month is.
+    assert arrears["Bia"].months == ["Março"]
+
+
+def test_members_who_joined_mid_year_owe_nothing_before_joining():
+    roster = Roster.from_records([
+        {"Pessoas": "Ana", "Email": "", "Janeiro": "Paid", "Fevereiro": "", "Março": ""},
+        # Joined in February: January was never theirs to pay.
+        {"Pessoas": "Davi", "Email": "", "Janeiro": "", "Fevereiro": "Pago", "Março": ""},
+        # Joined this month, nothing marked yet.
+        {"Pessoas": "Eva", "Email": "", "Janeiro": "", "Fevereiro": "", "Março": ""},
+    ])
+
+    arrears = compute_arrears(roster, "Março", "40.00")
+
+    assert arrears["Ana"].months == ["Fevereiro", "Março"]
+    assert arrears["Davi"].months == ["Março"]
+    assert arrears["Eva"].months == ["Março"]
+    assert roster.months_owed("Março") == {"Ana": 2, "Davi": 1, "Eva": 1}
+
+
+def test_allocate_partial_payment_covers_whole_fees_only():
+    owed = ["Janeiro", "Fevereiro", "Março"]
+
+    assert allocate_payment(owed, "60.00", "40.00") == ["Janeiro"]
+    assert allocate_payment(owed, "39,99", "40.00") == []
+
+
+def test_allocate_overpayment_is_capped_at_months_owed():
+    assert allocate_payment(["Fevereiro", "Março"], "200.00", "40.00") == ["Fevereiro", "Março"]
+
+
+def test_plan_covers_oldest_months_first():
+    roster = make_roster()
+
+    plan = plan_payments([pix("E1", "Ana", "80.00")], roster.members, "Março", ResultSink(), "2026")
+
+    assert planned_cells(plan) == [("Ana", "Fevereiro"), ("Ana", "Março")]
+
+
+def test_plan_never_covers_months_after_the_payment():
+    roster = make_roster()
+    february_pix = pix("E1", "Ana", "80.00", horario="2026-02-20T12:00:00Z")
+
+    plan = plan_payments([february_pix], roster.members, "Março", ResultSink(), "2026")
+
+    assert planned_cells(plan) == [("Ana", "Fevereiro")]
+
+
+def test_applied_pix_listed_again_is_not_moved_to_the_next_month(tmp_path):
+    roster = make_roster()
+    store = IdempotencyStore(SqliteLeaseBackend(tmp_path / "leases.sqlite3"))
+    store.claim([pix_key("E1")])
+    store.complete([pix_key("E1")])
+    sink = ResultSink()
+
+    plan = plan_payments([pix("E1", "Ana", "40.00")], roster.members, "Março", sink, "2026", store=store)
+
+    assert planned_cells(plan) == []
+    assert [item["status"] for item in sink.items] == ["already_paid"]
+
+
+def test_pix_without_horario_counts_as_paid_on_the_injected_day(tmp_path):
+    sheets = FakeSheetsService(member_count=2)
+    stats = CollectionStats(tmp_path / "stats.sqlite3")
+    payment = pix("E1", "Membro 001", "40.00")
+    del payment["horario"]
+
+    result = apply_payments(
+        [payment],
+        sheets.get_members(),
+        "Março",
+        sheets,
+        FakeEmailService(),
+        stats=stats,
+        today=date(2026, 3, 10),
+    )
+
+    assert result["processed"] == 1
+    _, rows = stats._rows("member_months")
+    assert rows == [("2026-03", "Membro 001", 1, "2026-03-10", 4000)]
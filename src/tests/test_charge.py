@@ -1,6 +1,7 @@
 """
 Test script to generate a PIX charge and send email.
 Uses the "teste" sheet with only test members.
+Run with CASSETTE_MODE=record/replay to record the session or replay it offline.
 """
 import logging
 import sys
@@ -11,11 +12,8 @@ from src.services.efi import EfiService
 from src.services.email import EmailService
 from src.services.sheets import SheetsService
 from src.utils.business_days import get_current_month_column
+from src.utils.log import setup_logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
 TEST_SHEET = "teste"
@@ -24,10 +22,10 @@ TEST_AMOUNT = "0.01"
 
 def run_test_charge() -> dict:
     logger.info("=== TEST: CHARGE GENERATION (R$0.01) ===")
-    logger.info(f"Using sheet: {TEST_SHEET}")
+    logger.info("Using sheet: %s", TEST_SHEET)
     
     month_column = get_current_month_column()
-    logger.info(f"Current month: {month_column}")
+    logger.info("Current month: %s", month_column)
     
     sheets_service = SheetsService()
     efi_service = EfiService()
@@ -36,15 +34,15 @@ def run_test_charge() -> dict:
     try:
         unpaid_members = sheets_service.get_unpaid_members(month_column, sheet_name=TEST_SHEET)
     except Exception as e:
-        logger.error(f"Failed to get members from '{TEST_SHEET}' sheet: {e}")
+        logger.error("Failed to get members from '%s' sheet: %s", TEST_SHEET, e)
         return {"status": "error", "error": str(e)}
     
     if not unpaid_members:
-        logger.info(f"No unpaid members in '{TEST_SHEET}' sheet for {month_column}")
+        logger.info("No unpaid members in '%s' sheet for %s", TEST_SHEET, month_column)
         return {"status": "success", "message": "No unpaid members", "charges": 0}
     
     member = unpaid_members[0]
-    logger.info(f"Testing with: {member.name} ({member.email})")
+    logger.info("Testing with: %s (%s)", member.name, member.email)
     
     try:
         charge = efi_service.create_pix_charge(
@@ -53,8 +51,8 @@ def run_test_charge() -> dict:
             descricao=f"TESTE Caixinha - {month_column}",
         )
         
-        logger.info(f"PIX charge created: txid={charge.txid}")
-        logger.info(f"PIX code: {charge.copy_paste_code[:50]}...")
+        logger.info("PIX charge created: txid=%s", charge.txid)
+        logger.info("PIX code: %s...", charge.copy_paste_code[:50])
         
         if member.email:
             email_service.send_charge_email(
@@ -65,7 +63,7 @@ def run_test_charge() -> dict:
                 due_date="07/02/2026",
                 amount=TEST_AMOUNT,
             )
-            logger.info(f"Email sent to {member.email}")
+            logger.info("Email sent to %s", member.email)
         
         return {
             "status": "success",
@@ -76,18 +74,19 @@ def run_test_charge() -> dict:
         }
         
     except Exception as e:
-        logger.error(f"Test failed: {e}")
+        logger.error("Test failed: %s", e)
         return {"status": "error", "error": str(e)}
 
 
 def main():
+    setup_logging()
     result = run_test_charge()
     
     if result["status"] == "error":
-        logger.error(f"Test failed: {result.get('error')}")
+        logger.error("Test failed: %s", result.get('error'))
         sys.exit(1)
     
-    logger.info(f"Test completed: {result}")
+    logger.info("Test completed: %s", result)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+import sys
+from datetime import date
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.bench.fakes import FakeEfiService, FakeEmailService, FakeSheetsService
+from src.jobs.drain_pix_queue import drain_delay, run_drain_pix_queue
+from src.services.collection_stats import CollectionStats
+from src.services.email_outbox import EmailOutbox
+from src.services.idempotency import IdempotencyStore, SqliteLeaseBackend
+from src.services.payer_aliases import PayerAliases
+from src.services.pix_queue import PixQueue
+from src.services.reminder_schedule import ReminderSchedule
+from src.utils.state import use_state_dir
+
+TODAY = date(2026, 3, 10)
+
+
+class FailingSheetsService(FakeSheetsService):
+    def mark_cells_as_paid(self, months_by_name, sheet_name=None):
+        raise ConnectionError("Sheets is down")
+
+
+def queued_pix(tmp_path, members=3) -> PixQueue:
+    efi = FakeEfiService(pay_probability=1, max_delay_days=0, seed=1)
+    efi.today = TODAY
+    for n in range(1, members + 1):
+        efi.create_pix_charge("40.00", f"Membro {n:03d}")
+    queue = PixQueue(tmp_path / "pix_queue.sqlite3")
+    queue.enqueue(efi.list_received_pix("2026-03-01T00:00:00Z", "2026-03-10T23:59:59Z"))
+    return queue
+
+
+def drain(queue, sheets) -> dict:
+    return run_drain_pix_queue(
+        queue=queue,
+        sheets_service=sheets,
+        email_service=FakeEmailService(),
+        store=IdempotencyStore(SqliteLeaseBackend()),
+        outbox=EmailOutbox(),
+        stats=CollectionStats(),
+        aliases=PayerAliases(),
+        schedule=ReminderSchedule(),
+        today=TODAY,
+    )
+
+
+def test_failed_sheet_write_leaves_the_batch_pending_without_spending_attempts(tmp_path):
+    with use_state_dir(tmp_path):
+        queue = queued_pix(tmp_path)
+        assert queue.pending_count() == 3
+
+        for _ in range(queue.max_attempts + 1):
+            result = drain(queue, FailingSheetsService())
+            assert result["status"] == "error"
+            assert result["drained"] == 0
+
+        assert queue.pending_count() == 3
+
+        result = drain(queue, FakeSheetsService())
+        assert result["status"] == "success"
+        assert result["processed"] == 3
+        assert queue.pending_count() == 0
+
+
+def test_unreadable_roster_leaves_the_batch_pending(tmp_path):
+    class DownSheetsService(FakeSheetsService):
+        def get_members(self, sheet_name=None, refresh=False):
+            raise ConnectionError("Sheets is down")
+
+    with use_state_dir(tmp_path):
+        queue = queued_pix(tmp_path)
+        for _ in range(queue.max_attempts + 1):
+            assert drain(queue, DownSheetsService())["status"] == "error"
+        assert queue.pending_count() == 3
+
+
+def test_drain_delay_backs_off_on_consecutive_failures():
+    full = {"status": "success", "drained": 100}
+    failed = {"status": "error", "drained": 0}
+
+    assert drain_delay(full, 100, 5.0, errors=0) == 0
+    assert drain_delay({"status": "success", "drained": 3}, 100, 5.0, errors=0) == 5.0
+    assert drain_delay({**full, "locked": 1}, 100, 5.0, errors=0) == 5.0
+    assert [drain_delay(failed, 100, 5.0, errors=n) for n in (1, 2, 3)] == [10.0, 20.0, 40.0]
+    assert drain_delay(failed, 100, 5.0, errors=20, max_backoff=300) == 300
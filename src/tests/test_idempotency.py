@@ -0,0 +1,88 @@
+import sys
+
+import pytest
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.services.idempotency import (
+    ACQUIRED,
+    DONE,
+    LOCKED,
+    FileLeaseBackend,
+    LeaseBackend,
+    IdempotencyStore,
+    SqliteLeaseBackend,
+    member_month_key,
+    pix_key,
+)
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteLeaseBackend(tmp_path / "leases.sqlite3")
+    return FileLeaseBackend(tmp_path / "leases")
+
+
+def test_claim_is_exclusive_until_released(backend):
+    first = IdempotencyStore(backend, owner="first")
+    second = IdempotencyStore(backend, owner="second")
+    keys = [pix_key("E1"), member_month_key("2026", "Março", "Ana")]
+
+    assert first.claim(keys) == ACQUIRED
+    assert second.claim(keys) == LOCKED
+    # Any overlapping key is enough to block.
+    assert second.claim([member_month_key("2026", "Março", "Ana")]) == LOCKED
+
+    first.release(keys)
+    assert second.claim(keys) == ACQUIRED
+
+
+def test_expired_lease_can_be_taken_over(backend):
+    crashed = IdempotencyStore(backend, lease_seconds=0, owner="crashed")
+    other = IdempotencyStore(backend, owner="other")
+
+    assert crashed.claim([pix_key("E1")]) == ACQUIRED
+    assert other.claim([pix_key("E1")]) == ACQUIRED
+
+
+def test_completed_keys_are_done_for_everyone(backend):
+    first = IdempotencyStore(backend, owner="first")
+    second = IdempotencyStore(backend, owner="second")
+    keys = [pix_key("E1"), member_month_key("2026", "Março", "Ana")]
+
+    first.claim(keys)
+    first.complete(keys)
+
+    assert second.claim(keys) == DONE
+    assert second.claim([pix_key("E1"), pix_key("E2")]) == DONE
+    assert second.pix_done("E1")
+    assert not second.pix_done("E2")
+    assert second.done_months("2026", "Ana", ["Fevereiro", "Março"]) == {"Março"}
+
+
+def test_released_keys_are_not_done(backend):
+    store = IdempotencyStore(backend, owner="first")
+
+    store.claim([pix_key("E1")])
+    store.release([pix_key("E1")])
+
+    assert not store.pix_done("E1")
+    assert IdempotencyStore(backend, owner="second").claim([pix_key("E1")]) == ACQUIRED
+
+
+def test_backends_share_leases_through_lease_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("LEASE_PATH", str(tmp_path / "shared.sqlite3"))
+    cron = IdempotencyStore(SqliteLeaseBackend(), owner="cron")
+    webhook = IdempotencyStore(SqliteLeaseBackend(), owner="webhook")
+
+    cron.claim([pix_key("E1")])
+    cron.complete([pix_key("E1")])
+
+    assert webhook.backend.path == tmp_path / "shared.sqlite3"
+    assert webhook.pix_done("E1")
+
+
+def test_lease_backend_is_abstract():
+    with pytest.raises(TypeError):
+        LeaseBackend()
@@ -0,0 +1,38 @@
+import logging
+import queue
+import sys
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.utils.log import _LazyQueueHandler
+
+
+def _record(msg, *args):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+
+
+def test_prepare_renders_arguments_as_they_were_when_logged():
+    log_queue = queue.SimpleQueue()
+    handler = _LazyQueueHandler(log_queue)
+    members = ["Ana"]
+
+    handler.handle(_record("Charging %s", members))
+    members.append("Bia")
+
+    record = log_queue.get_nowait()
+    assert record.getMessage() == "Charging ['Ana']"
+    assert record.args is None
+
+
+def test_prepare_keeps_exception_info_for_the_listener():
+    log_queue = queue.SimpleQueue()
+    handler = _LazyQueueHandler(log_queue)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = _record("Failed: %s", "x")
+        record.exc_info = sys.exc_info()
+
+    handler.handle(record)
+
+    assert log_queue.get_nowait().exc_info[0] is ValueError
@@ -0,0 +1,57 @@
+import sys
+from datetime import date, datetime, timezone
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.bench.fakes import FakeEfiService, FakeEmailService, FakeSheetsService
+from src.jobs.process_payments import CURSOR_NAME, run_payment_daemon
+from src.utils.results import ResultSink
+from src.utils.state import read_cursor, use_state_dir
+
+NOW = datetime(2026, 3, 10, 15, 0, tzinfo=timezone.utc)
+
+
+class FailingSheetsService(FakeSheetsService):
+    def mark_cells_as_paid(self, months_by_name, sheet_name=None):
+        raise ConnectionError("Sheets is down")
+
+
+def paying_efi() -> FakeEfiService:
+    efi = FakeEfiService(pay_probability=1, max_delay_days=0, seed=1)
+    efi.today = date(2026, 3, 10)
+    efi.create_pix_charge("40.00", "Membro 001")
+    return efi
+
+
+def poll_once(sheets, sink=None) -> dict:
+    return run_payment_daemon(
+        max_polls=1,
+        sheets_service=sheets,
+        efi_service=paying_efi(),
+        email_service=FakeEmailService(),
+        sink=sink,
+        clock=lambda: NOW,
+        sleep=lambda seconds: None,
+    )
+
+
+def test_failed_sheet_write_keeps_the_cursor(tmp_path):
+    sink = ResultSink()
+    with use_state_dir(tmp_path):
+        result = poll_once(FailingSheetsService(member_count=3), sink)
+        cursor = read_cursor(CURSOR_NAME)
+
+    assert result["errors"] == 1
+    assert [item["status"] for item in sink.items] == ["error"]
+    assert cursor is None
+
+
+def test_successful_poll_moves_the_cursor(tmp_path):
+    sheets = FakeSheetsService(member_count=3)
+    with use_state_dir(tmp_path):
+        result = poll_once(sheets)
+        cursor = read_cursor(CURSOR_NAME)
+
+    assert result == {"status": "success", "polls": 1, "processed": 1, "errors": 0}
+    assert cursor == "2026-03-10T15:00:00Z"
+    assert sheets.get_roster().members[0].is_paid("Março")
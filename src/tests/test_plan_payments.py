@@ -0,0 +1,114 @@
+import json
+import sys
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.jobs.process_payments import plan_payments
+from src.services.payer_aliases import PayerAliases
+from src.services.roster import Roster
+from src.utils.plan import WRITE_CELL
+from src.utils.results import ResultSink
+
+
+def make_members():
+    return Roster.from_records([
+        {"Pessoas": "Ana Souza", "Email": "ana@example.com", "Janeiro": "Paid", "Fevereiro": ""},
+        {"Pessoas": "Bia Lima", "Email": "bia@example.com", "Janeiro": "Paid", "Fevereiro": ""},
+        {"Pessoas": "Caio Alves", "Email": "caio@example.com", "Janeiro": "Paid", "Fevereiro": ""},
+    ]).members
+
+
+def pix(end_to_end_id: str, payer: str, txid: str = "", cpf: str = "") -> dict:
+    pagador = {"nome": payer}
+    if cpf:
+        pagador["cpf"] = cpf
+    return {
+        "endToEndId": end_to_end_id,
+        "txid": txid,
+        "valor": "40.00",
+        "horario": "2026-02-10T12:00:00Z",
+        "pagador": pagador,
+    }
+
+
+def matched(pix_list, members_by_txid=None, aliases=None, sink=None):
+    plan = plan_payments(
+        pix_list,
+        make_members(),
+        "Fevereiro",
+        sink or ResultSink(),
+        "2026",
+        members_by_txid=members_by_txid,
+        aliases=aliases,
+    )
+    return [action.member for action in plan.of_kind(WRITE_CELL)]
+
+
+def test_txid_wins_over_alias_and_payer_name(tmp_path):
+    aliases = PayerAliases(tmp_path / "aliases.json")
+    aliases.learn({"nome": "Bia Lima", "cpf": "123.456.789-01"}, "Caio Alves")
+
+    payment = pix("E1", "Bia Lima", txid="TX-ANA", cpf="123.456.789-01")
+
+    assert matched([payment], {"TX-ANA": "Ana Souza"}, aliases) == ["Ana Souza"]
+
+
+def test_alias_wins_over_payer_name(tmp_path):
+    aliases = PayerAliases(tmp_path / "aliases.json")
+    aliases.learn({"nome": "Maria Souza", "cpf": "123.456.789-01"}, "Caio Alves")
+
+    by_document = pix("E1", "Bia Lima", cpf="12345678901")
+    by_name = pix("E2", "Maria Souza")
+
+    assert matched([by_document], aliases=aliases) == ["Caio Alves"]
+    assert matched([by_name], aliases=aliases) == ["Caio Alves"]
+
+
+def test_unknown_txid_falls_back_to_payer_name():
+    payment = pix("E1", "BIA LIMA", txid="TX-OTHER-GROUP")
+
+    assert matched([payment], {"TX-ANA": "Ana Souza"}) == ["Bia Lima"]
+
+
+def test_txid_of_a_member_no_longer_on_the_roster_falls_back_to_name():
+    payment = pix("E1", "Caio Alves", txid="TX-GONE")
+
+    assert matched([payment], {"TX-GONE": "Someone Who Left"}) == ["Caio Alves"]
+
+
+def test_unmatched_payer_is_reported():
+    sink = ResultSink()
+
+    assert matched([pix("E1", "Desconhecido")], sink=sink) == []
+    assert [item["status"] for item in sink.items] == ["not_found"]
+
+
+def test_alias_to_someone_no_longer_on_the_roster_is_ignored(tmp_path):
+    aliases = PayerAliases(tmp_path / "aliases.json")
+    aliases.learn({"nome": "Bia Lima"}, "Someone Who Left")
+
+    assert matched([pix("E1", "Bia Lima")], aliases=aliases) == ["Bia Lima"]
+
+
+def test_learned_aliases_keep_existing_entries_and_skip_masked_documents(tmp_path):
+    aliases = PayerAliases(tmp_path / "aliases.json")
+
+    assert aliases.learn({"nome": "Maria Souza", "cpf": "***.456.789-**"}, "Ana Souza")
+    assert not aliases.learn({"nome": "Maria Souza"}, "Bia Lima")
+    assert not aliases.learn({"nome": "Ana Souza"}, "Ana Souza")
+
+    assert aliases.documents == {}
+    assert aliases.names == {"maria souza": "Ana Souza"}
+
+
+def test_save_keeps_entries_written_since_loading(tmp_path):
+    path = tmp_path / "aliases.json"
+    aliases = PayerAliases(path)
+    path.write_text(json.dumps({"documents": {"987.654.321-00": "Caio Alves"}, "names": {}}))
+
+    aliases.learn({"nome": "Joao Lima", "cpf": "123.456.789-01"}, "Bia Lima")
+
+    assert aliases.save() == 2
+    reloaded = PayerAliases(path)
+    assert reloaded.lookup({"nome": "x", "cpf": "98765432100"}) == "Caio Alves"
+    assert reloaded.lookup({"nome": "JOÃO LIMA"}) == "Bia Lima"
@@ -1,6 +1,7 @@
 """
 Test script to process received PIX payments and update spreadsheet.
 Uses the "teste" sheet with only test members.
+Run with CASSETTE_MODE=record/replay to record the session or replay it offline.
 """
 import logging
 import sys
@@ -12,11 +13,8 @@ from src.services.efi import EfiService
 from src.services.email import EmailService
 from src.services.sheets import SheetsService
 from src.utils.business_days import get_current_month_column
+from src.utils.log import setup_logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
 TEST_SHEET = "teste"
@@ -24,19 +22,19 @@ TEST_SHEET = "teste"
 
 def run_test_process_payment(days_back: int = 1) -> dict:
     logger.info("=== TEST: PROCESS PAYMENTS ===")
-    logger.info(f"Using sheet: {TEST_SHEET}")
+    logger.info("Using sheet: %s", TEST_SHEET)
     
     today = date.today()
     start_date = today - timedelta(days=days_back)
     
-    logger.info(f"Checking for payments from {start_date} to {today}")
+    logger.info("Checking for payments from %s to %s", start_date, today)
     
     efi_service = EfiService()
     sheets_service = SheetsService()
     email_service = EmailService()
     
     month_column = get_current_month_column()
-    logger.info(f"Current month column: {month_column}")
+    logger.info("Current month column: %s", month_column)
     
     start_iso = start_date.isoformat() + "T00:00:00Z"
     end_iso = today.isoformat() + "T23:59:59Z"
@@ -44,22 +42,22 @@ def run_test_process_payment(days_back: int = 1) -> dict:
     try:
         pix_list = efi_service.list_received_pix(start_iso, end_iso)
     except Exception as e:
-        logger.error(f"Failed to list received PIX: {e}")
+        logger.error("Failed to list received PIX: %s", e)
         return {"status": "error", "error": str(e), "processed": 0}
     
     if not pix_list:
         logger.info("No PIX payments found in the period.")
         return {"status": "success", "processed": 0}
     
-    logger.info(f"Found {len(pix_list)} PIX payments")
+    logger.info("Found %s PIX payments", len(pix_list))
     
     try:
         members = sheets_service.get_members(sheet_name=TEST_SHEET)
     except Exception as e:
-        logger.error(f"Failed to get members: {e}")
+        logger.error("Failed to get members: %s", e)
         return {"status": "error", "error": str(e), "processed": 0}
     
-    logger.info(f"Found {len(members)} members in '{TEST_SHEET}' sheet")
+    logger.info("Found %s members in '%s' sheet", len(members), TEST_SHEET)
     
     members_by_name = {m.name.lower().strip(): m for m in members}
     
@@ -74,7 +72,7 @@ def run_test_process_payment(days_back: int = 1) -> dict:
         pagador = pix.get("pagador", {})
         nome_pagador = pagador.get("nome", "").lower().strip()
         
-        logger.info(f"Processing PIX: txid={txid}, valor={valor}, pagador={nome_pagador}")
+        logger.info("Processing PIX: txid=%s, valor=%s, pagador=%s", txid, valor, nome_pagador)
         
         member = members_by_name.get(nome_pagador)
         
@@ -82,11 +80,11 @@ def run_test_process_payment(days_back: int = 1) -> dict:
             for name, m in members_by_name.items():
                 if nome_pagador in name or name in nome_pagador:
                     member = m
-                    logger.info(f"Fuzzy matched '{nome_pagador}' to '{m.name}'")
+                    logger.info("Fuzzy matched '%s' to '%s'", nome_pagador, m.name)
                     break
         
         if not member:
-            logger.warning(f"Member not found for pagador: {nome_pagador}")
+            logger.warning("Member not found for pagador: %s", nome_pagador)
             not_found += 1
             results.append({
                 "txid": txid,
@@ -97,7 +95,7 @@ def run_test_process_payment(days_back: int = 1) -> dict:
         
         current_status = member.payment_status.get(month_column, "").lower()
         if current_status in ["paid", "pago"]:
-            logger.info(f"Member {member.name} already marked as paid for {month_column}")
+            logger.info("Member %s already marked as paid for %s", member.name, month_column)
             already_paid += 1
             results.append({
                 "txid": txid,
@@ -108,7 +106,7 @@ def run_test_process_payment(days_back: int = 1) -> dict:
         
         try:
             sheets_service.mark_as_paid(member.name, month_column, sheet_name=TEST_SHEET)
-            logger.info(f"Marked {member.name} as paid for {month_column}")
+            logger.info("Marked %s as paid for %s", member.name, month_column)
             
             if member.email:
                 try:
@@ -118,9 +116,9 @@ def run_test_process_payment(days_back: int = 1) -> dict:
                         amount=valor,
                         month=month_column,
                     )
-                    logger.info(f"Confirmation email sent to {member.email}")
+                    logger.info("Confirmation email sent to %s", member.email)
                 except Exception as e:
-                    logger.error(f"Failed to send confirmation email: {e}")
+                    logger.error("Failed to send confirmation email: %s", e)
             
             processed += 1
             results.append({
@@ -131,7 +129,7 @@ def run_test_process_payment(days_back: int = 1) -> dict:
             })
             
         except Exception as e:
-            logger.error(f"Failed to mark {member.name} as paid: {e}")
+            logger.error("Failed to mark %s as paid: %s", member.name, e)
             results.append({
                 "txid": txid,
                 "name": member.name,
@@ -140,8 +138,8 @@ def run_test_process_payment(days_back: int = 1) -> dict:
             })
     
     logger.info(
-        f"Payment processing complete. "
-        f"Processed: {processed}, Already paid: {already_paid}, Not found: {not_found}"
+        "Payment processing complete. Processed: %s, Already paid: %s, Not found: %s",
+        processed, already_paid, not_found,
     )
     
     return {
@@ -156,6 +154,7 @@ def run_test_process_payment(days_back: int = 1) -> dict:
 def main():
     import argparse
     
+    setup_logging()
     parser = argparse.ArgumentParser(description="Test: Process received PIX payments")
     parser.add_argument(
         "--days",
@@ -168,10 +167,10 @@ def main():
     result = run_test_process_payment(days_back=args.days)
     
     if result["status"] == "error":
-        logger.error(f"Test failed: {result.get('error')}")
+        logger.error("Test failed: %s", result.get('error'))
         sys.exit(1)
     
-    logger.info(f"Test completed: {result}")
+    logger.info("Test completed: %s", result)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+import sys
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.services.roster import BLANK, OTHER, PAID, Member, Roster, StatusMatrix
+
+
+def make_matrix() -> StatusMatrix:
+    matrix = StatusMatrix(["Janeiro", "Fevereiro", "Março"])
+    matrix.add_row({"Janeiro": "Paid", "Fevereiro": "", "Março": ""})
+    matrix.add_row({"Janeiro": "pago", "Fevereiro": "Isento", "Março": "Paid"})
+    matrix.add_row({"Janeiro": "", "Telefone": "83 9999"})
+    return matrix
+
+
+def test_cells_are_coded_and_read_back():
+    matrix = make_matrix()
+
+    assert matrix.row_codes(0) == bytes([PAID, BLANK, BLANK])
+    assert matrix.row_codes(1) == bytes([PAID, OTHER, PAID])
+    assert matrix.get(1, "Janeiro") == "Paid"
+    assert matrix.get(1, "Fevereiro") == "Isento"
+    assert matrix.get(2, "Telefone", "-") == "-"
+
+
+def test_unpaid_rows_include_blank_and_other_cells():
+    matrix = make_matrix()
+
+    assert matrix.unpaid_rows("Janeiro") == [2]
+    assert matrix.unpaid_rows("Fevereiro") == [0, 1, 2]
+    assert matrix.paid_count("Março") == 1
+
+
+def test_unknown_month_counts_everyone_as_unpaid():
+    matrix = make_matrix()
+
+    assert matrix.unpaid_rows("Dezembro") == [0, 1, 2]
+    assert matrix.paid_count("Dezembro") == 0
+
+
+def test_months_owed_counts_only_blank_cells():
+    matrix = make_matrix()
+
+    # Row 2 has no marks yet: a new member, who owes only the latest month.
+    assert matrix.months_owed("Fevereiro") == [1, 0, 1]
+    assert matrix.months_owed() == [2, 0, 1]
+    assert matrix.owed_columns(0) == [1, 2]
+    assert matrix.owed_columns(2, "Fevereiro") == [1]
+
+
+def test_blank_months_before_the_first_mark_are_not_owed():
+    matrix = StatusMatrix(["Janeiro", "Fevereiro", "Março", "Abril"])
+    matrix.add_row({"Janeiro": "", "Fevereiro": "", "Março": "Paid", "Abril": ""})
+    matrix.add_row({"Janeiro": "", "Fevereiro": "Isento", "Março": "", "Abril": ""})
+
+    assert matrix.owed_columns(0) == [3]
+    assert matrix.owed_columns(1) == [2, 3]
+    assert matrix.owed_columns(0, "Fevereiro") == [1]
+    assert matrix.months_owed() == [1, 2]
+
+
+def test_set_updates_lookups():
+    matrix = make_matrix()
+
+    matrix.set(0, "Fevereiro", "Paid")
+    matrix.set(1, "Fevereiro", "")
+
+    assert matrix.unpaid_rows("Fevereiro") == [1, 2]
+    assert matrix.months_owed("Fevereiro") == [0, 1, 1]
+
+
+def test_one_byte_per_cell_and_other_text_kept_aside():
+    matrix = make_matrix()
+
+    assert matrix.rows == 3
+    assert len(matrix.row_codes(0)) == matrix.width == 3
+    assert matrix.column_codes("Janeiro") == bytes([PAID, PAID, BLANK])
+    # Only the non-paid text cells are stored as strings.
+    assert matrix._other == {(1, 1): "Isento"}
+
+
+def test_member_payment_status_reads_and_writes_the_shared_matrix():
+    roster = Roster.from_records([
+        {"Pessoas": "Ana", "Email": "ana@example.com", "Janeiro": "Pago", "Fevereiro": ""},
+        {"Pessoas": "", "Email": "blank-row@example.com", "Janeiro": "Paid"},
+        {"Pessoas": "Bia", "Email": "bia@example.com", "Janeiro": "", "Fevereiro": "Isento"},
+    ])
+    ana, bia = roster.members
+
+    assert dict(ana.payment_status) == {"Janeiro": "Paid", "Fevereiro": ""}
+    assert ana.is_paid("Janeiro") and not bia.is_paid("Janeiro")
+
+    bia.payment_status["Janeiro"] = "Paid"
+    del ana.payment_status["Janeiro"]
+
+    assert roster.matrix.column_codes("Janeiro") == bytes([BLANK, PAID])
+    assert [member.name for member in roster.unpaid("Janeiro")] == ["Ana"]
+    assert bia.payment_status["Fevereiro"] == "Isento"
+
+
+def test_standalone_member_gets_its_own_matrix():
+    member = Member("Caio", "caio@example.com", {"Março": "paid", "Abril": "nota"})
+
+    assert member.payment_status == {"Março": "Paid", "Abril": "nota"}
+    assert member == Member("Caio", "caio@example.com", {"Março": "Paid", "Abril": "nota"})
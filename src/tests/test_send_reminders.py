@@ -0,0 +1,68 @@
+import sys
+from datetime import date
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.bench.fakes import FakeEfiService, FakeEmailService, FakeSheetsService
+from src.jobs.send_reminders import run_send_reminders
+from src.services.reminder_schedule import ReminderSchedule
+from src.services.roster import Roster
+from src.utils.results import ResultSink
+
+
+def make_sheets() -> FakeSheetsService:
+    sheets = FakeSheetsService(member_count=0)
+    sheets._rosters[sheets.sheet_name] = Roster.from_records([
+        # Paid this month but still owes February.
+        {"Pessoas": "Ana", "Email": "ana@example.com",
+         "Janeiro": "Paid", "Fevereiro": "", "Março": "Paid"},
+        {"Pessoas": "Bia", "Email": "bia@example.com",
+         "Janeiro": "Paid", "Fevereiro": "Paid", "Março": "Isento"},
+        {"Pessoas": "Caio", "Email": "caio@example.com",
+         "Janeiro": "Paid", "Fevereiro": "Paid", "Março": ""},
+        {"Pessoas": "Davi", "Email": "davi@example.com",
+         "Janeiro": "Paid", "Fevereiro": "Paid", "Março": "Paid"},
+    ])
+    return sheets
+
+
+def test_reminders_follow_open_months_and_skip_exempt_members(tmp_path):
+    schedule = ReminderSchedule(tmp_path / "reminders.sqlite3")
+    efi = FakeEfiService(pay_probability=0)
+    sink = ResultSink()
+
+    result = run_send_reminders(
+        sheets_service=make_sheets(),
+        efi_service=efi,
+        email_service=FakeEmailService(),
+        today=date(2026, 3, 20),
+        schedule=schedule,
+        sink=sink,
+    )
+
+    assert result["status"] == "success"
+    assert sorted(item["name"] for item in sink.items if item["status"] == "success") == [
+        "Ana", "Caio",
+    ]
+    # Exempt and paid-up members are not put on the reminder cadence at all.
+    assert {row["member"] for row in schedule.due("2026-03", date(2026, 12, 31))} == {
+        "Ana", "Caio",
+    }
+
+
+def test_reminder_charges_the_open_months_only(tmp_path):
+    result = run_send_reminders(
+        sheets_service=make_sheets(),
+        efi_service=FakeEfiService(pay_probability=0),
+        email_service=FakeEmailService(),
+        today=date(2026, 3, 20),
+        schedule=ReminderSchedule(tmp_path / "reminders.sqlite3"),
+        dry_run=True,
+    )
+
+    charges = {
+        action["member"]: action["detail"]
+        for action in result["plan"]["actions"]
+        if action["kind"] == "charge"
+    }
+    assert charges == {"Ana": "R$ 40.00 (Fevereiro)", "Caio": "R$ 40.00 (Março)"}
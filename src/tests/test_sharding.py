@@ -0,0 +1,65 @@
+import shutil
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.jobs.merge_charge_state import merge_charge_state
+from src.services.reminder_schedule import ReminderSchedule
+from src.utils.sharding import filter_shard, in_shard, parse_shard, shard_of
+
+MEMBERS = [f"Membro {i:03d}" for i in range(200)] + ["Ana Souza", "João Pessoa", "Zé"]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 4, 7])
+def test_every_member_lands_in_exactly_one_shard(count):
+    shards = [filter_shard(MEMBERS, (index, count)) for index in range(count)]
+
+    assert sorted(member for shard in shards for member in shard) == sorted(MEMBERS)
+    for index, shard in enumerate(shards):
+        assert all(shard_of(member, count) == index for member in shard)
+
+
+def test_shards_are_stable_and_keyed():
+    records = [{"name": member} for member in MEMBERS]
+
+    by_key = filter_shard(records, (1, 4), key=lambda record: record["name"])
+
+    assert [record["name"] for record in by_key] == filter_shard(MEMBERS, (1, 4))
+    assert shard_of("Ana Souza", 4) == shard_of("Ana Souza", 4)
+
+
+@pytest.mark.parametrize("value", ["4/4", "-1/4", "0/0", "1", "a/b"])
+def test_invalid_shards_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_shard(value)
+
+
+def test_parse_shard():
+    assert parse_shard("3/4") == (3, 4)
+
+
+def test_merged_state_keeps_every_shards_charges(tmp_path):
+    base = tmp_path / "base"
+    base.mkdir()
+    ReminderSchedule(base / "reminders.sqlite3").record_charge(
+        "Membro 000", "2026-02", date(2026, 2, 6), "TX-FEB"
+    )
+    shard_dirs = []
+    for index in range(3):
+        directory = tmp_path / f"charge-state-{index}"
+        shutil.copytree(base, directory)
+        schedule = ReminderSchedule(directory / "reminders.sqlite3")
+        for member in MEMBERS[:30]:
+            if in_shard(member, (index, 3)):
+                schedule.record_charge(member, "2026-03", date(2026, 3, 6), f"TX-{member}")
+        shard_dirs.append(directory)
+
+    result = merge_charge_state(shard_dirs, 3, tmp_path / "merged")
+
+    merged = ReminderSchedule(tmp_path / "merged" / "reminders.sqlite3")
+    assert result["missing_shards"] == []
+    assert sorted(merged.charges("2026-03").values()) == sorted(MEMBERS[:30])
+    assert merged.charges("2026-02") == {"TX-FEB": "Membro 000"}
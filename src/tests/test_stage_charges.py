@@ -0,0 +1,77 @@
+import sys
+from datetime import date
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from src.bench.fakes import FakeEfiService, FakeEmailService, FakeSheetsService
+from src.jobs.stage_charges import run_release_charges, run_stage_charges
+from src.services.charge_spool import ChargeSpool
+from src.services.collection_stats import CollectionStats
+from src.services.email_outbox import EmailOutbox
+from src.services.reminder_schedule import ReminderSchedule
+
+# The 5th business day of March 2026, and the night before it.
+CHARGE_DAY = date(2026, 3, 6)
+EVE = date(2026, 3, 5)
+
+
+class FlakyRenderEmailService(FakeEmailService):
+    def render_charge_email(self, to, **kwargs):
+        if to == "membro002@example.com":
+            raise RuntimeError("template error")
+        return super().render_charge_email(to, **kwargs)
+
+
+class FailingSendEmailService(FakeEmailService):
+    def send_many(self, messages):
+        return ["SMTP timeout" if message.to == "membro001@example.com" else None
+                for message in messages]
+
+
+def stage(tmp_path, email_service, sheets):
+    return run_stage_charges(
+        sheets_service=sheets,
+        efi_service=FakeEfiService(pay_probability=0),
+        email_service=email_service,
+        today=EVE,
+        schedule=ReminderSchedule(tmp_path / "reminders.sqlite3"),
+        spool=ChargeSpool(tmp_path / "spool.sqlite3"),
+        stats=CollectionStats(tmp_path / "stats.sqlite3"),
+    )
+
+
+def test_member_whose_email_failed_to_render_is_staged_on_the_next_run(tmp_path):
+    sheets = FakeSheetsService(member_count=3)
+
+    first = stage(tmp_path, FlakyRenderEmailService(), sheets)
+    charged = ReminderSchedule(tmp_path / "reminders.sqlite3").charges("2026-03")
+
+    assert (first["staged"], first["failed"]) == (2, 1)
+    assert "Membro 002" not in charged.values()
+
+    second = stage(tmp_path, FakeEmailService(), sheets)
+
+    assert second["staged"] == 1
+    assert ChargeSpool(tmp_path / "spool.sqlite3").members("2026-03") == {
+        "Membro 001", "Membro 002", "Membro 003",
+    }
+
+
+def test_failed_release_sends_are_queued_in_the_outbox(tmp_path):
+    sheets = FakeSheetsService(member_count=3)
+    stage(tmp_path, FakeEmailService(), sheets)
+    spool = ChargeSpool(tmp_path / "spool.sqlite3")
+    outbox = EmailOutbox(tmp_path / "outbox.sqlite3")
+
+    result = run_release_charges(
+        sheets_service=sheets,
+        efi_service=FakeEfiService(pay_probability=0),
+        email_service=FailingSendEmailService(),
+        today=CHARGE_DAY,
+        spool=spool,
+        outbox=outbox,
+    )
+
+    assert (result["released"], result["failed"]) == (2, 1)
+    assert spool.counts("2026-03") == {"sent": 2, "queued": 1}
+    assert [message.to for _, message in outbox.pending()] == ["membro001@example.com"]
@@ -0,0 +1,64 @@
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, str(__file__).rsplit("/src", 1)[0])
+
+from api import webhook
+from api.webhook import get_endpoint, is_authorized
+
+
+def test_endpoints_are_routed_by_exact_path_or_rewrite_parameter():
+    assert get_endpoint("/metrics") == "metrics"
+    assert get_endpoint("/api/webhook/health/") == "health"
+    assert get_endpoint("/api/webhook?endpoint=metrics") == "metrics"
+    assert get_endpoint("/api/webhook") is None
+    assert get_endpoint("/api/webhook?endpoint=secrets") is None
+    assert get_endpoint("/not/metrics") is None
+
+
+def test_bearer_token_is_required_when_configured():
+    assert is_authorized("Bearer s3cret", token="s3cret")
+    assert is_authorized("bearer s3cret", token="s3cret")
+    assert not is_authorized(None, token="s3cret")
+    assert not is_authorized("Bearer wrong", token="s3cret")
+    assert not is_authorized("Basic s3cret", token="s3cret")
+    assert is_authorized(None, token="")
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(webhook, "METRICS_TOKEN", "s3cret")
+    monkeypatch.delenv("WEBHOOK_QUEUE_PATH", raising=False)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), webhook.handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _get(url, token=None):
+    request = urllib.request.Request(url)
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_metrics_and_health_need_the_token(server):
+    for path in ("/api/webhook/metrics", "/api/webhook?endpoint=health"):
+        assert _get(server + path) == 401
+        assert _get(server + path, token="wrong") == 401
+        assert _get(server + path, token="s3cret") == 200
+
+
+def test_status_page_stays_open(server):
+    assert _get(server + "/api/webhook") == 200
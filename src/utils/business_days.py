@@ -1,13 +1,15 @@
 import calendar
 from datetime import date
+from functools import lru_cache
 from typing import Optional
 
 import holidays
 
 
-def get_brazil_holidays(year: int) -> set[date]:
+@lru_cache(maxsize=None)
+def get_brazil_holidays(year: int) -> frozenset[date]:
     br_holidays = holidays.Brazil(years=year, state="PB")
-    return set(br_holidays.keys())
+    return frozenset(br_holidays.keys())
 
 
 def is_business_day(d: date) -> bool:
@@ -63,7 +65,8 @@ def get_month_name_pt(month: int) -> str:
     return months.get(month, "")
 
 
-def get_current_month_column() -> str:
-    today = date.today()
+def get_current_month_column(today: Optional[date] = None) -> str:
+    if today is None:
+        today = date.today()
     month_name = get_month_name_pt(today.month)
     return month_name
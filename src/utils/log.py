@@ -0,0 +1,142 @@
+"""
+Shared logging setup for jobs and the webhook.
+
+``setup_logging()`` puts a ``QueueHandler`` on the root logger and hands
+records to a ``QueueListener`` thread that formats and writes them, so a job
+or request thread never waits on stderr. Messages use %-style arguments, so
+records below the configured level are dropped before they are built; the
+calling thread only renders the message text, and the listener does the rest.
+
+``setup_logging(background=False)`` writes from the calling thread instead,
+for processes that may be frozen as soon as they answer (the Vercel webhook),
+where records still waiting in the queue would be lost.
+
+Records are written as one JSON object per line (``LOG_FORMAT=json``, the
+default) or as plain text (``LOG_FORMAT=text``). Fields passed through
+``extra`` that name a member or payment (``member``, ``txid``, ...) become
+top-level JSON keys::
+
+    logger.info("Charge created for %s", name, extra={"member": name, "txid": txid})
+
+Fields that hold for a whole stretch of work, like the tenant a thread is
+running, are set once with ``log_context(tenant=...)``.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterator, Optional
+
+# ``extra`` fields copied into JSON records.
+STRUCTURED_FIELDS = ("tenant", "job", "member", "month", "txid", "end_to_end_id")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener: Optional[QueueListener] = None
+_configured = False
+_context: ContextVar[dict] = ContextVar("log_context", default={})
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The message is rendered here, while its arguments still hold the values
+    they had at the call; a list or dict changed afterwards would otherwise be
+    logged as it is when the listener gets to it. Unlike the stock ``prepare``,
+    the record keeps its ``exc_info`` for the listener to format.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _ContextFilter(logging.Filter):
+    """Stamps records with the ``log_context`` fields of the thread that logged them."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for field, value in _context.get().items():
+            if getattr(record, field, None) is None:
+                setattr(record, field, value)
+        return True
+
+
+@contextmanager
+def log_context(**fields) -> Iterator[None]:
+    """Add ``fields`` to every record logged by the current thread inside the block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def setup_logging(
+    level: Optional[str] = None, fmt: Optional[str] = None, background: bool = True
+) -> None:
+    """Route all logging through a background listener; safe to call more than once.
+
+    With ``background=False`` records are written synchronously by the thread
+    that logs them, and no listener thread is started.
+    """
+    global _listener, _configured
+    if _configured:
+        return
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level)
+    _configured = True
+
+    if not background:
+        stream.addFilter(_ContextFilter())
+        root.addHandler(stream)
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _LazyQueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+    root.addHandler(handler)
+
+    _listener = QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,101 @@
+"""
+Planned external writes of a job run.
+
+Jobs first read one snapshot (roster, schedule, received PIX) and turn it
+into a ``Plan``: the charges to create, the spreadsheet cells to write and
+the emails to send. Actions that would change nothing are recorded as
+skipped instead of planned, and an action planned twice is kept once. With
+``--dry-run`` the plan is printed and nothing is written; otherwise the job
+executes it as batched operations.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator
+
+CHARGE = "charge"
+WRITE_CELL = "write_cell"
+EMAIL = "email"
+
+KIND_LABELS = {CHARGE: "charges", WRITE_CELL: "cell writes", EMAIL: "emails"}
+
+
+@dataclass(frozen=True)
+class Action:
+    """One external write. ``target`` tells apart several writes for a member
+    (the month of a cell, the payment a confirmation is for)."""
+
+    kind: str
+    member: str
+    target: str = ""
+    detail: str = field(default="", compare=False)
+    data: Any = field(default=None, compare=False, repr=False)
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return (self.kind, self.member, self.target)
+
+
+class Plan:
+    def __init__(self, job: str):
+        self.job = job
+        self.actions: list[Action] = []
+        self.skipped: Counter = Counter()
+        self._keys: set[tuple[str, str, str]] = set()
+
+    def __iter__(self) -> Iterator[Action]:
+        return iter(self.actions)
+
+    def __bool__(self) -> bool:
+        return bool(self.actions)
+
+    def add(self, action: Action) -> bool:
+        """Plan ``action`` unless the same write is already planned."""
+        if action.key in self._keys:
+            self.skipped["duplicate"] += 1
+            return False
+        self._keys.add(action.key)
+        self.actions.append(action)
+        return True
+
+    def extend(self, actions: Iterable[Action]) -> None:
+        for action in actions:
+            self.add(action)
+
+    def skip(self, reason: str, count: int = 1) -> None:
+        """Record writes left out because they would change nothing."""
+        self.skipped[reason] += count
+
+    def of_kind(self, kind: str) -> list[Action]:
+        return [action for action in self.actions if action.kind == kind]
+
+    def counts(self) -> dict[str, int]:
+        return dict(Counter(action.kind for action in self.actions))
+
+    def to_dict(self) -> dict:
+        return {
+            "job": self.job,
+            "counts": self.counts(),
+            "skipped": dict(self.skipped),
+            "actions": [
+                {"kind": a.kind, "member": a.member, "target": a.target, "detail": a.detail}
+                for a in self.actions
+            ],
+        }
+
+    def render(self) -> str:
+        return render_plan(self.to_dict())
+
+
+def render_plan(plan: dict) -> str:
+    """Human-readable listing of a plan (as returned by ``Plan.to_dict``)."""
+    counts = plan["counts"]
+    summary = ", ".join(f"{counts.get(kind, 0)} {label}" for kind, label in KIND_LABELS.items())
+    lines = [f"Plan for {plan['job']}: {summary}"]
+    if plan["skipped"]:
+        skipped = sorted(plan["skipped"].items())
+        lines.append("Skipped: " + ", ".join(f"{n} {reason}" for reason, n in skipped))
+    for action in plan["actions"]:
+        target = f" [{action['target']}]" if action["target"] else ""
+        detail = f" {action['detail']}" if action["detail"] else ""
+        lines.append(f"  {action['kind']:<10} {action['member']}{target}{detail}")
+    return "\n".join(lines)
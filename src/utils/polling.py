@@ -0,0 +1,21 @@
+class AdaptiveInterval:
+    """Poll interval that snaps to ``minimum`` on activity and backs off when idle.
+
+    Each idle poll multiplies the interval by ``backoff`` up to ``maximum``.
+    """
+
+    def __init__(self, minimum: float = 30.0, maximum: float = 600.0, backoff: float = 2.0):
+        if minimum <= 0 or maximum < minimum:
+            raise ValueError("Need 0 < minimum <= maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.current = minimum
+
+    def activity(self) -> float:
+        self.current = self.minimum
+        return self.current
+
+    def idle(self) -> float:
+        self.current = min(self.current * self.backoff, self.maximum)
+        return self.current
@@ -0,0 +1,173 @@
+"""
+Opt-in profiling for job entry points.
+
+``Profiler`` wraps a run in cProfile and collects wall-clock time per phase.
+Jobs mark their phases with ``span("fetch_members")`` etc.; when no profiler
+is active, ``span`` does nothing beyond a global lookup.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+_active: Optional["Profiler"] = None
+
+# Stacks contributing less than this (in microseconds) are dropped from the
+# collapsed output, which keeps deep recursive graphs from exploding.
+MIN_STACK_MICROSECONDS = 1
+MAX_STACK_DEPTH = 64
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.spans[name] += time.perf_counter() - started
+        profiler.span_counts[name] += 1
+
+
+class Profiler:
+    def __init__(self, name: str, output_dir: Union[str, Path] = "profiles", top: int = 25):
+        self.name = name
+        self.output_dir = Path(output_dir)
+        self.top = top
+        self.spans: dict[str, float] = defaultdict(float)
+        self.span_counts: dict[str, int] = defaultdict(int)
+        self.wall_seconds = 0.0
+        self._profile = cProfile.Profile()
+        self._started = 0.0
+
+    def __enter__(self) -> "Profiler":
+        global _active
+        _active = self
+        self._started = time.perf_counter()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        global _active
+        self._profile.disable()
+        self.wall_seconds = time.perf_counter() - self._started
+        _active = None
+        self.report()
+
+    def report(self) -> dict:
+        """Write .pstats and .collapsed files and log the summary."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        pstats_path = self.output_dir / f"{self.name}.pstats"
+        collapsed_path = self.output_dir / f"{self.name}.collapsed"
+
+        self._profile.dump_stats(str(pstats_path))
+        stats = pstats.Stats(self._profile)
+
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            for stack, micros in sorted(collapse_stacks(stats, root=self.name).items()):
+                f.write(f"{stack} {micros}\n")
+
+        logger.info("Profile of %s: %.3fs wall clock", self.name, self.wall_seconds)
+        for phase, seconds in sorted(self.spans.items(), key=lambda item: -item[1]):
+            share = seconds / self.wall_seconds * 100 if self.wall_seconds else 0.0
+            logger.info(
+                "  phase %s: %.3fs (%.1f%%) over %s calls",
+                phase, seconds, share, self.span_counts[phase],
+            )
+
+        buffer = io.StringIO()
+        pstats.Stats(self._profile, stream=buffer).sort_stats("cumulative").print_stats(self.top)
+        logger.info("Top %s functions by cumulative time:\n%s", self.top, buffer.getvalue())
+        logger.info("Profile written to %s and %s", pstats_path, collapsed_path)
+
+        return {
+            "wall_seconds": self.wall_seconds,
+            "spans": dict(self.spans),
+            "pstats": str(pstats_path),
+            "collapsed": str(collapsed_path),
+        }
+
+
+def _label(func: tuple) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{lineno})"
+    return label.replace(";", ",")
+
+
+def collapse_stacks(stats: pstats.Stats, root: str = "") -> dict[str, int]:
+    """Turn a cProfile call graph into collapsed stacks ("a;b;c micros").
+
+    cProfile only records caller/callee edges, not full stacks, so each
+    function's time is split across its callers in proportion to the
+    cumulative time spent under each edge.
+    """
+    raw = stats.stats  # func -> (cc, nc, tt, ct, callers)
+    callees: dict[tuple, dict[tuple, float]] = defaultdict(dict)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+
+    collapsed: dict[str, int] = defaultdict(int)
+
+    def walk(func: tuple, weight: float, path: list[str], seen: set) -> None:
+        _, _, tt, ct, _ = raw[func]
+        frames = path + [_label(func)]
+        micros = int(tt * weight * 1_000_000)
+        if micros >= MIN_STACK_MICROSECONDS:
+            collapsed[";".join(frames)] += micros
+
+        if len(frames) >= MAX_STACK_DEPTH:
+            return
+
+        for callee, edge_ct in callees.get(func, {}).items():
+            if callee in seen or callee not in raw:
+                continue
+            callee_ct = raw[callee][3]
+            if callee_ct <= 0:
+                continue
+            callee_weight = weight * edge_ct / callee_ct
+            if callee_ct * callee_weight * 1_000_000 < MIN_STACK_MICROSECONDS:
+                continue
+            walk(callee, callee_weight, frames, seen | {callee})
+
+    base = [root] if root else []
+    for func, (_, _, _, _, callers) in raw.items():
+        if not callers:
+            walk(func, 1.0, base, {func})
+
+    return dict(collapsed)
+
+
+def add_profile_arguments(parser) -> None:
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the run: write .pstats and collapsed-stack files and log a summary",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default="profiles",
+        help="Directory for profile output (default: profiles)",
+    )
+
+
+def profile_if_requested(args, name: str):
+    """Return a Profiler when --profile was given, otherwise a no-op context."""
+    if getattr(args, "profile", False):
+        return Profiler(name, output_dir=args.profile_dir)
+    return nullcontext()
@@ -0,0 +1,49 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` calls per second, in bursts of up to ``burst``.
+
+    ``acquire()`` blocks until a call is allowed. One limiter can be shared by
+    several services and threads; ``waited`` adds up the time spent blocked.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._last = clock()
+        self.calls = 0
+        self.waited = 0.0
+
+    def acquire(self) -> float:
+        """Take one call from the bucket; returns the seconds spent waiting for it."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Reserve the token now and sleep outside the lock, so waiters queue up in order.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.calls += 1
+            self.waited += wait
+        if wait:
+            self._sleep(wait)
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "waited_seconds": round(self.waited, 3)}
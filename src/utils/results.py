@@ -0,0 +1,87 @@
+import json
+from collections import Counter
+from pathlib import Path
+from typing import IO, Iterator, Optional, Union
+
+
+class ResultSink:
+    """Per-member job results with running counts by status.
+
+    With a ``path``, every result is appended to that JSONL file as soon as
+    it is added (one ``{"job": ..., ...}`` object per line, plus a final
+    ``{"job": ..., "summary": {...}}`` line on ``close()``), and nothing is
+    kept in memory. Without one, results are kept in ``items`` so callers can
+    inspect them, as the queue drain does.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        job: str = "",
+        keep: Optional[bool] = None,
+    ):
+        self.path = Path(path) if path else None
+        self.job = job
+        self.keep = self.path is None if keep is None else keep
+        self.counts: Counter = Counter()
+        self.items: list[dict] = []
+        self._file: Optional[IO[str]] = None
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+
+    def __enter__(self) -> "ResultSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def add(self, item: dict) -> None:
+        self.counts[item.get("status", "unknown")] += 1
+        if self._file:
+            self._file.write(json.dumps({"job": self.job, **item}, default=str) + "\n")
+        if self.keep:
+            self.items.append(item)
+
+    def fields(self) -> dict:
+        """What a job result reports about its items: counts, and the items or the file."""
+        fields: dict = {"counts": dict(self.counts)}
+        if self.keep:
+            fields["results"] = self.items
+        if self.path:
+            fields["results_file"] = str(self.path)
+        return fields
+
+    def close(self) -> None:
+        if self._file:
+            self._file.write(
+                json.dumps({"job": self.job, "summary": dict(self.counts)}) + "\n"
+            )
+            self._file.close()
+            self._file = None
+
+
+def compact(result: dict) -> dict:
+    """A job result without its per-member list, for logging."""
+    if isinstance(result.get("results"), list):
+        result = {**result, "results": f"<{len(result['results'])} items>"}
+    if isinstance(result.get("jobs"), dict):
+        result = {
+            **result,
+            "jobs": {
+                name: {**job, "result": compact(job.get("result", {}))}
+                for name, job in result["jobs"].items()
+            },
+        }
+    return result
+
+
+def read_results(path: Union[str, Path]) -> Iterator[dict]:
+    """Stream the records of a JSONL results file, skipping a partial last line."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
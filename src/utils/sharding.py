@@ -0,0 +1,30 @@
+import hashlib
+from typing import Iterable, TypeVar
+
+T = TypeVar("T")
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse ``"i/n"`` into ``(i, n)``, with shards numbered from 0."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected i/n (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{value}', need 0 <= i < n")
+    return index, count
+
+
+def shard_of(key: str, count: int) -> int:
+    """Stable shard for a key; unlike ``hash()`` it does not change between processes."""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def in_shard(key: str, shard: tuple[int, int]) -> bool:
+    index, count = shard
+    return shard_of(key, count) == index
+
+
+def filter_shard(items: Iterable[T], shard: tuple[int, int], key=lambda item: item) -> list[T]:
+    return [item for item in items if in_shard(key(item), shard)]
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+_state_dir_override: ContextVar[Optional[Path]] = ContextVar("state_dir", default=None)
+
+
+def get_state_dir(create: bool = True) -> Path:
+    """Directory for local durable state (queues, stores), from CAIXINHA_STATE_DIR.
+
+    Inside ``use_state_dir`` the given directory is used instead.
+    """
+    state_dir = _state_dir_override.get() or Path(os.getenv("CAIXINHA_STATE_DIR", ".caixinha"))
+    if create:
+        state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir
+
+
+@contextmanager
+def use_state_dir(path: Union[str, Path]) -> Iterator[Path]:
+    """Keep the state of the current thread (or task) in ``path``, e.g. one tenant's."""
+    token = _state_dir_override.set(Path(path))
+    try:
+        yield Path(path)
+    finally:
+        _state_dir_override.reset(token)
+
+
+def get_state_path(filename: str, create: bool = True) -> Path:
+    return get_state_dir(create) / filename
+
+
+def snapshot_state(filename: str, source: Optional[Union[str, Path]] = None) -> Path:
+    """A throwaway copy of a SQLite state file, for dry runs that must not write.
+
+    ``source`` defaults to ``filename`` in the state directory. The copy goes
+    to a new temporary directory; if the source does not exist, the returned
+    path there is simply unused, so the store starts empty.
+    """
+    source = Path(source) if source else get_state_path(filename, create=False)
+    copy = Path(tempfile.mkdtemp(prefix="caixinha-dry-run-")) / filename
+    if source.exists():
+        # Opened read-only; the backup also picks up pages still in the WAL file.
+        src = sqlite3.connect(f"{source.resolve().as_uri()}?mode=ro", uri=True)
+        dst = sqlite3.connect(copy)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+    return copy
+
+
+def read_cursor(name: str) -> Optional[str]:
+    """Last value saved with ``write_cursor``, or None if there is none yet."""
+    path = get_state_path(f"{name}.cursor")
+    try:
+        return path.read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_cursor(name: str, value: str) -> None:
+    path = get_state_path(f"{name}.cursor")
+    tmp_path = path.with_suffix(".cursor.tmp")
+    tmp_path.write_text(value, encoding="utf-8")
+    os.replace(tmp_path, path)